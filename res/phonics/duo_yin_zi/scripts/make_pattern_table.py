@@ -4,10 +4,14 @@
 # python3 make_pattern_table.py 
 
 import os
+import sys
 import json
 import pinyin_getter
 import phrase_holder as ph
 import validate_phrase as validate
+# src の pinyin_getter と名前が同じなので、後ろに足す（pattern_ir だけを使う）
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../../src"))
+import pattern_ir
 
 PINYIN_MAPPING_TABLE = pinyin_getter.get_pinyin_table_with_mapping_table()
 NORMAL_PRONUNCIATION      = 0
@@ -25,14 +29,6 @@ SS_WITHOUT_PRONUNCIATION     = 0
 SS_NORMAL_PRONUNCIATION      = 1
 SS_VARIATIONAL_PRONUNCIATION = 2
 
-# [階層構造のあるdictをupdateする](https://www.greptips.com/posts/1242/)
-def deepupdate(dict_base, other):
-    for k, v in other.items():
-        if isinstance(v, dict) and k in dict_base:
-            deepupdate(dict_base[k], v)
-        else:
-            dict_base[k] = v
-
 def replace_chr(target_str, index, replace_character):
     tmp = list(target_str)
     tmp[index] = replace_character
@@ -46,72 +42,54 @@ def expand_pattern_list2str(patterns):
 ここから pattern_one のための関数
 """
 
+# pattern_table[漢字]["patterns"][ピンイン] の末尾に追加するだけ（作り直さない）
 def add_pattern_one_table(pattern_table, character, pinyin, pattern):
     if not (pinyin in PINYIN_MAPPING_TABLE[character]):
         message = "{} => {} は 正しいピンインではありません".format(character, pinyin)
         raise Exception(message)
         
     if not (character in pattern_table):
-        pattern_table.update( 
-            { 
-                character: { 
-                    "pinyin": PINYIN_MAPPING_TABLE[character],
-                    "patterns": { pinyin: [pattern] }
-                }
-            })
-        return 
-
-    if not (pinyin in pattern_table[character]["patterns"]):
-        new_dict_of_character = pattern_table[character]
-        deepupdate( new_dict_of_character, { "patterns": { pinyin: [pattern] }} )
-        pattern_table.update( 
-            { 
-                character: new_dict_of_character
-            }
-        )
-    else:
-        new_dict_of_character = pattern_table[character]
-        new_patterns = new_dict_of_character["patterns"][pinyin]
-        new_patterns.append(pattern)
-        deepupdate( new_dict_of_character, { "patterns": { pinyin: new_patterns }} )
-        pattern_table.update( 
-            { 
-                character: new_dict_of_character
-            }
-        )
+        pattern_table[character] = { 
+            "pinyin": PINYIN_MAPPING_TABLE[character],
+            "patterns": {}
+        }
+    patterns = pattern_table[character]["patterns"]
+    if not (pinyin in patterns):
+        patterns[pinyin] = []
+    patterns[pinyin].append(pattern)
 
 # pattern_table[漢字]["patterns"] が一つだけのときは不要なパターンである。
 # （標準的なピンインで構成された単語なので消してもいいが、もったいないので他のパターンに入れる. 他のパターンが見つからないなら削除）
 # 辨 {'pinyin': ['biàn', 'biǎn', 'bàn', 'piàn'], 'patterns': {'biàn': ['~别']}}
 # なら 别 のテーブルに移動する
-# ネスト深くてキモいな。。。
+# pattern_table はその場で書き換える（コピーしない）
+# 移動先はパターンが二つ以上ある漢字だけで、移動しても移動元（パターンが一つの漢字）にはならないので、
+# 移動先になれる漢字の set は最初に一度作ればよい。
 def compress_pattern_one_table(pattern_table):
-    import copy as cy
-    pattern_table_4_work = cy.deepcopy(pattern_table)
     characters_of_having_pattern_length_one_only = [c for c in pattern_table if len(pattern_table[c]["patterns"]) == 1]
+    destination_characters = set( c for c in pattern_table if len(pattern_table[c]["patterns"]) > 1 )
 
     for character in characters_of_having_pattern_length_one_only:
-        normal_pronunciation_patterns = list( pattern_table_4_work[character]["patterns"].values() )[NORMAL_PRONUNCIATION]
+        normal_pronunciation_patterns = list( pattern_table[character]["patterns"].values() )[NORMAL_PRONUNCIATION]
         for normal_pronunciation_pattern in normal_pronunciation_patterns:
             phrase = normal_pronunciation_pattern.replace("~", character)
             # 置き換え先を探す
-            index_of_destination_character = search_4_replacement_destination(phrase, character, pattern_table_4_work)
+            index_of_destination_character = search_4_replacement_destination(phrase, character, destination_characters)
             if index_of_destination_character != None:
                 destination_character = phrase[index_of_destination_character]
                 pinyin = PINYIN_MAPPING_TABLE[destination_character][NORMAL_PRONUNCIATION]
                 # replace で置き換えると　累累: lěi/lèi　のpatternが ~~ になるので手動で置換する
                 normal_pronunciation_pattern = replace_chr(phrase, index_of_destination_character, "~")
-                add_pattern_one_table( pattern_table_4_work, destination_character, pinyin, normal_pronunciation_pattern )
-        pattern_table_4_work.pop(character)
+                add_pattern_one_table( pattern_table, destination_character, pinyin, normal_pronunciation_pattern )
+        del pattern_table[character]
 
-    return pattern_table_4_work
+    return pattern_table
 
-def search_4_replacement_destination(phrase, source_character, pattern_table):
+def search_4_replacement_destination(phrase, source_character, destination_characters):
     for index in range(len(phrase)):
         destination_character = phrase[index]
-        if destination_character != source_character and destination_character in pattern_table:
-            if len(pattern_table[destination_character]["patterns"]) > 1:
-                return index
+        if destination_character != source_character and destination_character in destination_characters:
+            return index
     return None
 
 # パターンテーブルの txt を出力する
@@ -120,7 +98,7 @@ def export_pattern_one_table(pattern_table, PATTERN_ONE_TABLE_FILE):
         for character in pattern_table:
             order = SS_NORMAL_PRONUNCIATION
             for pinyin in PINYIN_MAPPING_TABLE[character]:
-                if pinyin in list( pattern_table[character]["patterns"].keys() ):
+                if pinyin in pattern_table[character]["patterns"]:
                     str_patterns = expand_pattern_list2str( pattern_table[character]["patterns"][pinyin] )
                     line = "{0}, {1}, {2}, [{3}]\n".format(order, character, pinyin, str_patterns)
                     write_file.write(line)
@@ -131,9 +109,10 @@ def seek_variational_pronunciation_in_phrase(phrase_instance):
     count_variational_pronunciation = 0
     target_hanzes = []
     phrase = phrase_instance.get_name()
+    list_pinyin = phrase_instance.get_list_pinyin()
     for i in range(len(phrase)):
         character = phrase[i]
-        character_pinyin = phrase_instance.get_list_pinyin()[i]
+        character_pinyin = list_pinyin[i]
         character_normal_pronunciation = PINYIN_MAPPING_TABLE[character][NORMAL_PRONUNCIATION]
         if character_pinyin != character_normal_pronunciation:
             count_variational_pronunciation += 1
@@ -419,6 +398,10 @@ def main():
     print("========================================================================")
     print("success!")
     print("Output duoyinzi_exceptional_pattern.json.")
+
+    # GSUBTable が読み込む型付きのルール (pattern_ir) にして、キャッシュしておく
+    rules = pattern_ir.load_patterns(OUTPUT_PATTERN_ONE_TABLE_FILE, OUTPUT_PATTERN_TWO_TABLE_FILE, OUTPUT_EXCEPTION_PATTERN_TABLE_FILE)
+    print("Compiled {} + {} + {} rules into {}.".format(len(rules.pattern_one), len(rules.pattern_two), len(rules.exception_pattern), os.path.normpath(pattern_ir.DIR_PATTERN_IR_CACHE)))
     
 
 if __name__ == "__main__":
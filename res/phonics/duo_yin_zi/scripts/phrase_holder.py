@@ -4,8 +4,6 @@
 import pinyin_getter
 import phrase as p
 
-PINYIN_MAPPING_TABLE = pinyin_getter.get_pinyin_table_with_mapping_table()
-
 class PhraseHolder:
     def __init__(self, PHRASE_TABLE_FILE):
         self.PINYIN_MAPPING_TABLE = pinyin_getter.get_pinyin_table_with_mapping_table()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# python3 phrase_validator.py
+# python3 phrase_validator.py ../phrase_of_pattern_one.txt --json
+
+# phrase_of_pattern_one.txt, phrase_of_pattern_two.txt の検証
+# ファイルは一度だけ読んで PhraseFile にし、すべての検証をまとめて行う。
+# 問題は途中で止めずに全部集めて、Report として返す（exit はしない）。
+#
+# 問題 (issue)
+#   {"file": ファイル名, "line": 行番号, "check": 検証の名前, "level": "error" | "info", "phrase": 単語, "message": 説明}
+#
+# check
+#   format           : "単語: ピンイン/ピンイン" の形になっていない
+#   unknown_hanzi    : 辞書に無い漢字がある
+#   pinyin_count     : 単語の文字数とピンインの数が違う
+#   duplicate        : 同じ単語が二回以上ある            -> 重複箇所を消す
+#   contained        : 別の単語に含まれている             -> 基本的に文字数が小さいパターンに合わせる
+#   multiple_variant : (pattern_one) 異読字が２個以上ある -> phrase_of_pattern_two.txt へ
+#   single_variant   : (pattern_two) 異読字が１個以下     -> 0 個なら削除、1 個なら phrase_of_pattern_one.txt へ
+#   overlap          : (info) 別のファイルの単語に含まれている
+
+import os
+import sys
+import argparse
+import json
+import collections
+import pinyin_getter
+# 単語を探すオートマトンは src の phrase_automaton.py（rule_analyzer と共有する）
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../../src"))
+import phrase_automaton
+
+DEFALT_READING = 0
+PATTERN_ONE = "pattern_one"
+PATTERN_TWO = "pattern_two"
+KINDS = [PATTERN_ONE, PATTERN_TWO]
+
+ERROR = "error"
+INFO  = "info"
+
+# ファイルの一行
+Entry = collections.namedtuple("Entry", ["line", "phrase", "pinyins"])
+
+def get_kind(PHRASE_TABLE_FILE):
+    for kind in KINDS:
+        if kind in os.path.basename(PHRASE_TABLE_FILE):
+            return kind
+    raise Exception("{} の種類 ({}) が分かりません".format(PHRASE_TABLE_FILE, KINDS))
+
+# 一度だけ読んだファイル
+class PhraseFile():
+    def __init__(self, PHRASE_TABLE_FILE, kind=None):
+        self.path = PHRASE_TABLE_FILE
+        self.name = os.path.basename(PHRASE_TABLE_FILE)
+        self.kind = kind if kind != None else get_kind(PHRASE_TABLE_FILE)
+        self.entries = []
+        # 形の崩れた行 [(行番号, 行)]
+        self.malformed_lines = []
+        with open(PHRASE_TABLE_FILE, mode='r', encoding='utf-8') as read_file:
+            for line_num, line in enumerate(read_file, 1):
+                line = line.rstrip('\n')
+                if line == "":
+                    continue
+                splited_line = line.split(': ')
+                if len(splited_line) != 2:
+                    self.malformed_lines.append((line_num, line))
+                    continue
+                [phrase, pinyin_of_phrase] = splited_line
+                self.entries.append(Entry(line_num, phrase, pinyin_of_phrase.split('/')))
+        # {単語: [entry の番号, ...]}
+        self.index = collections.defaultdict(list)
+        for entry_id, entry in enumerate(self.entries):
+            self.index[entry.phrase].append(entry_id)
+
+    def get_phrases(self):
+        return [entry.phrase for entry in self.entries]
+
+class Report():
+    def __init__(self):
+        self.issues = []
+
+    def add(self, phrase_file, line, check, level, phrase, message):
+        self.issues.append({"file": phrase_file.name, "line": line, "check": check, "level": level, "phrase": phrase, "message": message})
+
+    def get_issues(self, check=None, level=None):
+        return [issue for issue in self.issues if (check == None or issue["check"] == check) and (level == None or issue["level"] == level)]
+
+    def has_error(self):
+        return len(self.get_issues(level=ERROR)) > 0
+
+    def to_json(self):
+        return json.dumps({"ok": not self.has_error(), "issues": self.issues}, indent=4, ensure_ascii=False)
+
+    def print(self):
+        for issue in self.issues:
+            print("{}:{}: {} [{}] {}".format(issue["file"], issue["line"], issue["level"], issue["check"], issue["message"]))
+        print("{} error(s), {} info".format(len(self.get_issues(level=ERROR)), len(self.get_issues(level=INFO))))
+
+# 標準の読みと違う文字の数を返す
+def count_variational_pinyin(pinyin_table, phrase, pinyins):
+    return sum( 1 for hanzi, pinyin in zip(phrase, pinyins) if pinyin_table[hanzi][DEFALT_READING] != pinyin )
+
+def check_file(phrase_file, pinyin_table, report):
+    for (line_num, line) in phrase_file.malformed_lines:
+        report.add(phrase_file, line_num, "format", ERROR, line, "\"単語: ピンイン/ピンイン\" の形にしてください")
+
+    # 辞書で読みが分かる単語だけ、異読字の数を数える
+    counts = {}
+    for entry_id, entry in enumerate(phrase_file.entries):
+        unknown_hanzi = [hanzi for hanzi in entry.phrase if not (hanzi in pinyin_table)]
+        if len(unknown_hanzi) > 0:
+            report.add(phrase_file, entry.line, "unknown_hanzi", ERROR, entry.phrase, "辞書に無い漢字があります: {}".format("".join(unknown_hanzi)))
+            continue
+        if len(entry.phrase) != len(entry.pinyins):
+            report.add(phrase_file, entry.line, "pinyin_count", ERROR, entry.phrase, "文字数 ({}) とピンインの数 ({}) が違います".format(len(entry.phrase), len(entry.pinyins)))
+            continue
+        counts[entry_id] = count_variational_pinyin(pinyin_table, entry.phrase, entry.pinyins)
+
+    for phrase, entry_ids in phrase_file.index.items():
+        if len(entry_ids) > 1:
+            lines = [phrase_file.entries[entry_id].line for entry_id in entry_ids]
+            for line_num in lines[1:]:
+                report.add(phrase_file, line_num, "duplicate", ERROR, phrase, "重複する単語を削除してください (行 {})".format(lines[0]))
+
+    # 同じ単語どうしは duplicate で出しているので、ここでは別の単語に含まれているものだけ
+    if phrase_file.kind == PATTERN_ONE:
+        phrases = phrase_file.get_phrases()
+        for (contained_id, containing_id) in phrase_automaton.PhraseAutomaton(phrases).get_contained_pairs():
+            if phrases[contained_id] == phrases[containing_id]:
+                continue
+            containing_entry = phrase_file.entries[containing_id]
+            report.add(phrase_file, phrase_file.entries[contained_id].line, "contained", ERROR, phrases[contained_id],
+                       "{} (行 {}) に含まれています。どちらかを削除してください".format(containing_entry.phrase, containing_entry.line))
+
+    for entry_id, count in counts.items():
+        entry = phrase_file.entries[entry_id]
+        if phrase_file.kind == PATTERN_ONE and count >= 2:
+            report.add(phrase_file, entry.line, "multiple_variant", ERROR, entry.phrase, "異読字が {} 個あります。phrase_of_pattern_two.txt に移動させてください".format(count))
+        elif phrase_file.kind == PATTERN_TWO and count < 2:
+            action = "削除してください" if count == 0 else "phrase_of_pattern_one.txt に移動させてください"
+            report.add(phrase_file, entry.line, "single_variant", ERROR, entry.phrase, "異読字が {} 個です。{}".format(count, action))
+
+# 別のファイルの単語に含まれている単語（確認用）
+def check_overlap(phrase_files, report):
+    entries = [(phrase_file, entry) for phrase_file in phrase_files for entry in phrase_file.entries]
+    automaton = phrase_automaton.PhraseAutomaton( [entry.phrase for (_, entry) in entries] )
+    for (contained_id, containing_id) in automaton.get_contained_pairs():
+        (contained_file, contained_entry)   = entries[contained_id]
+        (containing_file, containing_entry) = entries[containing_id]
+        if contained_file is containing_file:
+            continue
+        report.add(contained_file, contained_entry.line, "overlap", INFO, contained_entry.phrase,
+                   "{}:{} の {} に含まれています".format(containing_file.name, containing_entry.line, containing_entry.phrase))
+
+# ファイルを検証して Report を返す
+def validate(PHRASE_TABLE_FILES, kinds=None):
+    pinyin_table = pinyin_getter.get_pinyin_table_with_mapping_table()
+    if kinds == None:
+        kinds = [None] * len(PHRASE_TABLE_FILES)
+    phrase_files = [PhraseFile(PHRASE_TABLE_FILE, kind) for PHRASE_TABLE_FILE, kind in zip(PHRASE_TABLE_FILES, kinds)]
+    report = Report()
+    for phrase_file in phrase_files:
+        check_file(phrase_file, pinyin_table, report)
+    if len(phrase_files) > 1:
+        check_overlap(phrase_files, report)
+    return report
+
+if __name__ == '__main__':
+    DIR_PT = "../"
+    parser = argparse.ArgumentParser(description="Validate phrase_of_pattern_one.txt and phrase_of_pattern_two.txt")
+    parser.add_argument("files", nargs="*", default=[os.path.join(DIR_PT, "phrase_of_pattern_one.txt"), os.path.join(DIR_PT, "phrase_of_pattern_two.txt")])
+    parser.add_argument("--kind", choices=KINDS, help="ファイル名から種類が分からないときに指定する")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args()
+
+    report = validate(args.files, [args.kind] * len(args.files))
+    if args.json:
+        print(report.to_json())
+    else:
+        report.print()
+    sys.exit(1 if report.has_error() else 0)
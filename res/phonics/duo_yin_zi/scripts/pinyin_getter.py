@@ -2,62 +2,45 @@
 #!/usr/bin/env python
 
 import os
+import sys
 from pypinyin import pinyin, lazy_pinyin, Style
-import requests
-from bs4 import BeautifulSoup
+# src の pinyin_getter と名前が同じなので、src は後ろに足して、使うモジュールだけを import する
+# 百度汉语, 汉典 は pinyin_fetcher で取得する（タイムアウト、キャッシュ、同時に送る数の上限は src と同じ）
+# 辞書は mapping_table_registry で読み込む
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../../src"))
+import pinyin_fetcher
+import mapping_table_registry as mtr
 
 
-BAIDU_URL  = "https://hanyu.baidu.com/s?wd={}&from=zici"
-ZDIC_URL   = "https://www.zdic.net/hans/{}"
-
 MARGED_MAPPING_TABLE    = "marged-mapping-table.txt"
 DIR_OT = "../../../../outputs"
 
 
+# ネットワークを使わずにキャッシュだけで確認するときは、先に pinyin_getter.web_fetcher = pinyin_fetcher.PinyinFetcher(mode="replay") とする
+web_fetcher = None
+
+def get_web_fetcher():
+    global web_fetcher
+    if web_fetcher == None:
+        web_fetcher = pinyin_fetcher.PinyinFetcher()
+    return web_fetcher
+
 def get_pinyin_with_baidu(hanzi):
-    try:
-        html = requests.get(BAIDU_URL.format(hanzi))
-        soup = BeautifulSoup(html.content, "html.parser")
-        elem = soup.find("div", id="pinyin")
-        raw_text = elem.find("b")
-        # [ chóng xiāo ] こんな感じの文字列
-        text = raw_text.get_text()
-        text = text.replace("[ ", "")
-        text = text.replace(" ]", "")
-        pinyins = text.split(" ")
-        # print(pinyins)
-        return pinyins
-    except:
-        # print("not found pinyin")
-        return None
+    return get_web_fetcher().fetch("baidu", hanzi)
 
 def get_pinyin_with_zdic(hanzi):
-    try:
-        html = requests.get(ZDIC_URL.format(hanzi))
-        soup = BeautifulSoup(html.content, "html.parser")
-        elem = soup.find_all(class_="dicpy")
-        text = elem[0].get_text()
-        pinyins = text.split(" ")
-        return pinyins
-    except:
-        # print("not found pinyin")
-        return None
+    return get_web_fetcher().fetch("zdic", hanzi)
 
 def get_pinyin_with_pypinyin(hanzi):
     return [p[0] for p in pinyin(hanzi)]
 
 
+# 辞書（MARGED_MAPPING_TABLE）をプロセス全体で共有する（src の mapping_table_registry.py）
+mapping_table_registry = mtr.MappingTableRegistry( lambda: os.path.join(DIR_OT,MARGED_MAPPING_TABLE) )
+
+# 共有している読み取り専用の辞書を返す
 def get_pinyin_table_with_mapping_table():
-    pinyin_table = {}
-    with open(os.path.join(DIR_OT,MARGED_MAPPING_TABLE), encoding='utf-8') as read_file:
-        for line in read_file:
-            str_unicode = line.split(':')[0]
-            int_unicode = int(str_unicode[2:], 16)
-            hanzi = chr(int_unicode)
-            str_pinyins = line.split(' ')[1]
-            pinyins = str_pinyins.split(",")
-            pinyin_table[hanzi] = pinyins
-    return pinyin_table
+    return mapping_table_registry.get_table()
 
 def get_normal_pinyin():
     pass
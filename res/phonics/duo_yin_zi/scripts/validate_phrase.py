@@ -1,178 +1,104 @@
 #!/usr/bin/env python
 import os
-import re
-import pinyin_getter
-
-PINYIN_MAPPING_TABLE = pinyin_getter.get_pinyin_table_with_mapping_table()
-DEFALT_READING = 0
-
-# 重複している単語（単純な記述ミス）を返す
-def get_duplicate_phrase(PHRASE_TABLE_FILE):
-    phrases = []
-    with open(PHRASE_TABLE_FILE, mode='r', encoding='utf-8') as read_file:
-        for line in read_file:
-            [phrase, _] = line.rstrip('\n').split(': ')
-            phrases.append(phrase)
-    
-    duplicate_phrases = [phrase for phrase in set(phrases) if phrases.count(phrase) > 1]
-    return duplicate_phrases
-
-# 他のパターン（単語）に影響するパターン（単語）を返す
-def get_duplicate_pattern_of_phrase(PHRASE_TABLE_FILE):
-    phrases = []
-    str_consolidated_phrases = ""
-    with open(PHRASE_TABLE_FILE, mode='r', encoding='utf-8') as read_file:
-        for line in read_file:
-            [phrase, _] = line.rstrip('\n').split(': ')
-            str_consolidated_phrases += phrase + "/"
-            phrases.append(phrase)
-
-    duplicate_pattern_of_phrases = []
-    for phrase in phrases:
-        found_phrases = re.findall(phrase, str_consolidated_phrases)
-        if len(found_phrases) > 1:
-            duplicate_pattern_of_phrases.append(phrase)
-            
-    return duplicate_pattern_of_phrases
-    
-# 単語中に置き換わる文字(多音字)が複数ある単語を返す
-def get_multiple_replacement_by_duoyinzi(PHRASE_TABLE_FILE):
-    list_multiple_replacement_by_duoyinzi = []
-    with open(PHRASE_TABLE_FILE, mode='r', encoding='utf-8') as read_file:
-        for line in read_file:
-            [phrase, pinyin_of_phrase] = line.rstrip('\n').split(': ')
-            if 2 <= count_variational_pinyin(phrase, pinyin_of_phrase):
-                list_multiple_replacement_by_duoyinzi.append(phrase)
-    return list_multiple_replacement_by_duoyinzi
-
-def count_variational_pinyin(phrase, pinyin_of_phrase):
-    variational_pinyin_count = 0
-    for i in range(len(phrase)):
-        charactor = phrase[i]
-        normal_pinyin = PINYIN_MAPPING_TABLE[charactor][DEFALT_READING]
-        if normal_pinyin != pinyin_of_phrase.split('/')[i]:
-            variational_pinyin_count += 1
-    return variational_pinyin_count
-
-def get_phrase_dict(PHRASE_TABLE_FILE):
-    phrase_dict = {}
-    with open(PHRASE_TABLE_FILE, mode='r', encoding='utf-8') as read_file:
-        for line in read_file:
-            [phrase, pinyin_of_phrase] = line.rstrip('\n').split(': ')
-            phrase_dict.update( {phrase : pinyin_of_phrase} )
-    return phrase_dict
-
-def pattern_one(PHRASE_TABLE_FILE):    
-
+import sys
+import phrase_validator
+
+# 検証ごとの (問題があったときのメッセージ, 問題が無かったときのメッセージ)
+MESSAGES = {
+    "format"           : ("\"単語: ピンイン/ピンイン\" の形になっていない行があります",
+                          "All lines are well-formed."),
+    "unknown_hanzi"    : ("辞書に無い漢字があります",
+                          "All hanzi(kanji) are in the mapping table."),
+    "pinyin_count"     : ("文字数とピンインの数が違う単語があります",
+                          "The number of pinyin matches the number of hanzi(kanji) in all phrases."),
     # 単語の重複がないか（単純な記述ミス）
     # 対処法
     # -> 重複箇所を消す
-    """
-    背弃: bēi/qì
-    背弃: bēi/qì
-    """
-    duplicate_phrases = get_duplicate_phrase(PHRASE_TABLE_FILE)
-    if len(duplicate_phrases) > 0:
-        print("重複する単語を削除してください")
-        print("Duplicate phrase :")
-        print(duplicate_phrases)
-        exit()
-    else:
-        print("success!")
-        print("Nothing duplicate phrase.")
-        print()
-
+    # 背弃: bēi/qì
+    # 背弃: bēi/qì
+    "duplicate"        : ("重複する単語を削除してください\nDuplicate phrase :",
+                          "Nothing duplicate phrase."),
     # 他のパターン（単語）に影響するパターン（単語）がないか
     # 対処法
     # -> 基本的に文字数が小さいパターンに合わせる。 阿谀 と 胶阿谀 なら 阿谀 を消す。
     #　　 着手: zhuó/shǒu と 背着手: bèi/zhe/shǒu　は両方とも違うので残す
     # 　　轴子 は zhóu が標準的な読みなので 轴子 のパターンが無くても構わない。
-    """
-    阿谀: ē/yú
-    胶阿谀: jiāo/ē/yú
-    轴子: zhóu/zǐ
-    大轴子: dà/zhòu/zǐ
-    压轴子: yā/zhòu/zi
-    """
-    duplicate_pattern_of_phrases = get_duplicate_pattern_of_phrase(PHRASE_TABLE_FILE)
-    if len(duplicate_pattern_of_phrases) > 0:
-        print("重複する単語（パターン）を削除してください")
-        print("There are duplicates that affect other phrases :")
-        print(duplicate_pattern_of_phrases)
-        exit()
-    else:
-        print("success!")
-        print("Nothing duplicates that affect other phrase.")
-    print()
-
+    # 阿谀: ē/yú
+    # 胶阿谀: jiāo/ē/yú
+    # 轴子: zhóu/zǐ
+    # 大轴子: dà/zhòu/zǐ
+    # 压轴子: yā/zhòu/zi
+    "contained"        : ("重複する単語（パターン）を削除してください\nThere are duplicates that affect other phrases :",
+                          "Nothing duplicates that affect other phrase."),
     # 単語中に異読字が２個以上ないか
     # 対処法
     # -> 別ファイル(pattern_two)へ
-    """
-    参差: cēn/cī
-    参: cān -> cēn
-    差: chà -> cī
-    """
-    list_multiple_replacement_by_duoyinzi = get_multiple_replacement_by_duoyinzi(PHRASE_TABLE_FILE)
-    if len(list_multiple_replacement_by_duoyinzi) > 0:
-        print("単語を phrase_of_pattern_two.txt に移動させてください")
-        print("There is more than one hanzi(kanji) that can be replaced by variational pronunciation in a phrase : ")
-        print(list_multiple_replacement_by_duoyinzi)
-        exit()
-    else:
-        print("success!")
-        print("There is no more than one hanzi(kanji) that can be replaced by variational pronunciation in a phrase.")
-    print()
-
-
-def pattern_two(PHRASE_TABLE_FILE):    
-
-    # 単語の重複がないか（単純な記述ミス）
-    duplicate_phrases = get_duplicate_phrase(PHRASE_TABLE_FILE)
-    if len(duplicate_phrases) > 0:
-        print("重複する単語を削除してください")
-        print("Duplicate phrase :")
-        print(duplicate_phrases)
-        exit()
-    else:
-        print("success!")
-        print("Nothing duplicate phrase.")
+    # 参差: cēn/cī
+    # 参: cān -> cēn
+    # 差: chà -> cī
+    "multiple_variant" : ("単語を phrase_of_pattern_two.txt に移動させてください\nThere is more than one hanzi(kanji) that can be replaced by variational pronunciation in a phrase : ",
+                          "There is no more than one hanzi(kanji) that can be replaced by variational pronunciation in a phrase."),
+    # すべての単語が単語中に異読字が 2個以上あるか
+    "single_variant"   : ("単語を phrase_of_pattern_one.txt に移動、もしくは削除してください。\nThere is less than one different reading hanzi(kanji) in the phrase : ",
+                          "There is more than one hanzi(kanji) that can be replaced by Pinyin in a phrase.")
+}
+
+PATTERN_ONE_CHECKS = ["format", "unknown_hanzi", "pinyin_count", "duplicate", "contained", "multiple_variant"]
+PATTERN_TWO_CHECKS = ["format", "unknown_hanzi", "pinyin_count", "duplicate", "single_variant"]
+
+# 検証の結果をすべて表示する
+def print_report(report, checks):
+    for check in checks:
+        (error_message, success_message) = MESSAGES[check]
+        issues = report.get_issues(check=check)
+        if len(issues) > 0:
+            print(error_message)
+            for issue in issues:
+                print("{}:{}: {} <- {}".format(issue["file"], issue["line"], issue["phrase"], issue["message"]))
+        else:
+            print("success!")
+            print(success_message)
         print()
 
-    # すべての単語が単語中に異読字が 2個以上あるか
-    """
-    参差: cēn/cī
-    参: cān -> cēn
-    差: chà -> cī
-    """
-    list_multiple_replacement_by_duoyinzi = get_multiple_replacement_by_duoyinzi(PHRASE_TABLE_FILE)
-    phrase_dict = get_phrase_dict(PHRASE_TABLE_FILE)
-    if len(list_multiple_replacement_by_duoyinzi) != len(phrase_dict):
-        print("単語を phrase_of_pattern_one.txt に移動、もしくは削除してください。")
-        print("There is less than one different reading hanzi(kanji) in the phrase : ")
-        for phrase, str_pinyin in phrase_dict.items():
-            if not (phrase in list_multiple_replacement_by_duoyinzi):
-                if   count_variational_pinyin(phrase, str_pinyin) == 0:
-                    print("{} <- delete it.".format(phrase))
-                elif count_variational_pinyin(phrase, str_pinyin) == 1:
-                    print("{} <- move it.".format(phrase))
-                else:
-                    print("{} <- error.")
-        exit()
-    else:
-        print("success!")
-        print("There is more than one hanzi(kanji) that can be replaced by Pinyin in a phrase.")
-    print()
-        
+# 他のファイルの単語に含まれている単語を表示する（確認用。エラーにはしない）
+def print_overlap(report):
+    issues = report.get_issues(check="overlap")
+    print("Phrases contained in other phrases : {}".format(len(issues)))
+    for issue in issues:
+        print("{}:{}: {} <- {}".format(issue["file"], issue["line"], issue["phrase"], issue["message"]))
+
+# exit_on_error が True なら、問題があったときに終了コード 1 で終了する（パターンのファイルを作る前の確認で使う）
+def pattern_one(PHRASE_TABLE_FILE, exit_on_error=True):
+    report = phrase_validator.validate([PHRASE_TABLE_FILE], [phrase_validator.PATTERN_ONE])
+    print_report(report, PATTERN_ONE_CHECKS)
+    if exit_on_error and report.has_error():
+        sys.exit(1)
+    return report
+
+def pattern_two(PHRASE_TABLE_FILE, exit_on_error=True):
+    report = phrase_validator.validate([PHRASE_TABLE_FILE], [phrase_validator.PATTERN_TWO])
+    print_report(report, PATTERN_TWO_CHECKS)
+    if exit_on_error and report.has_error():
+        sys.exit(1)
+    return report
+
 if __name__ == '__main__':
     DIR_PT = "../"
-    PHRASE_TABLE = "phrase_of_pattern_one.txt"
-    PHRASE_TABLE_FILE = os.path.join(DIR_PT, PHRASE_TABLE)
-    pattern_one(PHRASE_TABLE_FILE)
+    # 両方のファイルの結果を表示してから、問題があれば終了コード 1 で終了する
+    PHRASE_ONE_TABLE_FILE = os.path.join(DIR_PT, "phrase_of_pattern_one.txt")
+    report_one = pattern_one(PHRASE_ONE_TABLE_FILE, exit_on_error=False)
+
+    print("========================================================================")
+
+    PHRASE_TWO_TABLE_FILE = os.path.join(DIR_PT, "phrase_of_pattern_two.txt")
+    report_two = pattern_two(PHRASE_TWO_TABLE_FILE, exit_on_error=False)
 
     print("========================================================================")
 
-    PHRASE_TABLE = "phrase_of_pattern_two.txt"
-    PHRASE_TABLE_FILE = os.path.join(DIR_PT, PHRASE_TABLE)
-    pattern_two(PHRASE_TABLE_FILE)
+    # pattern_one と pattern_two をまとめて、他のファイルの単語を含む単語を表示する（確認用）
+    overlap_report = phrase_validator.Report()
+    phrase_validator.check_overlap([phrase_validator.PhraseFile(PHRASE_ONE_TABLE_FILE, phrase_validator.PATTERN_ONE),
+                                    phrase_validator.PhraseFile(PHRASE_TWO_TABLE_FILE, phrase_validator.PATTERN_TWO)], overlap_report)
+    print_overlap(overlap_report)
 
+    sys.exit(1 if report_one.has_error() or report_two.has_error() else 0)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 # python3 make_unicode_pinyin_map_table.py 
+# python3 make_unicode_pinyin_map_table.py --force
 
 # 通用规范汉字表 と Big5-2003 から必要な文字コードを生成する
 
@@ -9,7 +10,11 @@
 # [[python] JSONファイルのフォーマットを整えてDumpする](https://qiita.com/Hyperion13fleet/items/7129623ab32bdcc6e203)
 import urllib.request, urllib.error
 import os
+import sys
 import json
+import argparse
+import concurrent.futures
+import pypinyin
 from pypinyin import pinyin, lazy_pinyin, Style
 
 # マッピングテーブルを取得する
@@ -28,6 +33,21 @@ OVERWRITE_MAPPING_TABLE = "overwrite.txt"
 MARGED_MAPPING_TABLE    = "marged-mapping-table.txt"
 DIR_OT = "../../../outputs"
 
+# 前回の生成に使った pypinyin のバージョン
+# 同じバージョンなら、既存の TGSCC-mapping-table.txt と BIG5-mapping-table.txt の行を使い回して、新しい文字だけを変換する
+STATE_JSON = "../../../tmp/cache/unicode_mapping_table_state.json"
+# 変換する文字がこれより少ないときは、プロセスを立ち上げずに変換する
+MIN_PARALLEL_NUM = 1000
+# 一つのプロセスにまとめて渡す文字数
+CHUNK_SIZE = 256
+
+# 繁体字 のこの範囲は漢字以外の文字なので削除する
+# U+00A7 - U+33D5 英字、記号、ひらがな等
+# U+E000 - U+F6B0 私用領域
+# U+FE30 - U+FE4F CJK互換形(縦書き用記号グリフ)
+# U+FF00 - U+FFE5 半角・全角形(Halfwidth and Fullwidth Forms)
+RANGES_WITHOUT_HANZI_4_BIG5 = [(0x00A7, 0x33D5), (0xE000, 0xF6B0), (0xFE30, 0xFFE5)]
+
 # テーブルをダウンロードする
 def download_table_texts():
     # 簡体字
@@ -61,8 +81,69 @@ def download_table_texts():
             raise e
 
 
+def load_state():
+    if not os.path.exists(STATE_JSON):
+        return {}
+    with open(STATE_JSON, mode='r', encoding='utf-8') as read_file:
+        return json.load(read_file)
+
+def save_state():
+    os.makedirs(os.path.dirname(STATE_JSON), exist_ok=True)
+    with open(STATE_JSON, mode='w', encoding='utf-8') as write_file:
+        json.dump({"pypinyin": pypinyin.__version__}, write_file, indent=2)
+
+# 一文字分の行 e.g.: "U+4E2D: zhōng,zhòng  #中\n"
+def get_mapping_line(_unicode):
+    character = chr(_unicode)
+    str_pinyins = ""
+    pinyin_list = pinyin(character, heteronym=True)[0]
+    for p in pinyin_list:
+        str_pinyins += "{},".format(p) if p != pinyin_list[-1] else p
+    return "U+{:X}: {}  #{}\n".format(_unicode, str_pinyins, character)
+
+# 多いときは、複数のプロセスでまとめて変換する
+def get_mapping_lines(unicode_table):
+    if len(unicode_table) < MIN_PARALLEL_NUM:
+        return [get_mapping_line(_unicode) for _unicode in unicode_table]
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        return list(executor.map(get_mapping_line, unicode_table, chunksize=CHUNK_SIZE))
+
+# {int_unicode: line}
+def read_mapping_table(MAPPING_TABLE, skip_line_num=0):
+    mapping_table = {}
+    if not os.path.exists(MAPPING_TABLE):
+        return mapping_table
+    with open(MAPPING_TABLE, mode='r', encoding='utf-8') as read_file:
+        for i in range(skip_line_num):
+            read_file.readline()
+        for line in read_file:
+            # "U+4ECD" -> "4ECD" -> 20173　ソートのために文字列から数値にする
+            str_unicode = line.rstrip('\n').split(':')[0]
+            int_unicode =  int(str_unicode[2:], 16)
+            mapping_table.update( {int_unicode: line} )
+    return mapping_table
+
+# 中身が変わったときだけ書き込む
+def write_if_changed(file_path, text):
+    if os.path.exists(file_path):
+        with open(file_path, mode='r', encoding='utf-8') as read_file:
+            if read_file.read() == text:
+                return False
+    with open(file_path, mode='w', encoding='utf-8') as write_file:
+        write_file.write(text)
+    return True
+
+# unicode_table の文字の行を書き出す。is_reusable なら、既にある行はそのまま使う
+def write_mapping_table(unicode_table, MAPPING_TABLE, is_reusable):
+    old_mapping_table = read_mapping_table(MAPPING_TABLE) if is_reusable else {}
+    new_unicode_table = sorted( set(unicode_table) - set(old_mapping_table.keys()) )
+    new_mapping_table = dict( zip(new_unicode_table, get_mapping_lines(new_unicode_table)) )
+    lines = [ old_mapping_table[_unicode] if _unicode in old_mapping_table else new_mapping_table[_unicode] for _unicode in unicode_table ]
+    is_changed = write_if_changed(MAPPING_TABLE, "".join(lines))
+    print("{}: {} 文字 (変換: {}, {})".format(MAPPING_TABLE, len(unicode_table), len(new_unicode_table), "更新" if is_changed else "変更なし"))
+
 # 簡体字の情報取得する
-def get_simplified_chinese_mapping_tables():
+def get_simplified_chinese_mapping_tables(is_reusable=False):
     unicode_table = []
     # 中身こんな感じ
     '''
@@ -84,18 +165,11 @@ def get_simplified_chinese_mapping_tables():
             unicode_table.append(int_unicode)
 
     unicode_table.sort()
-    with open(TGSCC_MAPPING_TABLE, mode='w', encoding='utf-8') as write_file:
-        for _unicode in unicode_table:
-            character = chr(_unicode)
-            str_pinyins = ""
-            pinyin_list = pinyin(character, heteronym=True)[0]
-            for p in pinyin_list:
-                str_pinyins += "{},".format(p) if p != pinyin_list[-1] else p
-            write_file.write("U+{:X}: {}  #{}\n".format(_unicode, str_pinyins, character))
+    write_mapping_table(unicode_table, TGSCC_MAPPING_TABLE, is_reusable)
 
 
 # 繁体字の情報取得する
-def get_traditional_chinese_mapping_tables():
+def get_traditional_chinese_mapping_tables(is_reusable=False):
     unicode_table = []
     # 中身こんな感じ
     '''
@@ -115,104 +189,45 @@ def get_traditional_chinese_mapping_tables():
 
     unicode_table.sort()
     unicode_table = deleteWithoutHunzi4big5(unicode_table)
-
-    with open(BIG5_MAPPING_TABLE, mode='w', encoding='utf-8') as write_file:
-        for _unicode in unicode_table:
-            character = chr(_unicode)
-            str_pinyins = ""
-            pinyin_list = pinyin(character, heteronym=True)[0]
-            for p in pinyin_list:
-                str_pinyins += "{},".format(p) if p != pinyin_list[-1] else p
-            write_file.write("U+{:X}: {}  #{}\n".format(_unicode, str_pinyins, character))
+    write_mapping_table(unicode_table, BIG5_MAPPING_TABLE, is_reusable)
 
 
 # 繁体字 の漢字以外のコードを消す
 def deleteWithoutHunzi4big5(unicode_table):
-    _unicode_table = unicode_table.copy()
-    # 繁体字 のこの範囲は漢字以外の文字なので削除する
-    # U+00A7 - U+33D5 英字、記号、ひらがな等
-    # U+E000 - U+F6B0 私用領域
-    # U+FE30 - U+FE4F CJK互換形(縦書き用記号グリフ)
-    # U+FF00 - U+FFE5 半角・全角形(Halfwidth and Fullwidth Forms)
-    for uc in unicode_table:
-        if int("00A7", 16) <= uc and uc <= int("33D5", 16):
-            _unicode_table.remove(uc)
-        elif int("E000", 16) <= uc and uc <= int("F6B0", 16):
-            _unicode_table.remove(uc)
-        elif int("FE30", 16) <= uc and uc <= int("FFE5", 16):
-            _unicode_table.remove(uc)
-
-    return _unicode_table
+    return [uc for uc in unicode_table if not any(start <= uc and uc <= end for (start, end) in RANGES_WITHOUT_HANZI_4_BIG5)]
 
 # TGSCC-mapping-table.txt と BIG5-mapping-table.txt を統合する
+# 重複している文字は BIG5-mapping-table.txt の行を使う
 def marge_mapping_table():
-    marged_mapping_table = {}
-    unicode_list_for_sort = []
-
-    # 簡体字
-    with open(TGSCC_MAPPING_TABLE, mode='r', encoding='utf-8') as read_file:
-        for line in read_file:
-            # "U+4ECD" -> "4ECD" -> 20173　ソートのために文字列から数値にする
-            str_unicode = line.rstrip('\n').split(':')[0]
-            int_unicode =  int(str_unicode[2:], 16)
-            unicode_list_for_sort.append(int_unicode)
-            marged_mapping_table.update( {int_unicode: line} )
-    # 繁体字
-    with open(BIG5_MAPPING_TABLE, mode='r', encoding='utf-8') as read_file:
-        for line in read_file:
-            str_unicode = line.rstrip('\n').split(':')[0]
-            int_unicode =  int(str_unicode[2:], 16)
-            unicode_list_for_sort.append(int_unicode)
-            marged_mapping_table.update( {int_unicode: line} )
-
-    # 重複を削除
-    unicode_list_for_sort = list(set(unicode_list_for_sort))
-    unicode_list_for_sort.sort()
-
-    with open(os.path.join(DIR_OT, MARGED_MAPPING_TABLE), mode='w', encoding='utf-8') as write_file:
-        for int_unicode in unicode_list_for_sort:
-            write_file.write(marged_mapping_table[int_unicode])
+    marged_mapping_table = read_mapping_table(TGSCC_MAPPING_TABLE)
+    marged_mapping_table.update( read_mapping_table(BIG5_MAPPING_TABLE) )
+    return marged_mapping_table
 
 # pinyin を上書きする（pypinyin で変換できなかったもの誤っているものの修正）
-def overwrite_pinyin():
-    marged_mapping_table = {}
-    unicode_list_for_sort = []
-    header = ""
-
-    with open(os.path.join(DIR_OT, MARGED_MAPPING_TABLE), mode='r', encoding='utf-8') as read_file:
-        for line in read_file:
-            # "U+4ECD" -> "4ECD" -> 20173　ソートのために文字列から数値にする
-            str_unicode = line.rstrip('\n').split(':')[0]
-            int_unicode =  int(str_unicode[2:], 16)
-            unicode_list_for_sort.append(int_unicode)
-            marged_mapping_table.update( {int_unicode: line} )
-
-    with open(OVERWRITE_MAPPING_TABLE, mode='r', encoding='utf-8') as read_file:
-        # 3行分読み飛ばす
-        for i in range(3):
-            header += read_file.readline()
-        for line in read_file:
-            str_unicode = line.rstrip('\n').split(':')[0]
-            int_unicode =  int(str_unicode[2:], 16)
-            unicode_list_for_sort.append(int_unicode)
-            marged_mapping_table.update( {int_unicode: line} )
-
-    # 重複を削除
-    unicode_list_for_sort = list(set(unicode_list_for_sort))
-    unicode_list_for_sort.sort()
-
-    with open(os.path.join(DIR_OT, MARGED_MAPPING_TABLE), mode='w', encoding='utf-8') as write_file:
-        for int_unicode in unicode_list_for_sort:
-            write_file.write(marged_mapping_table[int_unicode])
+def overwrite_pinyin(marged_mapping_table):
+    # 3行分（ヘッダー）読み飛ばす
+    marged_mapping_table.update( read_mapping_table(OVERWRITE_MAPPING_TABLE, skip_line_num=3) )
+    return marged_mapping_table
 
 
 # 漢字以外のコードを消すのと足りないpinyinを追加
-def create_unicode_pinyin_table():
+def create_unicode_pinyin_table(force=False):
     # download_table_texts()
-    get_simplified_chinese_mapping_tables()
-    get_traditional_chinese_mapping_tables()
-    marge_mapping_table()
-    overwrite_pinyin()
+    is_reusable = not force and load_state().get("pypinyin") == pypinyin.__version__
+    get_simplified_chinese_mapping_tables(is_reusable)
+    get_traditional_chinese_mapping_tables(is_reusable)
+    # 統合と上書きはメモリ上で行い、最後に一度だけ書き出す
+    marged_mapping_table = overwrite_pinyin( marge_mapping_table() )
+    MARGED_MAPPING_TABLE_TXT = os.path.join(DIR_OT, MARGED_MAPPING_TABLE)
+    is_changed = write_if_changed(MARGED_MAPPING_TABLE_TXT, "".join( [marged_mapping_table[int_unicode] for int_unicode in sorted(marged_mapping_table.keys())] ))
+    print("{}: {} 文字 ({})".format(MARGED_MAPPING_TABLE_TXT, len(marged_mapping_table), "更新" if is_changed else "変更なし"))
+    save_state()
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Make the unicode-pinyin mapping table")
+    parser.add_argument('--force', action='store_true', help="既存のテーブルを使わずに、すべての文字を pypinyin で変換し直す")
+    return parser.parse_args(args)
 
 if __name__ == '__main__':
-    create_unicode_pinyin_table()
+    options = parse_args(sys.argv[1:])
+    create_unicode_pinyin_table(options.force)
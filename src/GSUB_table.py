@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python
 
-import re
-import orjson
 import pinyin_getter as pg
 import utility
+import subset
+import pattern_ir
+import gsub_size
 
 class GSUBTable():
     
@@ -122,34 +123,11 @@ class GSUBTable():
     
 
     def load_pattern_table(self):
-        self.pattern_one = [{}]
-        self.pattern_two = {}
-        self.exception_pattern = {}
-        with open(self.PATTERN_ONE_TXT, mode='r', encoding='utf-8') as read_file:
-            for line in read_file:
-                [str_order, hanzi, pinyin, patterns] = line.rstrip('\n').split(', ')
-                order = int(str_order)
-                # self.PATTERN_ONE_TXT の order = 1 は標準的なピンインなので無視する
-                if 1 == order:
-                    continue
-                # 2 から異読のピンイン。添字に使うために -2 して 0 にする。
-                idx = order-2
-                if len(self.pattern_one) <= idx:
-                    self.pattern_one.append({})
-                tmp = self.pattern_one[idx]
-                tmp.update(
-                    {
-                        hanzi:{
-                            "variational_pronunciation": pinyin,
-                            "patterns": patterns
-                        }
-                    }
-                )
-                
-        with open(self.PATTERN_TWO_JSON, "rb") as read_file:
-            self.pattern_two = orjson.loads(read_file.read())
-        with open(self.EXCEPTION_PATTERN_JSON, "rb") as read_file:
-            self.exception_pattern = orjson.loads(read_file.read())
+        # パターンのファイルは pattern_ir で型付きのルールにしたもの（キャッシュがあればそれ）を使う
+        self.pattern_ir = pattern_ir.load_patterns(self.PATTERN_ONE_TXT, self.PATTERN_TWO_JSON, self.EXCEPTION_PATTERN_JSON)
+        # サブセットのときは、文脈の漢字がすべてフォントに含まれるパターンだけを使う
+        if subset.is_enabled():
+            self.pattern_ir = subset.filter_pattern_ir(self.pattern_ir)
 
     def make_aalt_feature(self):
         """
@@ -194,66 +172,32 @@ class GSUBTable():
         aalt_1_subtables = lookup_tables["lookup_aalt_1"]["subtables"][0]
 
         # add
-        for (hanzi, _) in utility.get_has_single_pinyin_hanzi():
-            str_unicode = str(ord(hanzi))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+        for record in utility.get_single_pinyin_hanzi_records():
+            cid = utility.convert_str_hanzi_2_cid(record.hanzi) if record.cid == None else record.cid
             aalt_0_subtables.update( {cid : "{}.ss00".format(cid) } )
         self.lookup_order.add( "lookup_aalt_0" )
 
-        for (hanzi, pinyins) in utility.get_has_multiple_pinyin_hanzi():
-            str_unicode = str(ord(hanzi))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
-            alternate_list = []
+        for record in utility.get_multiple_pinyin_hanzi_records():
+            cid = utility.convert_str_hanzi_2_cid(record.hanzi) if record.cid == None else record.cid
             # ss00 は ピンインのないグリフ なので、ピンインのグリフは "ss{:02}".format(len) まで
-            for i in range( len(pinyins)+1 ):
-                alternate_list.append("{}.ss{:02}".format(cid, i))
+            alternate_list = [ "{}.ss{:02}".format(cid, i) for i in range( record.ss_num ) ]
             aalt_1_subtables.update( {cid : alternate_list } )
         self.lookup_order.add( "lookup_aalt_1" )
 
     def make_rclt0_feature(self):
         # pattern one
-        max_num_of_variational_pinyin = len(self.pattern_one)
         """
-        self.pattern_one の中身
-        e.g.:
-        [
-            {
-                "行":{
-                    "variational_pronunciation":"háng",
-                    "patterns":"[~当|~家|~间|~列|~情|~业|发~|同~|外~|银~|~话|~会|~距]"
-                },
-                "作":{
-                    "variational_pronunciation":"zuō",
-                    "patterns":"[~坊|~弄|~揖]"
-                }
-            },
-            {
-                "行":{
-                    "variational_pronunciation":"hàng",
-                    "patterns":"[树~子]"
-                },
-                "作":{
-                    "variational_pronunciation":"zuó",
-                    "patterns":"[~料]"
-                }
-            },
-            {
-                "行":{
-                    "variational_pronunciation":"héng",
-                    "patterns":"[道~]"
-                },
-                "作":{
-                    "variational_pronunciation":"zuo",
-                    "patterns":"[做~]"
-                }
-            }
-        ]
+        self.pattern_ir.pattern_one の中身 (pattern_ir.PatternOneRule)
+        e.g.: 行
+        1, 行, xíng, [~走|~人]                                   -> 標準の読みなので無い
+        2, 行, háng, [~当|~家|发~|同~|外~人]                     -> PatternOneRule("行", 0, "háng", ("当", "家"), ("发", "同"), (("外行人", 1),))
+        3, 行, hàng, [树~子]                                     -> PatternOneRule("行", 1, "hàng", (), (), (("树行子", 1),))
         """
         lookup_tables = self.GSUB["lookups"]
         # init 
-        if max_num_of_variational_pinyin > 10:
+        if self.pattern_ir.slot_num > 10:
             raise Exception("ピンインは10通りまでしか対応していません")
-        for idx in range(max_num_of_variational_pinyin):
+        for idx in range(self.pattern_ir.slot_num):
             lookup_name = "lookup_pattern_0{}".format(idx)
             lookup_tables.update( 
                 { 
@@ -267,193 +211,132 @@ class GSUBTable():
             self.lookup_order.add( lookup_name )
         # add
         list_rclt_0_subtables = lookup_tables["lookup_rclt_0"]["subtables"]
-        for idx in range(max_num_of_variational_pinyin):
+        for rule in self.pattern_ir.pattern_one:
             # to lookup table for replacing
-            lookup_name = "lookup_pattern_0{}".format(idx)
-            lookup_table_subtables = lookup_tables[lookup_name]["subtables"][0]
-            for apply_hanzi in self.pattern_one[idx].keys():
-                apply_hanzi_cid = utility.convert_str_hanzi_2_cid(apply_hanzi)
-                lookup_table_subtables.update( { apply_hanzi_cid : "{}.ss{:02}".format(apply_hanzi_cid, pg.SS_VARIATIONAL_PRONUNCIATION + idx) } )
-                # to rclt0
-                str_patterns = self.pattern_one[idx][apply_hanzi]["patterns"]
-                
-                patterns = str_patterns.strip("[]").split('|') 
-                # まとめて記述できるもの
-                # e.g.:
-                # sub [uni4E0D uni9280] uni884C' lookup lookup_0 ;
-                # sub uni884C' lookup lookup_0　[uni4E0D uni9280] ;
-                left_match  = [s for s in patterns if re.match("^~.$", s)]
-                right_match = [s for s in patterns if re.match("^.~$", s)]
-                # 一つ一つ記述するもの
-                # e.g.:
-                # sub uni85CF' lookup lookup_0 uni7D05 uni82B1 ;
-                other_match = [s for s in patterns if not (s in (left_match + right_match))]
+            lookup_name = "lookup_pattern_0{}".format(rule.slot)
+            apply_hanzi_cid = utility.convert_str_hanzi_2_cid(rule.target)
+            lookup_tables[lookup_name]["subtables"][0].update( { apply_hanzi_cid : "{}.ss{:02}".format(apply_hanzi_cid, pg.SS_VARIATIONAL_PRONUNCIATION + rule.slot) } )
+            # to rclt0
+            # まとめて記述できるもの
+            # e.g.:
+            # sub [uni4E0D uni9280] uni884C' lookup lookup_0 ;
+            # sub uni884C' lookup lookup_0　[uni4E0D uni9280] ;
+            if len(rule.left_match) > 0:
+                list_rclt_0_subtables.append(
+                    {
+                        "match": [ [apply_hanzi_cid], [ utility.convert_str_hanzi_2_cid(context_hanzi) for context_hanzi in rule.left_match ] ],
+                        "apply": [
+                            {
+                            "at": 0,
+                            "lookup": lookup_name
+                            }
+                        ],
+                        "inputBegins": 0,
+                        "inputEnds": 1
+                    }
+                )
 
-                if len(left_match) > 0:
-                    context_hanzi_cids = [ utility.convert_str_hanzi_2_cid(context_hanzi) for context_hanzi in [context_hanzi.replace("~","") for context_hanzi in left_match] ]
-                    list_rclt_0_subtables.append(
-                        {
-                            "match": [ [apply_hanzi_cid], context_hanzi_cids ],
-                            "apply": [
-                                {
-                                "at": 0,
-                                "lookup": lookup_name
-                                }
-                            ],
-                            "inputBegins": 0,
-                            "inputEnds": 1
-                        }
-                    )
-                
-                if len(right_match) > 0:
-                    context_hanzi_cids = [ utility.convert_str_hanzi_2_cid(context_hanzi) for context_hanzi in [context_hanzi.replace("~","") for context_hanzi in right_match] ]
-                    list_rclt_0_subtables.append(
-                        {
-                            "match": [ context_hanzi_cids, [apply_hanzi_cid] ],
-                            "apply": [
-                                {
-                                "at": 1,
-                                "lookup": "lookup_pattern_0{}".format(idx)
-                                }
-                            ],
-                            "inputBegins": 1,
-                            "inputEnds": 2
-                        }
-                    )
+            if len(rule.right_match) > 0:
+                list_rclt_0_subtables.append(
+                    {
+                        "match": [ [ utility.convert_str_hanzi_2_cid(context_hanzi) for context_hanzi in rule.right_match ], [apply_hanzi_cid] ],
+                        "apply": [
+                            {
+                            "at": 1,
+                            "lookup": lookup_name
+                            }
+                        ],
+                        "inputBegins": 1,
+                        "inputEnds": 2
+                    }
+                )
 
-                for match_pattern in other_match:
-                    at = match_pattern.index("~")
-                    list_rclt_0_subtables.append(
-                        {
-                            "match": [ [utility.convert_str_hanzi_2_cid(hanzi)] for hanzi in match_pattern.replace("~", apply_hanzi) ],
-                            "apply": [
-                                {
-                                "at": at,
-                                "lookup": "lookup_pattern_0{}".format(idx)
-                                }
-                            ],
-                            "inputBegins": at,
-                            "inputEnds": at + 1
-                        }
-                    )
-    
-    def make_rclt1_feature(self):
-        # pattern two
+            # 一つ一つ記述するもの
+            # e.g.:
+            # sub uni85CF' lookup lookup_0 uni7D05 uni82B1 ;
+            for (phrase, at) in rule.other_match:
+                list_rclt_0_subtables.append(
+                    {
+                        "match": [ [utility.convert_str_hanzi_2_cid(hanzi)] for hanzi in phrase ],
+                        "apply": [
+                            {
+                            "at": at,
+                            "lookup": lookup_name
+                            }
+                        ],
+                        "inputBegins": at,
+                        "inputEnds": at + 1
+                    }
+                )
+
+    # pattern two, exception pattern の置き換え用の lookup を作る
+    def add_replacing_lookups(self, lookups):
         lookup_tables = self.GSUB["lookups"]
-        # to lookup table for replacing
-        for lookup_name, table in self.pattern_two["lookup_table"].items():
-            # init
+        for lookup_name, table in lookups.items():
+            # e,g. "差": 5 -> "cid16957": "cid16957.ss05"
             lookup_tables.update( 
                 { 
                     lookup_name : {
                         "type": "gsub_single",
                         "flags": {},
-                        "subtables": [{}]
+                        "subtables": [ { utility.convert_str_hanzi_2_cid(hanzi) : "{}.ss{:02}".format(utility.convert_str_hanzi_2_cid(hanzi), ss_num) for hanzi, ss_num in table.items() } ]
                     }
                 } 
             )
-            # add
-            lookup_table_subtables = lookup_tables[lookup_name]["subtables"][0]
-            # e,g. "差": "差.ss05", -> "cid16957": "cid16957.ss05"
-            lookup_table_subtables.update( { utility.convert_str_hanzi_2_cid(k): v.replace(k,utility.convert_str_hanzi_2_cid(k)) for k,v in table.items() } )
             self.lookup_order.add( lookup_name )
+
+    # pattern_ir.PhraseRule を chaining の subtable にする
+    def make_phrase_subtables(self, rule):
+        subtables = []
+        # ignore のパターンがあれば記述する
+        if rule.ignore != None:
+            (ignore_phrase, at) = rule.ignore
+            subtables.append(
+                {
+                    "match": [ [utility.convert_str_hanzi_2_cid(hanzi)] for hanzi in ignore_phrase ],
+                    "apply": [],
+                    "inputBegins": at,
+                    "inputEnds": at + 1
+                }
+            )
+        # 期待する普通のパターン
+        ats = [ at for (at, _) in rule.applies ]
+        subtables.append(
+            {
+                "match": [ [utility.convert_str_hanzi_2_cid(hanzi)] for hanzi in rule.phrase ],
+                "apply": [ { "at": at, "lookup": lookup_name } for (at, lookup_name) in rule.applies ],
+                "inputBegins": min(ats),
+                "inputEnds": max(ats) + 1
+            }
+        )
+        return subtables
+
+    def make_rclt1_feature(self):
+        # pattern two
+        self.add_replacing_lookups(self.pattern_ir.pattern_two_lookups)
         # to rclt1
-        list_rclt_1_subtables = lookup_tables["lookup_rclt_1"]["subtables"]
-        for phrase, list_pattern_table in self.pattern_two["patterns"].items():
-            applies = [] 
-            ats = [] 
-            for i in range(len(list_pattern_table)):
-                table = list_pattern_table[i]
-                # 要素は一つしかない. ほかに綺麗に取り出す方法が思いつかない.
-                lookup_name = list(table.values())[0]
-                if lookup_name != None:
-                    ats.append(i)
-                    applies.append(
-                        {
-                            "at": i,
-                            "lookup": lookup_name
-                        }
-                    )
-            
-            list_rclt_1_subtables.append(
-                        {
-                            "match": [ [utility.convert_str_hanzi_2_cid(hanzi)] for hanzi in phrase ],
-                            "apply": applies,
-                            "inputBegins": min(ats),
-                            "inputEnds": max(ats) + 1
-                        }
-                    )
+        list_rclt_1_subtables = self.GSUB["lookups"]["lookup_rclt_1"]["subtables"]
+        for rule in self.pattern_ir.pattern_two:
+            list_rclt_1_subtables.extend( self.make_phrase_subtables(rule) )
     
     def make_rclt2_feature(self):
         # exception pattern
-        lookup_tables = self.GSUB["lookups"]
-        # to lookup table for replacing
-        for lookup_name, table in self.exception_pattern["lookup_table"].items():
-            # init
-            lookup_tables.update( 
-                { 
-                    lookup_name : {
-                        "type": "gsub_single",
-                        "flags": {},
-                        "subtables": [{}]
-                    }
-                } 
-            )
-            # add
-            lookup_table_subtables = lookup_tables[lookup_name]["subtables"][0]
-            # e,g. "着": "着.ss02",, -> "cid28651": "cid28651.ss05"
-            lookup_table_subtables.update( { utility.convert_str_hanzi_2_cid(k): v.replace(k,utility.convert_str_hanzi_2_cid(k)) for k,v in table.items() } )
-            self.lookup_order.add( lookup_name )
+        self.add_replacing_lookups(self.pattern_ir.exception_lookups)
         # to rclt2
-        list_rclt_2_subtables = lookup_tables["lookup_rclt_2"]["subtables"]
-        for phrase, setting_of_phrase in self.exception_pattern["patterns"].items():
-            ignore_pattern     = setting_of_phrase["ignore"]
-            list_pattern_table = setting_of_phrase["pattern"]
+        list_rclt_2_subtables = self.GSUB["lookups"]["lookup_rclt_2"]["subtables"]
+        for rule in self.pattern_ir.exception_pattern:
+            list_rclt_2_subtables.extend( self.make_phrase_subtables(rule) )
+
+    def split_large_subtables(self):
+        # オフセットは 16 ビットなので、大きくなった subtable は書き出す前に分ける（gsub_size.py）
+        # {グリフ名: 置き換え先} の subtable は、同じ lookup の中で分ける（置き換えの結果は変わらない）
+        # chaining の lookup は分けない（別の lookup にすると、一致した入力の中の位置や、前の lookup が置き換えたグリフにも後の lookup が一致してしまう）。
+        # 大きくなった lookup は extension (lookup type 7) にして書き出す。fontTools のバックエンドは gsub_size.estimate_lookups を見て、otfccbuild は自分で extension にする
+        for lookup in self.GSUB["lookups"].values():
+            if lookup["type"] == "gsub_chaining":
+                continue
+            lookup["subtables"] = [ subtable for large_subtable in lookup["subtables"] for subtable in gsub_size.split_glyph_subtable(lookup["type"], large_subtable) ]
 
-            # ignore のパターンがあれば記述する
-            if ignore_pattern != None:
-                list_ignore_pattern = ignore_pattern.split(' ')
-                tmp = [ hanzi for hanzi in list_ignore_pattern if re.match(".'", hanzi) ]
-                if len(tmp) == 1:
-                    apply_hanzi = tmp[0]
-                else:
-                    # 現在は、対象('がある)漢字はひとつだけと想定している
-                    raise Exception("exception pattern の ignore 記述が間違っています。: \n {}".format(ignore_pattern))
-                # 空白とシングルコートを削除
-                ignore_phrase = ignore_pattern.replace(" ", "").replace("'", "")
-                at = list_ignore_pattern.index(apply_hanzi)
-                list_rclt_2_subtables.append(
-                        {
-                            "match": [ [utility.convert_str_hanzi_2_cid(hanzi)] for hanzi in ignore_phrase ],
-                            "apply": [],
-                            "inputBegins": at,
-                            "inputEnds": at + 1
-                        }
-                    )
-            # 期待する普通のパターン
-            applies = [] 
-            ats = [] 
-            for i in range(len(list_pattern_table)):
-                table = list_pattern_table[i]
-                # 要素は一つしかない. ほかに綺麗に取り出す方法が思いつかない.
-                lookup_name = list(table.values())[0]
-                if lookup_name != None:
-                    ats.append(i)
-                    applies.append(
-                        {
-                            "at": i,
-                            "lookup": lookup_name
-                        }
-                    )
-            list_rclt_2_subtables.append(
-                        {
-                            "match": [ [utility.convert_str_hanzi_2_cid(hanzi)] for hanzi in phrase ],
-                            "apply": applies,
-                            "inputBegins": min(ats),
-                            "inputEnds": max(ats) + 1
-                        }
-                    )
-    
     def make_lookup_order(self):
         # lookup order
         """
@@ -513,6 +396,7 @@ class GSUBTable():
         self.make_rclt1_feature()
         self.make_rclt2_feature()
 
+        self.split_large_subtables()
         self.make_lookup_order()
 
         # 保存して確認する
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# ビルドの各段階（ダンプ、glyf の作成、GSUB の作成、フォントファイルの作成）を依存関係のあるステージとして扱う
+# ステージごとに入力（ファイルのハッシュ、ステージの処理を書いたモジュールのハッシュ、設定値、依存するステージ）の fingerprint を記録しておき、
+# 前回のビルドから fingerprint が変わったステージだけを実行し直す。
+# （src のコードを変えたときも、そのコードを使うステージは実行し直す。ステージが import しているモジュールも辿る）
+# e.g.: duoyinzi_pattern_one.txt だけを変更したときは、GSUB と compile のステージだけが実行される。
+#
+#   dump_main ──┐
+#               ├── glyf ──┬── GSUB ──┐
+#   dump_pinyin ┘          └──────────┴── compile
+
+import os
+import ast
+import hashlib
+import orjson
+import dump_cache
+import profiler
+
+class Stage():
+    # name      : ステージ名
+    # run       : ステージの処理
+    # inputs    : 入力ファイルのリスト。中身のハッシュを fingerprint に含める
+    # sources   : ステージの処理に使うモジュールのリスト。そのモジュールと、そこから import しているモジュールのファイルのハッシュを fingerprint に含める
+    # params    : 入力となる設定値（json に変換できるもの）
+    # depends   : 依存するステージ名のリスト
+    # artifacts : 出力ファイルのリスト。一つでも無ければ実行し直す
+    def __init__(self, name, run, inputs=[], sources=[], params=None, depends=[], artifacts=[]):
+        self.name      = name
+        self.run       = run
+        self.inputs    = inputs
+        self.sources   = get_source_files(sources)
+        self.params    = params
+        self.depends   = depends
+        self.artifacts = artifacts
+
+# modules と、そこから（辿って）import している同じディレクトリのモジュールのファイルを返す
+# import は ast で調べるので、関数の中や if __name__ == "__main__": の中の import も含む（多めに含めても、実行し直すだけ）
+def get_source_files(modules):
+    file_paths = []
+    stack = [os.path.abspath(module.__file__) for module in modules]
+    while len(stack) > 0:
+        file_path = stack.pop()
+        if file_path in file_paths:
+            continue
+        file_paths.append(file_path)
+        with open(file_path, "rb") as read_file:
+            tree = ast.parse(read_file.read(), filename=file_path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                module_names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                module_names = [node.module]
+            else:
+                continue
+            for module_name in module_names:
+                imported_path = os.path.join(os.path.dirname(file_path), module_name.split(".")[0] + ".py")
+                if os.path.exists(imported_path):
+                    stack.append(imported_path)
+    return sorted(file_paths)
+
+class BuildGraph():
+    def __init__(self, MANIFEST_JSON):
+        self.MANIFEST_JSON = MANIFEST_JSON
+        # 追加した順に実行する。依存先は先に追加されている必要がある
+        self.stages = []
+        self.fingerprints = {}
+        self.file_hashes = {}
+        self.load_manifest()
+
+    def load_manifest(self):
+        self.manifest = {}
+        if os.path.exists(self.MANIFEST_JSON):
+            with open(self.MANIFEST_JSON, "rb") as read_file:
+                self.manifest = orjson.loads(read_file.read())
+
+    def save_manifest(self):
+        with open(self.MANIFEST_JSON, "wb") as write_file:
+            write_file.write(orjson.dumps(self.manifest, option=orjson.OPT_INDENT_2))
+
+    def add_stage(self, stage):
+        added_stage_names = [s.name for s in self.stages]
+        for depend in stage.depends:
+            if not (depend in added_stage_names):
+                raise Exception("ステージ {} の依存先 {} が追加されていません".format(stage.name, depend))
+        self.stages.append(stage)
+
+    # 同じファイルを複数のステージが入力にするので、一度計算したハッシュは使い回す
+    def get_file_hash(self, file_path):
+        if not (file_path in self.file_hashes):
+            self.file_hashes[file_path] = dump_cache.calc_file_hash(file_path)
+        return self.file_hashes[file_path]
+
+    def get_input_hashes(self, stage):
+        return { file_path : self.get_file_hash(file_path) for file_path in stage.inputs }
+
+    # ソースのパスは環境ごとに違うので、ファイル名をキーにする
+    def get_source_hashes(self, stage):
+        return { os.path.basename(file_path) : self.get_file_hash(file_path) for file_path in stage.sources }
+
+    def calc_fingerprint(self, stage, input_hashes, source_hashes):
+        sha256 = hashlib.sha256()
+        sha256.update(stage.name.encode("utf-8"))
+        for file_path in stage.inputs:
+            sha256.update(input_hashes[file_path].encode("utf-8"))
+        for file_name in sorted(source_hashes.keys()):
+            sha256.update(file_name.encode("utf-8"))
+            sha256.update(source_hashes[file_name].encode("utf-8"))
+        sha256.update(orjson.dumps(stage.params, option=orjson.OPT_SORT_KEYS))
+        for depend in stage.depends:
+            sha256.update(self.fingerprints[depend].encode("utf-8"))
+        return sha256.hexdigest()
+
+    def is_up_to_date(self, stage, fingerprint):
+        if not (stage.name in self.manifest):
+            return False
+        if self.manifest[stage.name]["fingerprint"] != fingerprint:
+            return False
+        return all(os.path.exists(artifact) for artifact in stage.artifacts)
+
+    def run(self, force=False):
+        for stage in self.stages:
+            input_hashes  = self.get_input_hashes(stage)
+            source_hashes = self.get_source_hashes(stage)
+            fingerprint   = self.calc_fingerprint(stage, input_hashes, source_hashes)
+            self.fingerprints[stage.name] = fingerprint
+            if not force and self.is_up_to_date(stage, fingerprint):
+                print("skip stage: {}".format(stage.name))
+                continue
+
+            print("run stage: {}".format(stage.name))
+            with profiler.stage(stage.name):
+                stage.run()
+            # 途中のステージで失敗しても、それまでの結果は使えるように一つずつ記録する
+            self.manifest[stage.name] = {
+                "fingerprint": fingerprint,
+                "inputs"     : input_hashes,
+                "sources"    : source_hashes,
+                "depends"    : { depend : self.fingerprints[depend] for depend in stage.depends }
+            }
+            self.save_manifest()
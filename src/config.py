@@ -7,6 +7,9 @@ import path
 HAN_SERIF_TYPE   = 1
 HANDWRITTEN_TYPE = 2
 
+# main.py の --style で指定できるスタイル
+STYLES = ["han_serif", "handwritten"]
+
 # metadata for font size
 METADATA_FOR_HAN_SERIF = {
     "pinyin_canvas":{
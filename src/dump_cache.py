@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# otfccdump で作成した json をキャッシュする
+# ソースフォントのハッシュと otfcc のバージョンが同じなら、ダンプ結果も同じになるはずなので、
+# 2回目以降のビルドでは otfccdump と jq の処理を丸ごと省略できる。
+#
+# tmp/cache/dump/
+#   └ {sha256(ソースフォント + otfcc のバージョン + 保存するファイル名 + CACHE_FORMAT)}/
+#       ├ template_main.json   (漢字用のフォント)
+#       ├ template_glyf.json   (漢字用のフォント)
+#       └ alphabet4pinyin.json (ピンイン用のフォント)
+
+import os
+import shutil
+import hashlib
+import shell
+import path as p
+
+DIR_DUMP_CACHE = os.path.join(p.DIR_CACHE, "dump")
+# キャッシュの中身の形式を変えたときは、この値を変えて古いキャッシュを無効にする
+CACHE_FORMAT = "1"
+# ハッシュを計算するときに一度に読み込むサイズ
+CHUNK_SIZE = 1024 * 1024
+
+otfcc_version = None
+
+def calc_file_hash(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as read_file:
+        for chunk in iter(lambda: read_file.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+# otfcc のバージョンによってダンプ結果が変わる可能性があるので、キーに含める
+def get_otfcc_version():
+    global otfcc_version
+    if otfcc_version is None:
+        otfcc_version = shell.process("otfccdump --version").strip()
+    return otfcc_version
+
+def get_cache_key(source_font_name, file_names):
+    sha256 = hashlib.sha256()
+    sha256.update(calc_file_hash(source_font_name).encode("utf-8"))
+    sha256.update(get_otfcc_version().encode("utf-8"))
+    sha256.update(",".join(file_names).encode("utf-8"))
+    sha256.update(CACHE_FORMAT.encode("utf-8"))
+    return sha256.hexdigest()
+
+# キャッシュがあれば dir_temp にコピーして True を返す
+def restore(source_font_name, file_names, dir_temp=p.DIR_TEMP):
+    cache_dir = os.path.join(DIR_DUMP_CACHE, get_cache_key(source_font_name, file_names))
+    if not all(os.path.exists(os.path.join(cache_dir, file_name)) for file_name in file_names):
+        return False
+    for file_name in file_names:
+        shutil.copyfile(os.path.join(cache_dir, file_name), os.path.join(dir_temp, file_name))
+    return True
+
+# dir_temp にあるダンプ結果をキャッシュに保存する
+def store(source_font_name, file_names, dir_temp=p.DIR_TEMP):
+    cache_key = get_cache_key(source_font_name, file_names)
+    cache_dir = os.path.join(DIR_DUMP_CACHE, cache_key)
+    # 途中で中断されても壊れたキャッシュが残らないように、一時ディレクトリに書いてから名前を変える
+    work_dir = os.path.join(DIR_DUMP_CACHE, "{}.{}.tmp".format(cache_key, os.getpid()))
+    os.makedirs(work_dir, exist_ok=True)
+    for file_name in file_names:
+        shutil.copyfile(os.path.join(dir_temp, file_name), os.path.join(work_dir, file_name))
+    # 同じフォントを同時にダンプした別のプロセスが先に保存していれば、そちらを使う
+    if os.path.exists(cache_dir):
+        shutil.rmtree(work_dir)
+        return
+    os.rename(work_dir, cache_dir)
+
+def clear():
+    if os.path.exists(DIR_DUMP_CACHE):
+        shutil.rmtree(DIR_DUMP_CACHE)
@@ -12,6 +12,11 @@ import path as p
 import GSUB_table as gt
 import config
 import name_table
+import profiler
+import glyf_store
+
+# iter_json_chunks で一度に json にする glyf の数
+GLYF_CHUNK_SIZE = 1024
 
 class Font():
     def __init__(self, TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
@@ -22,16 +27,19 @@ class Font():
         self.PATTERN_TWO_JSON       = PATTERN_TWO_JSON
         self.EXCEPTION_PATTERN_JSON = EXCEPTION_PATTERN_JSON
         self.FONT_TYPE = FONT_TYPE
-        self.load_json()
+        with profiler.stage("load_json"):
+            self.load_json()
         # utility を使うために設定する
-        utility.cmap_table = self.marged_font["cmap"]
-        self.PINYIN_MAPPING_TABLE = pg.get_pinyin_table_with_mapping_table()
+        utility.set_cmap_table(self.marged_font["cmap"])
+        with profiler.stage("load_mapping_table"):
+            pg.mapping_table_registry.get_table()
 
         # 発音のグリフを作成する
-        pinyin_glyph = py_glyph.PinyinGlyph(TAMPLATE_MAIN_JSON, ALPHABET_FOR_PINYIN_JSON, FONT_TYPE)
-        self.py_alphablet = pinyin_glyph.get_py_alphablet_glyf_table()
-        pinyin_glyph.add_references_of_pronunciation()
-        self.pronunciation = pinyin_glyph.get_pronunciation_glyf_table()
+        with profiler.stage("PinyinGlyph"):
+            pinyin_glyph = py_glyph.PinyinGlyph(TAMPLATE_MAIN_JSON, ALPHABET_FOR_PINYIN_JSON, FONT_TYPE)
+            self.py_alphablet = pinyin_glyph.get_py_alphablet_glyf_table()
+            pinyin_glyph.add_references_of_pronunciation()
+            self.pronunciation = pinyin_glyph.get_pronunciation_glyf_table()
         print("発音のグリフを作成完了")
 
         # 定義が重複している文字に関しては、基本的に同一のグリフが使われているはず
@@ -83,7 +91,7 @@ class Font():
                     cmap_table.update( {str_oct_unicode : refered_glyf_name} )
 
     def delete_glyf(self, glyf_name):
-        # 空のグリフのテーブル（管理しやすくするために、glyf table は別オブジェクトになっている）
+        # marged_font["glyf"] と substance_glyf_table は同じ GlyfStore
         template_glyf_table  = self.marged_font["glyf"]
         glyph_order_list     = self.marged_font["glyph_order"]
         
@@ -98,12 +106,14 @@ class Font():
         # なんでもいいが、とりあえず漢字の「一」でサイズを取得する
         cid = self.marged_font["cmap"][str(ord("一"))]
         # advanceWidth は確実にあるはずなので、有無の検証はしない
-        if not ("advanceHeight" in self.marged_font["glyf"][cid]):
-            glyf_cid = self.marged_font["glyf"][cid]
-            glyf_cid.update( {"advanceHeight": self.marged_font["glyf"][cid]["advanceWidth"]} )
+        # glyf は GlyfStore なので、書き換えたグリフは戻す
+        glyf_cid = self.marged_font["glyf"][cid]
+        if not ("advanceHeight" in glyf_cid):
+            glyf_cid.update( {"advanceHeight": glyf_cid["advanceWidth"]} )
+            self.marged_font["glyf"][cid] = glyf_cid
 
-        advanceWidth   = self.marged_font["glyf"][cid]["advanceWidth"]
-        advanceHeight  = self.marged_font["glyf"][cid]["advanceHeight"]
+        advanceWidth   = glyf_cid["advanceWidth"]
+        advanceHeight  = glyf_cid["advanceHeight"]
         return (advanceWidth, advanceHeight)
 
     def get_advance_size_of_pinyin_glyf(self):
@@ -126,21 +136,18 @@ class Font():
         if not ("cmap_uvs" in self.marged_font):
             self.marged_font.update( {"cmap_uvs": {}} )
 
-        for (hanzi, pinyins) in utility.get_has_single_pinyin_hanzi():
-            str_oct_unicode = str(ord(hanzi))
-            if not (str_oct_unicode in self.marged_font["cmap"]):
-                raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
-            self.marged_font["cmap_uvs"]["{0} {1}".format(str_oct_unicode, IVS)] = "{}.ss00".format(cid)
+        cmap_uvs_table = self.marged_font["cmap_uvs"]
+        for record in utility.get_single_pinyin_hanzi_records():
+            if record.cid == None:
+                raise Exception("グリフが見つかりません.\n  unicode: {}".format(record.str_unicode))
+            cmap_uvs_table["{0} {1}".format(record.str_unicode, IVS)] = "{}.ss00".format(record.cid)
         
-        for (hanzi, pinyins) in utility.get_has_multiple_pinyin_hanzi():
-            str_oct_unicode = str(ord(hanzi))
-            if not (str_oct_unicode in self.marged_font["cmap"]):
-                raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+        for record in utility.get_multiple_pinyin_hanzi_records():
+            if record.cid == None:
+                raise Exception("グリフが見つかりません.\n  unicode: {}".format(record.str_unicode))
             # ss00 は ピンインのないグリフ なので、ピンインのグリフは "ss{:02}".format(len) まで
-            for i in range( len(pinyins)+1 ):
-                self.marged_font["cmap_uvs"]["{0} {1}".format(str_oct_unicode, IVS + i)] = "{}.ss{:02}".format(cid, i)
+            for i in range( record.ss_num ):
+                cmap_uvs_table["{0} {1}".format(record.str_unicode, IVS + i)] = "{}.ss{:02}".format(record.cid, i)
 
     def add_glyph_order(self):
         """
@@ -153,21 +160,17 @@ class Font():
         """
         # 漢字グリフ追加
         set_glyph_order = set(self.marged_font["glyph_order"])
-        for (hanzi, pinyins) in utility.get_has_single_pinyin_hanzi():
-            str_oct_unicode = str(ord(hanzi))
-            if not (str_oct_unicode in self.marged_font["cmap"]):
-                raise Exception("グリフが見つかりません.\n  unicode: {:x}".format(int(str_oct_unicode)))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
-            set_glyph_order.add("{}.ss00".format(cid))
-
-        for (hanzi, pinyins) in utility.get_has_multiple_pinyin_hanzi():
-            str_oct_unicode = str(ord(hanzi))
-            if not (str_oct_unicode in self.marged_font["cmap"]):
-                raise Exception("グリフが見つかりません.\n  unicode: {:x}".format(int(str_oct_unicode)))
+        for record in utility.get_single_pinyin_hanzi_records():
+            if record.cid == None:
+                raise Exception("グリフが見つかりません.\n  unicode: {:x}".format(int(record.str_unicode)))
+            set_glyph_order.add("{}.ss00".format(record.cid))
+
+        for record in utility.get_multiple_pinyin_hanzi_records():
+            if record.cid == None:
+                raise Exception("グリフが見つかりません.\n  unicode: {:x}".format(int(record.str_unicode)))
             # ss00 は ピンインのないグリフ なので、ピンインのグリフは "ss{:02}".format(len) まで
-            for i in range( len(pinyins)+1 ):
-                cid = utility.convert_str_hanzi_2_cid(hanzi)
-                set_glyph_order.add("{}.ss{:02}".format(cid, i))
+            for i in range( record.ss_num ):
+                set_glyph_order.add("{}.ss{:02}".format(record.cid, i))
         
         # ピンインのグリフを追加
         set_glyph_order = set_glyph_order | set(self.py_alphablet.keys())
@@ -189,10 +192,10 @@ class Font():
                      }
         return hanzi_glyf
 
-    def generate_hanzi_glyf_with_pinyin(self, cid, pronunciation):
+    # simpled_pronunciation は簡略化した発音 (HanziRecord.pronunciation_ids) e.g.: we3i
+    def generate_hanzi_glyf_with_pinyin(self, cid, simpled_pronunciation):
         (advance_width, _) = self.get_advance_size_of_hanzi()
         (_, added_pinyin_height, added_pinyin_vertical_origin) = self.get_advance_size_of_pinyin_glyf()
-        simpled_pronunciation = utility.simplification_pronunciation( pronunciation )
         # ピンインと無印の漢字(ss00) を組み合わせる
         glyf_data = self.pronunciation[simpled_pronunciation]
         # ミュータブルなオブジェクトは参照元に追加してしまうので、copy する。
@@ -241,16 +244,15 @@ class Font():
         # if "hanzi_glyf" has normal pronunciation only
         # hanzi_glyf -> hanzi_glyf.ss00
         # hanzi_glyf = hanzi_glyf.ss00 + normal pronunciation
-        for (hanzi, pinyins) in utility.get_has_single_pinyin_hanzi():
-            str_oct_unicode = str(ord(hanzi))
-            if not (str_oct_unicode in self.marged_font["cmap"]):
-                raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            if self.is_added_glyf_4_duplicate_definition_of_hanzi(str_oct_unicode):
+        for record in utility.get_single_pinyin_hanzi_records():
+            if record.cid == None:
+                raise Exception("グリフが見つかりません.\n  unicode: {}".format(record.str_unicode))
+            if self.is_added_glyf_4_duplicate_definition_of_hanzi(record.str_unicode):
                 continue
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+            cid = record.cid
             glyf_data = self.substance_glyf_table[cid]
             self.substance_glyf_table.update( { "{}.ss00".format(cid) : glyf_data } )
-            normal_pronunciation = pinyins[pg.NORMAL_PRONUNCIATION]
+            normal_pronunciation = record.pronunciation_ids[pg.NORMAL_PRONUNCIATION]
             glyf_data = self.generate_hanzi_glyf_with_pinyin(cid, normal_pronunciation)
             self.substance_glyf_table.update( { cid : glyf_data } )
 
@@ -259,18 +261,17 @@ class Font():
         # hanzi_glyf.ss01 = hanzi_glyf.ss00 + normal pronunciation
         # hanzi_glyf = hanzi_glyf.ss01
         # hanzi_glyf.ss02 = hanzi_glyf.ss00 + variational pronunciation
-        for (hanzi, pinyins) in utility.get_has_multiple_pinyin_hanzi():
-            str_oct_unicode = str(ord(hanzi))
-            if not (str_oct_unicode in self.marged_font["cmap"]):
-                raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            if self.is_added_glyf_4_duplicate_definition_of_hanzi(str_oct_unicode):
+        for record in utility.get_multiple_pinyin_hanzi_records():
+            if record.cid == None:
+                raise Exception("グリフが見つかりません.\n  unicode: {}".format(record.str_unicode))
+            if self.is_added_glyf_4_duplicate_definition_of_hanzi(record.str_unicode):
                 continue
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+            cid = record.cid
             glyf_data = self.substance_glyf_table[cid]
             # hanzi_glyf -> hanzi_glyf.ss00
             self.substance_glyf_table.update( { "{}.ss00".format(cid) : glyf_data } )
             # hanzi_glyf.ss01 = hanzi_glyf.ss00 + normal pronunciation
-            normal_pronunciation = pinyins[pg.NORMAL_PRONUNCIATION]
+            normal_pronunciation = record.pronunciation_ids[pg.NORMAL_PRONUNCIATION]
             glyf_data = self.generate_hanzi_glyf_with_pinyin(cid, normal_pronunciation)
             self.substance_glyf_table.update( { "{}.ss01".format(cid) : glyf_data } )
             # hanzi_glyf = hanzi_glyf.ss01
@@ -278,24 +279,23 @@ class Font():
             self.substance_glyf_table.update( { cid : glyf_data } )
             # if hanzi_glyf has variational pronunciation
             # hanzi_glyf.ss01 = hanzi_glyf.ss00 + variational pronunciation
-            for i in range( 1,len(pinyins) ):
-                variational_pronunciation = pinyins[i]
+            for i in range( 1,len(record.pinyins) ):
+                variational_pronunciation = record.pronunciation_ids[i]
                 glyf_data = self.generate_hanzi_glyf_with_pinyin(cid, variational_pronunciation)
                 self.substance_glyf_table.update( { "{}.ss{:02}".format(cid, pg.VARIATIONAL_PRONUNCIATION + i) : glyf_data } )
-            self.update_status_is_added_glyf_4_duplicate_definition_of_hanzi(str_oct_unicode)
+            self.update_status_is_added_glyf_4_duplicate_definition_of_hanzi(record.str_unicode)
 
-        new_glyf = self.marged_font["glyf"]
-        new_glyf.update( self.py_alphablet )
-        new_glyf.update( self.substance_glyf_table )
-        self.marged_font["glyf"] = new_glyf
+        # marged_font["glyf"] は substance_glyf_table と同じものなので、ピンインのグリフを追加するだけでよい
+        self.substance_glyf_table.update( self.py_alphablet )
         print("  ==> glyf num : {}".format(len(self.marged_font["glyf"])))
         if len(self.marged_font["glyf"]) > 65536:
             raise Exception("glyf は 65536 個以上格納できません。")
 
 
     def add_GSUB(self):
-        GSUB = gt.GSUBTable(self.marged_font["GSUB"], self.PATTERN_ONE_TXT, self.PATTERN_TWO_JSON, self.EXCEPTION_PATTERN_JSON)
-        self.marged_font["GSUB"] = GSUB.get_GSUB_table()
+        with profiler.stage("add_GSUB"):
+            GSUB = gt.GSUBTable(self.marged_font["GSUB"], self.PATTERN_ONE_TXT, self.PATTERN_TWO_JSON, self.EXCEPTION_PATTERN_JSON)
+            self.marged_font["GSUB"] = GSUB.get_GSUB_table()
 
     def set_about_size(self):
         (_, advanceAddedPinyinHeight, _) = self.get_advance_size_of_pinyin_glyf()
@@ -310,50 +310,113 @@ class Font():
         # self.marged_font["BASE"]["hani"]
 
     def set_copyright(self):
-        # フォント製作者によるバージョン
-        self.marged_font["head"]["fontRevision"] = name_table.VERSION
-        # 作成日(基準日：1904/01/01 00:00 GMT)
-        from datetime import datetime
-        base_date = datetime.strptime("1904/01/01 00:00", "%Y/%m/%d %H:%M")
-        now_date = datetime.now()
-        time_diff = now_date - base_date
-        self.marged_font["head"]["created"] = round(time_diff.total_seconds())
-        # フォント名等を設定
-        if self.FONT_TYPE == config.HAN_SERIF_TYPE:
-            self.marged_font["name"] = name_table.HAN_SERIF
-        elif self.FONT_TYPE == config.HANDWRITTEN_TYPE:
-            self.marged_font["name"] = name_table.HANDWRITTEN
-        else:
-            pass
+        set_copyright(self.marged_font, self.FONT_TYPE)
 
 
     def load_json(self):
         with open(self.TAMPLATE_MAIN_JSON, "rb") as read_file:
             self.marged_font = orjson.loads(read_file.read())
-        with open(self.TAMPLATE_GLYF_JSON, "rb") as read_file:
-            self.substance_glyf_table = orjson.loads(read_file.read())
+        # glyf table は大きいので、使うグリフだけを読み込む
+        self.substance_glyf_table = glyf_store.GlyfStore(self.TAMPLATE_GLYF_JSON)
+        # TAMPLATE_MAIN_JSON の glyf は contours を消しただけなので、最終的にはすべて substance_glyf_table のものに置き換わる
+        # 最初から substance_glyf_table を使うことで、同じグリフを二重に持たないようにする
+        self.marged_font["glyf"] = self.substance_glyf_table
 
     def save_as_json(self, TAMPLATE_MARGED_JSON):
-        with open(TAMPLATE_MARGED_JSON, "wb") as f:
-            serialized_glyf = orjson.dumps(self.marged_font, option=orjson.OPT_INDENT_2)
-            f.write(serialized_glyf)
+        save_as_json(self.marged_font, TAMPLATE_MARGED_JSON)
     
     def convert_json2otf(self, TAMPLATE_JSON, OUTPUT_FONT):
-        cmd = "otfccbuild {} -o {}".format(TAMPLATE_JSON, OUTPUT_FONT)
-        print(cmd)
-        shell.process(cmd)
+        convert_json2otf(TAMPLATE_JSON, OUTPUT_FONT)
 
-    def build(self, OUTPUT_FONT):
-        self.add_cmap_uvs()
+    # GSUB 以外のテーブル（cmap_uvs, glyph_order, glyf）を作る
+    def build_glyf(self):
+        with profiler.stage("add_cmap_uvs"):
+            self.add_cmap_uvs()
         print("cmap_uvs table を追加完了")
-        self.add_glyph_order()
+        with profiler.stage("add_glyph_order"):
+            self.add_glyph_order()
         print("glyph_order table を追加完了")
-        self.add_glyf()
+        with profiler.stage("add_glyf"):
+            self.add_glyf()
         print("glyf table を追加完了")
+        self.set_about_size()
+
+    def build(self, OUTPUT_FONT, stream=False):
+        self.build_glyf()
         self.add_GSUB()
         print("GSUB table を追加完了")
-        self.set_about_size()
         self.set_copyright()
+        if stream:
+            stream_json2otf(self.marged_font, OUTPUT_FONT)
+            return
         TAMPLATE_MARGED_JSON = os.path.join(p.DIR_TEMP, "template.json")
         self.save_as_json(TAMPLATE_MARGED_JSON)
-        self.convert_json2otf(TAMPLATE_MARGED_JSON, OUTPUT_FONT)
\ No newline at end of file
+        self.convert_json2otf(TAMPLATE_MARGED_JSON, OUTPUT_FONT)
+
+
+def set_copyright(marged_font, FONT_TYPE):
+    # フォント製作者によるバージョン
+    marged_font["head"]["fontRevision"] = name_table.VERSION
+    # 作成日(基準日：1904/01/01 00:00 GMT)
+    from datetime import datetime
+    base_date = datetime.strptime("1904/01/01 00:00", "%Y/%m/%d %H:%M")
+    now_date = datetime.now()
+    time_diff = now_date - base_date
+    marged_font["head"]["created"] = round(time_diff.total_seconds())
+    # フォント名等を設定
+    if FONT_TYPE == config.HAN_SERIF_TYPE:
+        marged_font["name"] = name_table.HAN_SERIF
+    elif FONT_TYPE == config.HANDWRITTEN_TYPE:
+        marged_font["name"] = name_table.HANDWRITTEN
+    else:
+        pass
+
+def save_as_json(marged_font, TAMPLATE_MARGED_JSON, option=orjson.OPT_INDENT_2):
+    with profiler.stage("save"):
+        with open(TAMPLATE_MARGED_JSON, "wb") as f:
+            # glyf が GlyfStore のときは、触っていないグリフをそのまま書き出すために compact な json にする
+            if isinstance(marged_font.get("glyf"), glyf_store.GlyfStore):
+                for chunk in iter_json_chunks(marged_font):
+                    f.write(chunk)
+                return
+            serialized_glyf = orjson.dumps(marged_font, option=option)
+            f.write(serialized_glyf)
+
+def convert_json2otf(TAMPLATE_JSON, OUTPUT_FONT):
+    cmd = "otfccbuild {} -o {}".format(TAMPLATE_JSON, OUTPUT_FONT)
+    print(cmd)
+    with profiler.stage("otfccbuild"):
+        shell.process(cmd)
+
+# marged_font を少しずつ compact な json にして返す
+# 全体を一度に dumps すると、フォント全体の大きさの bytes ができてしまうので、table ごと（glyf は GLYF_CHUNK_SIZE 個ごと）に分ける
+def iter_json_chunks(marged_font):
+    yield b"{"
+    for i, (table_name, table) in enumerate(marged_font.items()):
+        if i > 0:
+            yield b","
+        yield orjson.dumps(table_name) + b":"
+        if table_name != "glyf":
+            yield orjson.dumps(table)
+            continue
+        yield b"{"
+        glyf_items = []
+        is_first_chunk = True
+        # GlyfStore なら、触っていないグリフは読み込んだ json のバイト列をそのまま使う
+        for glyf_name, raw_glyf_data in glyf_store.iter_raw_items(table):
+            glyf_items.append( orjson.dumps(glyf_name) + b":" + raw_glyf_data )
+            if len(glyf_items) == GLYF_CHUNK_SIZE:
+                yield (b"" if is_first_chunk else b",") + b",".join(glyf_items)
+                is_first_chunk = False
+                glyf_items = []
+        if len(glyf_items) > 0:
+            yield (b"" if is_first_chunk else b",") + b",".join(glyf_items)
+        yield b"}"
+    yield b"}"
+
+# json を一時ファイルに書き出さずに、otfccbuild の標準入力に直接流し込む
+def stream_json2otf(marged_font, OUTPUT_FONT):
+    cmd = "otfccbuild -o {}".format(OUTPUT_FONT)
+    print("{} < (stream)".format(cmd))
+    with profiler.stage("otfccbuild"):
+        shell.process_with_input(cmd, iter_json_chunks(marged_font))
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# marged_font からフォントファイルを作る処理（バックエンド）を切り替えられるようにする
+#   otfcc     : json に変換して otfccbuild でビルドする（従来の方法）
+#   fonttools : fontTools で直接 ttf を書き出す。json の書き出しと otfccbuild が不要
+
+import os
+import font as ft
+import fonttools_writer
+import path as p
+import profiler
+
+class OtfccBackend():
+    # stream : template.json を書き出さずに、otfccbuild の標準入力に直接流し込む
+    def __init__(self, dir_temp=p.DIR_TEMP, stream=False):
+        self.dir_temp = dir_temp
+        self.stream   = stream
+
+    def compile(self, marged_font, OUTPUT_FONT):
+        if self.stream:
+            ft.stream_json2otf(marged_font, OUTPUT_FONT)
+            return
+        TAMPLATE_MARGED_JSON = os.path.join(self.dir_temp, "template.json")
+        ft.save_as_json(marged_font, TAMPLATE_MARGED_JSON)
+        ft.convert_json2otf(TAMPLATE_MARGED_JSON, OUTPUT_FONT)
+
+class FontToolsBackend():
+    # json を書き出さないので stream は使えない
+    def __init__(self, dir_temp=p.DIR_TEMP, stream=False):
+        if stream:
+            raise Exception("fonttools backend は stream に対応していません")
+        self.dir_temp = dir_temp
+
+    def compile(self, marged_font, OUTPUT_FONT):
+        print("fontTools: {}".format(OUTPUT_FONT))
+        with profiler.stage("fonttools"):
+            fonttools_writer.write_font(marged_font, OUTPUT_FONT)
+
+BACKENDS = {
+    "otfcc"     : OtfccBackend,
+    "fonttools" : FontToolsBackend
+}
+
+def get_backend(backend_name, dir_temp=p.DIR_TEMP, stream=False):
+    if not (backend_name in BACKENDS):
+        raise Exception("不明なバックエンドです: {}".format(backend_name))
+    return BACKENDS[backend_name](dir_temp, stream)
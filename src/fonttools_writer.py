@@ -0,0 +1,564 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# otfcc 形式の json と同じ構造の marged_font から、fontTools で直接 ttf を書き出す
+# json への変換と otfccbuild を経由しないので、中間ファイルが不要になる。
+#
+# 対応しているテーブル: head, hhea, OS_2, post, name, maxp, glyf, hmtx, vhea, vmtx, cmap (cmap_uvs), GSUB
+# それ以外のテーブル（GPOS, GDEF, BASE, ヒンティング関係）は出力しない。
+# GSUB の lookup は gsub_single, gsub_alternate, gsub_chaining のみ（GSUB_table.py が作るもの）に対応する。
+
+import copy
+import itertools
+from fontTools.fontBuilder import FontBuilder
+from fontTools.ttLib import newTable
+from fontTools.ttLib.tables.otBase import OTTableWriter, OTLOffsetOverflowError
+from fontTools.ttLib.tables import otTables as ot
+from fontTools.ttLib.tables import ttProgram
+from fontTools.ttLib.tables._g_l_y_f import Glyph, GlyphComponent, GlyphCoordinates
+from fontTools.ttLib.tables.O_S_2f_2 import Panose
+from fontTools.otlLib import builder as otl
+import gsub_size
+
+SUPPORTED_TABLES = ["head", "hhea", "OS_2", "post", "name", "maxp", "glyf", "glyph_order",
+                    "cmap", "cmap_uvs", "vhea", "GSUB"]
+
+# otfcc がビットフィールドを dict で表すときの、各ビットの名前（下位ビットから順）
+HEAD_FLAGS = ["baselineAtY_0", "lsbAtX_0", "instrMayDependOnPointSize", "alwaysUseIntegerSize",
+              "instrMayAlterAdvanceWidth", "designedForVertical", "_reserved1", "designedForComplex",
+              "hasMetamorphosisEffects", "containsStrongRTL", "containsIndicRTL", "fontIsLossless",
+              "fontIsConverted", "optimizedForCleartype", "lastResortFont"]
+MAC_STYLE = ["bold", "italic", "underline", "outline", "shadow", "condensed", "extended"]
+FS_TYPE = ["_reserved1", "restrictedLicense", "previewPrintLicense", "editableEmbedding",
+           "_reserved2", "_reserved3", "_reserved4", "_reserved5", "noSubsetting", "bitmapEmbeddingOnly"]
+FS_SELECTION = ["italic", "underscore", "negative", "outlined", "strikeout", "bold", "regular",
+                "useTypoMetrics", "wws", "oblique"]
+PANOSE = ["bFamilyType", "bSerifStyle", "bWeight", "bProportion", "bContrast",
+          "bStrokeVariation", "bArmStyle", "bLetterForm", "bMidline", "bXHeight"]
+
+# otfcc の OS_2 で、fontTools とそのまま名前が同じ数値のフィールド
+OS_2_FIELDS = ["version", "xAvgCharWidth", "usWeightClass", "usWidthClass",
+               "ySubscriptXSize", "ySubscriptYSize", "ySubscriptXOffset", "ySubscriptYOffset",
+               "ySuperscriptXSize", "ySuperscriptYSize", "ySuperscriptXOffset", "ySuperscriptYOffset",
+               "yStrikeoutSize", "yStrikeoutPosition", "sFamilyClass", "achVendID",
+               "sTypoAscender", "sTypoDescender", "sTypoLineGap", "usWinAscent", "usWinDescent",
+               "sxHeight", "sCapHeight", "usDefaultChar", "usBreakChar", "usMaxContext"]
+
+LOOKUP_FLAGS = {
+    "rightToLeft"      : otl.LOOKUP_FLAG_RIGHT_TO_LEFT,
+    "ignoreBaseGlyphs" : otl.LOOKUP_FLAG_IGNORE_BASE_GLYPHS,
+    "ignoreLigatures"  : otl.LOOKUP_FLAG_IGNORE_LIGATURES,
+    "ignoreMarks"      : otl.LOOKUP_FLAG_IGNORE_MARKS
+}
+LOOKUP_TYPES = {"gsub_single": 1, "gsub_alternate": 3, "gsub_chaining": 6}
+
+# {"bold": true, ...} -> int
+def convert_bits(value, bit_names):
+    if isinstance(value, int):
+        return value
+    bits = 0
+    for i, bit_name in enumerate(bit_names):
+        if value.get(bit_name, False):
+            bits |= 1 << i
+    return bits
+
+def get_glyph_order(marged_font):
+    glyph_order = list(marged_font["glyph_order"])
+    # .notdef は必ず先頭にする
+    if ".notdef" in glyph_order:
+        glyph_order.remove(".notdef")
+        glyph_order.insert(0, ".notdef")
+    return glyph_order
+
+def build_glyph(glyf_name, glyf_data):
+    contours   = glyf_data.get("contours", [])
+    references = glyf_data.get("references", [])
+    if len(contours) > 0 and len(references) > 0:
+        raise Exception("輪郭と参照の両方を持つグリフには対応していません: {}".format(glyf_name))
+
+    glyph = Glyph()
+    if len(references) > 0:
+        glyph.numberOfContours = -1
+        glyph.components = [build_component(reference) for reference in references]
+    elif len(contours) > 0:
+        coordinates = []
+        flags = bytearray()
+        end_pts = []
+        for contour in contours:
+            for point in contour:
+                coordinates.append( (point["x"], point["y"]) )
+                flags.append(1 if point["on"] else 0)
+            end_pts.append(len(coordinates) - 1)
+        glyph.numberOfContours = len(contours)
+        glyph.coordinates = GlyphCoordinates(coordinates)
+        glyph.flags = flags
+        glyph.endPtsOfContours = end_pts
+        glyph.program = ttProgram.Program()
+        glyph.program.fromBytecode(b"")
+    return glyph
+
+def build_component(reference):
+    component = GlyphComponent()
+    component.glyphName = reference["glyph"]
+    component.x = round(reference.get("x", 0))
+    component.y = round(reference.get("y", 0))
+    # ROUND_XY_TO_GRID
+    component.flags = 0x0004
+    transform = [[reference.get("a", 1), reference.get("b", 0)], [reference.get("c", 0), reference.get("d", 1)]]
+    if transform != [[1, 0], [0, 1]]:
+        component.transform = transform
+    return component
+
+def setup_glyf(fb, marged_font, glyph_order):
+    glyf_table = marged_font["glyf"]
+    units_per_em = marged_font["head"]["unitsPerEm"]
+    ascender = marged_font["hhea"]["ascender"]
+    glyphs = {}
+    # glyf は GlyfStore（読むたびに json から dict を作る）なので、グリフは一度だけ読み、metrics に使う値だけを残す
+    # {グリフ名: (advanceWidth, advanceHeight, verticalOrigin)}
+    metrics = {}
+    for glyf_name in glyph_order:
+        if not (glyf_name in glyf_table):
+            raise Exception("glyph_order にあるグリフが glyf に見つかりません: {}".format(glyf_name))
+        glyf_data = glyf_table[glyf_name]
+        glyphs[glyf_name] = build_glyph(glyf_name, glyf_data)
+        metrics[glyf_name] = ( glyf_data.get("advanceWidth", 0), glyf_data.get("advanceHeight", units_per_em), glyf_data.get("verticalOrigin", ascender) )
+    fb.setupGlyf(glyphs)
+
+    # lsb/tsb はグリフの外接矩形から求める
+    glyf = fb.font["glyf"]
+    h_metrics = {}
+    for glyf_name in glyph_order:
+        glyph = glyf[glyf_name]
+        h_metrics[glyf_name] = ( round(metrics[glyf_name][0]), getattr(glyph, "xMin", 0) )
+    fb.setupHorizontalMetrics(h_metrics)
+
+    if "vhea" in marged_font:
+        v_metrics = {}
+        for glyf_name in glyph_order:
+            glyph = glyf[glyf_name]
+            (_, advance_height, vertical_origin) = metrics[glyf_name]
+            v_metrics[glyf_name] = ( round(advance_height), round(vertical_origin - getattr(glyph, "yMax", 0)) )
+        fb.setupVerticalMetrics(v_metrics)
+
+def setup_cmap(fb, marged_font):
+    cmapping = { int(str_oct_unicode) : glyf_name for str_oct_unicode, glyf_name in marged_font["cmap"].items() }
+    uvs = []
+    # e.g.: "19968 917984": "cid12345.ss00"
+    for unicode_and_selector, glyf_name in marged_font.get("cmap_uvs", {}).items():
+        (str_oct_unicode, str_oct_selector) = unicode_and_selector.split(" ")
+        uvs.append( (int(str_oct_unicode), int(str_oct_selector), glyf_name) )
+    fb.setupCharacterMap(cmapping, uvs=uvs)
+
+def setup_head(fb, marged_font):
+    head = marged_font["head"]
+    fb.updateHead(
+        fontRevision  = head.get("fontRevision", 1.0),
+        created       = head.get("created", 0),
+        modified      = head.get("modified", head.get("created", 0)),
+        flags         = convert_bits(head.get("flags", 0), HEAD_FLAGS),
+        macStyle      = convert_bits(head.get("macStyle", 0), MAC_STYLE),
+        lowestRecPPEM = head.get("lowestRecPPEM", 3)
+    )
+
+# otfcc は小数の値を丸めて書き出すので、それに合わせる（set_about_size などで小数になることがある）
+def setup_hhea(fb, marged_font):
+    hhea = marged_font["hhea"]
+    fb.setupHorizontalHeader(
+        ascent         = round(hhea["ascender"]),
+        descent        = round(hhea["descender"]),
+        lineGap        = round(hhea.get("lineGap", 0)),
+        caretSlopeRise = hhea.get("caretSlopeRise", 1),
+        caretSlopeRun  = hhea.get("caretSlopeRun", 0),
+        caretOffset    = hhea.get("caretOffset", 0)
+    )
+    if "vhea" in marged_font:
+        vhea = marged_font["vhea"]
+        fb.setupVerticalHeader(
+            ascent  = round(vhea.get("ascent", 0)),
+            descent = round(vhea.get("descent", 0)),
+            lineGap = round(vhea.get("lineGap", 0))
+        )
+
+def setup_OS_2(fb, marged_font):
+    OS_2 = marged_font["OS_2"]
+    values = { field : (OS_2[field] if isinstance(OS_2[field], str) else round(OS_2[field])) for field in OS_2_FIELDS if field in OS_2 }
+    values["fsType"] = convert_bits(OS_2.get("fsType", 0), FS_TYPE)
+    values["fsSelection"] = convert_bits(OS_2.get("fsSelection", 0), FS_SELECTION)
+    if "panose" in OS_2:
+        panose = Panose()
+        for attr_name, value in zip(PANOSE, OS_2["panose"]):
+            setattr(panose, attr_name, value)
+        values["panose"] = panose
+    fb.setupOS2(**values)
+    # unicode range, code page range は cmap から計算し直す
+    os2 = fb.font["OS/2"]
+    os2.recalcUnicodeRanges(fb.font)
+    os2.recalcCodePageRanges(fb.font)
+
+def setup_post(fb, marged_font):
+    post = marged_font.get("post", {})
+    fb.setupPost(
+        # format 3 ならグリフ名を持たない
+        keepGlyphNames     = post.get("version", 2) != 3,
+        italicAngle        = post.get("italicAngle", 0),
+        underlinePosition  = post.get("underlinePosition", 0),
+        underlineThickness = post.get("underlineThickness", 0),
+        isFixedPitch       = int(post.get("isFixedPitch", 0))
+    )
+
+def setup_name(fb, marged_font):
+    name = newTable("name")
+    name.names = []
+    for record in marged_font["name"]:
+        name.setName(record["nameString"], record["nameID"], record["platformID"], record["encodingID"], record["languageID"])
+    # Macintosh の文字コードで表せない名前（漢字など）は書き出せないので除く
+    usable_names = []
+    for name_record in name.names:
+        try:
+            name_record.toBytes()
+            usable_names.append(name_record)
+        except UnicodeEncodeError:
+            print("skip name record: nameID={} platformID={}".format(name_record.nameID, name_record.platformID))
+    name.names = usable_names
+    fb.font["name"] = name
+
+def build_coverage(glyf_names, glyph_map):
+    for glyf_name in glyf_names:
+        if not (glyf_name in glyph_map):
+            raise Exception("GSUB で使われているグリフが見つかりません: {}".format(glyf_name))
+    return otl.buildCoverage(glyf_names, glyph_map)
+
+def build_chaining_subtable(subtable, lookup_indexes, glyph_map):
+    match = subtable["match"]
+    input_begins = subtable["inputBegins"]
+    input_ends   = subtable["inputEnds"]
+    st = ot.ChainContextSubst()
+    st.Format = 3
+    # backtrack は入力に近い方から並べる
+    st.BacktrackCoverage = [build_coverage(glyf_names, glyph_map) for glyf_names in reversed(match[:input_begins])]
+    st.BacktrackGlyphCount = len(st.BacktrackCoverage)
+    st.InputCoverage = [build_coverage(glyf_names, glyph_map) for glyf_names in match[input_begins:input_ends]]
+    st.InputGlyphCount = len(st.InputCoverage)
+    st.LookAheadCoverage = [build_coverage(glyf_names, glyph_map) for glyf_names in match[input_ends:]]
+    st.LookAheadGlyphCount = len(st.LookAheadCoverage)
+    st.SubstLookupRecord = []
+    for apply in subtable["apply"]:
+        record = ot.SubstLookupRecord()
+        record.SequenceIndex   = apply["at"] - input_begins
+        record.LookupListIndex = lookup_indexes[apply["lookup"]]
+        st.SubstLookupRecord.append(record)
+    st.SubstCount = len(st.SubstLookupRecord)
+    return st
+
+# chaining の書き出し方
+#   coverage : subtable ごとに coverage を使う chaining (format 3)
+#   class    : lookup の subtable をまとめて、glyph class を使う chaining (format 2) 一つにする
+#   auto     : coverage, class と、クラスに展開しなくてよいルールだけを format 2 にしたもののうち、一番小さいもの
+CHAINING_ENCODINGS = ["auto", "coverage", "class"]
+# 一つの subtable をクラスの組み合わせに展開したときのルールの数の上限（これを超える lookup は format 3 のまま）
+MAX_CLASS_RULES = 64
+
+# 同じ集合にだけ入っているグリフを一つのクラスにする {グリフ名: クラス}
+# どの集合も、いくつかのクラスの和になる。クラスは 1 から（0 はどのクラスにも入らないグリフ）
+def get_glyph_classes(glyf_name_sets):
+    memberships = {}
+    for set_index, glyf_names in enumerate(glyf_name_sets):
+        for glyf_name in glyf_names:
+            memberships.setdefault(glyf_name, []).append(set_index)
+    class_indexes = {}
+    glyph_classes = {}
+    for glyf_name, membership in memberships.items():
+        glyph_classes[glyf_name] = class_indexes.setdefault(tuple(membership), len(class_indexes) + 1)
+    return glyph_classes
+
+def build_class_def(glyph_classes):
+    class_def = ot.ClassDef()
+    class_def.classDefs = glyph_classes
+    return class_def
+
+# (backtrack, input, lookahead)。backtrack は入力に近い方から並べる
+def get_context_parts(subtable):
+    match = subtable["match"]
+    (input_begins, input_ends) = (subtable["inputBegins"], subtable["inputEnds"])
+    return (list(reversed(match[:input_begins])), match[input_begins:input_ends], match[input_ends:])
+
+# backtrack, input, lookahead ごとのクラスと、subtable ごとの match の各位置のクラスのリスト
+def get_class_lists(parts):
+    class_defs = [ get_glyph_classes( glyf_names for part in parts for glyf_names in part[k] ) for k in range(3) ]
+    class_lists = []
+    for part in parts:
+        class_lists.append( [ sorted( set( class_defs[k][glyf_name] for glyf_name in glyf_names ) ) for k in range(3) for glyf_names in part[k] ] )
+    return (class_defs, class_lists)
+
+# 最初の入力グリフを共有する subtable を同じグループにする（グループの番号のリスト）
+# 違うグループの subtable は同じ位置で一致しないので、グループの中の順番さえ変えなければ、前後を入れ替えても結果は同じ
+def get_first_glyph_groups(subtables):
+    parents = list(range(len(subtables)))
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+    first_subtables = {}
+    for i, subtable in enumerate(subtables):
+        for glyf_name in subtable["match"][subtable["inputBegins"]]:
+            if glyf_name in first_subtables:
+                parents[find(i)] = find(first_subtables[glyf_name])
+            else:
+                first_subtables[glyf_name] = i
+    return [find(i) for i in range(len(subtables))]
+
+# クラスの組み合わせに展開しなくてよい（どの位置の集合も一つのクラスになる）subtable の番号
+# 展開が必要な subtable のグループを除くとクラスが変わるので、除くものが無くなるまで繰り返す
+def select_class_subtables(subtables):
+    parts = [get_context_parts(subtable) for subtable in subtables]
+    groups = get_first_glyph_groups(subtables)
+    selected_groups = set(groups)
+    while True:
+        selected = [i for i in range(len(subtables)) if groups[i] in selected_groups]
+        (_, class_lists) = get_class_lists([parts[i] for i in selected])
+        expanded_groups = set( groups[i] for i, classes_of_positions in zip(selected, class_lists) if any( len(classes) > 1 for classes in classes_of_positions ) )
+        if len(expanded_groups) == 0:
+            return selected
+        selected_groups -= expanded_groups
+
+# subtable を lookup にして書き出したときの大きさ（書き出すと subtable の format などが決まるので、コピーを使う）
+# subtable が多くて lookup からのオフセットが 16 ビットを超えるときは、extension にして測り、ExtensionSubst の分を引く
+# subtable の中のオフセットが 16 ビットを超える（書き出せない）ときは None
+def get_compiled_size(lookup_type, subtables, font):
+    for extension in [False, True]:
+        ot_lookup = ot.Lookup()
+        ot_lookup.LookupType = lookup_type
+        ot_lookup.LookupFlag = 0
+        ot_lookup.SubTable = copy.deepcopy(subtables)
+        ot_lookup.SubTableCount = len(subtables)
+        if extension:
+            build_extension_lookup(ot_lookup)
+        writer = OTTableWriter(tableTag="GSUB")
+        # overflow を報告するときに、LookupList の中の lookup の番号として使われる
+        writer.repeatIndex = 0
+        try:
+            ot_lookup.compile(writer, font)
+            data = writer.getAllData()
+        except OTLOffsetOverflowError:
+            continue
+        return len(data) - (gsub_size.EXTENSION_SUBTABLE_SIZE * len(subtables) if extension else 0)
+    return None
+
+# chaining subtable をすべて、glyph class を使う chaining (format 2) 一つにする
+# match の各位置の集合をクラスの組み合わせに展開して、最初の入力グリフのクラスごとに元の subtable の順に並べるので、
+# ある位置でどのルールが最初に一致するかは format 3 のときと変わらない。展開したルールが多すぎるときは None
+def build_chaining_class_subtable(subtables, lookup_indexes, glyph_map):
+    parts = [get_context_parts(subtable) for subtable in subtables]
+    ((backtrack_classes, input_classes, lookahead_classes), class_lists) = get_class_lists(parts)
+
+    rule_sets = {}
+    first_glyf_names = set()
+    for subtable, (backtrack, inputs, lookahead), classes_of_positions in zip(subtables, parts, class_lists):
+        rule_num = 1
+        for classes in classes_of_positions:
+            rule_num *= len(classes)
+        if rule_num > MAX_CLASS_RULES:
+            return None
+        first_glyf_names.update(inputs[0])
+        for combination in itertools.product(*classes_of_positions):
+            rule = ot.ChainSubClassRule()
+            rule.Backtrack  = list(combination[:len(backtrack)])
+            rule.BacktrackGlyphCount = len(rule.Backtrack)
+            # Input には最初のグリフのクラスを含めない
+            rule.Input      = list(combination[len(backtrack)+1:len(backtrack)+len(inputs)])
+            rule.InputGlyphCount = len(inputs)
+            rule.LookAhead  = list(combination[len(backtrack)+len(inputs):])
+            rule.LookAheadGlyphCount = len(rule.LookAhead)
+            rule.SubstLookupRecord = []
+            for apply in subtable["apply"]:
+                record = ot.SubstLookupRecord()
+                record.SequenceIndex   = apply["at"] - subtable["inputBegins"]
+                record.LookupListIndex = lookup_indexes[apply["lookup"]]
+                rule.SubstLookupRecord.append(record)
+            rule.SubstCount = len(rule.SubstLookupRecord)
+            rule_sets.setdefault(combination[len(backtrack)], []).append(rule)
+
+    st = ot.ChainContextSubst()
+    st.Format = 2
+    st.Coverage = build_coverage(sorted(first_glyf_names, key=lambda glyf_name: glyph_map.get(glyf_name, -1)), glyph_map)
+    st.BacktrackClassDef = build_class_def(backtrack_classes)
+    st.InputClassDef     = build_class_def(input_classes)
+    st.LookAheadClassDef = build_class_def(lookahead_classes)
+    st.ChainSubClassSet = []
+    for class_index in range(max(input_classes.values(), default=0) + 1):
+        if not (class_index in rule_sets):
+            st.ChainSubClassSet.append(None)
+            continue
+        rule_set = ot.ChainSubClassSet()
+        rule_set.ChainSubClassRule = rule_sets[class_index]
+        rule_set.ChainSubClassRuleCount = len(rule_set.ChainSubClassRule)
+        st.ChainSubClassSet.append(rule_set)
+    st.ChainSubClassSetCount = len(st.ChainSubClassSet)
+    return st
+
+def build_chaining_subtables(lookup, lookup_indexes, glyph_map, font, chaining_encoding):
+    subtables = [build_chaining_subtable(subtable, lookup_indexes, glyph_map) for subtable in lookup["subtables"]]
+    if chaining_encoding == "coverage" or len(subtables) == 0:
+        return subtables
+    chaining_type = LOOKUP_TYPES["gsub_chaining"]
+    class_subtable = build_chaining_class_subtable(lookup["subtables"], lookup_indexes, glyph_map)
+    if chaining_encoding == "class":
+        # format 2 一つに収まらないときは format 3 のまま
+        if class_subtable == None or get_compiled_size(chaining_type, [class_subtable], font) == None:
+            return subtables
+        return [class_subtable]
+
+    candidates = [subtables]
+    if class_subtable != None:
+        candidates.append([class_subtable])
+    # 展開しなくてよいルールを format 2 にまとめて先頭に置き、残りは format 3 のまま元の順に並べる
+    selected = select_class_subtables(lookup["subtables"])
+    if 0 < len(selected) < len(subtables):
+        selected_set = set(selected)
+        mixed_class_subtable = build_chaining_class_subtable([lookup["subtables"][i] for i in selected], lookup_indexes, glyph_map)
+        candidates.append( [mixed_class_subtable] + [st for i, st in enumerate(subtables) if not (i in selected_set)] )
+    # 書き出せない候補（format 2 の subtable が 16 ビットのオフセットに収まらない）は使わない。同じ大きさなら前の候補（format 3）を使う
+    (best_candidate, best_size) = (subtables, None)
+    for candidate in candidates:
+        size = get_compiled_size(chaining_type, candidate, font)
+        if size != None and (best_size == None or size < best_size):
+            (best_candidate, best_size) = (candidate, size)
+    return best_candidate
+
+def build_lookup(lookup_name, lookup, lookup_indexes, glyph_map, font, chaining_encoding="auto"):
+    if not (lookup["type"] in LOOKUP_TYPES):
+        raise Exception("{} の lookup type {} には対応していません".format(lookup_name, lookup["type"]))
+    if lookup["type"] == "gsub_chaining":
+        subtables = build_chaining_subtables(lookup, lookup_indexes, glyph_map, font, chaining_encoding)
+    else:
+        subtables = []
+        for subtable in lookup["subtables"]:
+            if lookup["type"] == "gsub_single":
+                st = otl.buildSingleSubstSubtable(subtable)
+            else:
+                st = otl.buildAlternateSubstSubtable(subtable)
+            # 空の subtable は出力しない
+            if st is not None:
+                subtables.append(st)
+
+    ot_lookup = ot.Lookup()
+    ot_lookup.LookupType = LOOKUP_TYPES[lookup["type"]]
+    ot_lookup.LookupFlag = sum( LOOKUP_FLAGS[flag] for flag, enabled in lookup.get("flags", {}).items() if enabled and flag in LOOKUP_FLAGS )
+    ot_lookup.SubTable = subtables
+    ot_lookup.SubTableCount = len(subtables)
+    return ot_lookup
+
+# 16 ビットのオフセットで届かない lookup は、subtable を ExtensionSubst で包んで 32 ビットのオフセットにする
+# （fontTools も書き出すときに直すが、overflow のたびに GSUB を最初から書き直すので遅い）
+def build_extension_lookup(ot_lookup):
+    extension_subtables = []
+    for st in ot_lookup.SubTable:
+        extension_subtable = ot.ExtensionSubst()
+        extension_subtable.Format = 1
+        extension_subtable.ExtensionLookupType = ot_lookup.LookupType
+        extension_subtable.ExtSubTable = st
+        extension_subtables.append(extension_subtable)
+    ot_lookup.LookupType = 7
+    ot_lookup.SubTable = extension_subtables
+    return ot_lookup
+
+def build_lang_sys(feature_indexes):
+    lang_sys = ot.LangSys()
+    lang_sys.LookupOrder = None
+    lang_sys.ReqFeatureIndex = 0xFFFF
+    lang_sys.FeatureIndex = feature_indexes
+    lang_sys.FeatureCount = len(feature_indexes)
+    return lang_sys
+
+def setup_GSUB(fb, marged_font, chaining_encoding="auto"):
+    if not ("GSUB" in marged_font):
+        return
+    GSUB = marged_font["GSUB"]
+    glyph_map = fb.font.getReverseGlyphMap()
+
+    # lookupOrder の順に並べ、lookupOrder に無いものは後ろに追加する
+    lookup_names = [lookup_name for lookup_name in GSUB.get("lookupOrder", []) if lookup_name in GSUB["lookups"]]
+    lookup_names += [lookup_name for lookup_name in GSUB["lookups"].keys() if not (lookup_name in lookup_names)]
+    lookup_indexes = { lookup_name : i for i, lookup_name in enumerate(lookup_names) }
+    lookup_list = ot.LookupList()
+    lookup_list.Lookup = [build_lookup(lookup_name, GSUB["lookups"][lookup_name], lookup_indexes, glyph_map, fb.font, chaining_encoding) for lookup_name in lookup_names]
+    lookup_estimates = gsub_size.estimate_lookups(GSUB)
+    for i, lookup_name in enumerate(lookup_names):
+        if lookup_estimates[lookup_name]["extension"]:
+            lookup_list.Lookup[i] = build_extension_lookup(lookup_list.Lookup[i])
+    lookup_list.LookupCount = len(lookup_list.Lookup)
+
+    # e.g.: "aalt_00000" -> tag "aalt"。FeatureRecord は tag 順に並べる
+    feature_names = sorted(GSUB["features"].keys(), key=lambda feature_name: (feature_name[:4], feature_name))
+    feature_indexes = { feature_name : i for i, feature_name in enumerate(feature_names) }
+    feature_list = ot.FeatureList()
+    feature_list.FeatureRecord = []
+    for feature_name in feature_names:
+        feature = ot.Feature()
+        feature.FeatureParams = None
+        feature.LookupListIndex = [lookup_indexes[lookup_name] for lookup_name in GSUB["features"][feature_name]]
+        feature.LookupCount = len(feature.LookupListIndex)
+        feature_record = ot.FeatureRecord()
+        feature_record.FeatureTag = feature_name[:4]
+        feature_record.Feature = feature
+        feature_list.FeatureRecord.append(feature_record)
+    feature_list.FeatureCount = len(feature_list.FeatureRecord)
+
+    # e.g.: "hani_DFLT" -> script "hani" の default language
+    scripts = {}
+    for language_name, language in GSUB["languages"].items():
+        (script_tag, language_tag) = language_name.split("_", 1)
+        script_tag = script_tag.ljust(4)
+        language_tag = language_tag.ljust(4)
+        indexes = sorted(feature_indexes[feature_name] for feature_name in language["features"])
+        scripts.setdefault(script_tag, {})[language_tag] = build_lang_sys(indexes)
+    script_list = ot.ScriptList()
+    script_list.ScriptRecord = []
+    for script_tag in sorted(scripts.keys()):
+        script = ot.Script()
+        script.DefaultLangSys = scripts[script_tag].pop("DFLT", None)
+        script.LangSysRecord = []
+        for language_tag in sorted(scripts[script_tag].keys()):
+            lang_sys_record = ot.LangSysRecord()
+            lang_sys_record.LangSysTag = language_tag
+            lang_sys_record.LangSys = scripts[script_tag][language_tag]
+            script.LangSysRecord.append(lang_sys_record)
+        script.LangSysCount = len(script.LangSysRecord)
+        script_record = ot.ScriptRecord()
+        script_record.ScriptTag = script_tag
+        script_record.Script = script
+        script_list.ScriptRecord.append(script_record)
+    script_list.ScriptCount = len(script_list.ScriptRecord)
+
+    table = ot.GSUB()
+    table.Version = 0x00010000
+    table.ScriptList  = script_list
+    table.FeatureList = feature_list
+    table.LookupList  = lookup_list
+    fb.font["GSUB"] = newTable("GSUB")
+    fb.font["GSUB"].table = table
+
+def build_ttfont(marged_font):
+    skipped_tables = [table_name for table_name in marged_font.keys() if not (table_name in SUPPORTED_TABLES)]
+    if len(skipped_tables) > 0:
+        print("fontTools backend では出力しないテーブル: {}".format(", ".join(skipped_tables)))
+
+    glyph_order = get_glyph_order(marged_font)
+    fb = FontBuilder(marged_font["head"]["unitsPerEm"], isTTF=True)
+    fb.setupGlyphOrder(glyph_order)
+    setup_cmap(fb, marged_font)
+    setup_glyf(fb, marged_font, glyph_order)
+    setup_head(fb, marged_font)
+    setup_hhea(fb, marged_font)
+    setup_OS_2(fb, marged_font)
+    setup_post(fb, marged_font)
+    setup_name(fb, marged_font)
+    fb.setupMaxp()
+    setup_GSUB(fb, marged_font)
+    return fb.font
+
+def write_font(marged_font, OUTPUT_FONT):
+    font = build_ttfont(marged_font)
+    font.save(OUTPUT_FONT)
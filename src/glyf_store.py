@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# glyf table（template_glyf.json）を必要な分だけ読み込む
+# 漢字のフォントの glyf table はとても大きいが、ビルドで中身を使うのはピンインを付ける漢字だけなので、
+# 全体を dict にせず、各グリフの json の位置（バイトオフセット）だけを覚えておき、アクセスされたときに読み込む。
+# 一度も書き換えなかったグリフは、書き出すときに元の json のバイト列をそのまま使う。
+# 読み出すたびに json から新しい dict を作って返し、覚えておかない（全体を読むとすべてのグリフを持つことになるので）。
+# そのため、取り出した dict を書き換えても反映されない。書き換えたときは store[glyf_name] = glyf_data で戻す。
+#
+# template_glyf.json            {"cid00001":{...},"cid00002":{...},...}  (orjson.dumps(glyf_table) と同じ)
+# template_glyf.json.index.json {"size": ファイルサイズ, "mtime_ns": 更新時刻, "sha256": ハッシュ, "names": [...], "starts": [...], "ends": [...]}
+#
+# index が無い（古い形式の）json や、index を作ったあとに書き換えられた json を開いたときは、一度だけ全体を読み込んで index を作り直す。
+# サイズと更新時刻が index と同じなら、そのまま使う。更新時刻だけが違う（キャッシュからコピーした、touch した）ときは、ハッシュを比べる。
+
+import os
+import mmap
+import array
+import hashlib
+import orjson
+import dump_cache
+
+INDEX_SUFFIX = ".index.json"
+
+def get_index_path(GLYF_JSON):
+    return GLYF_JSON + INDEX_SUFFIX
+
+# (グリフ名, json のバイト列) を順に返す。GlyfStore なら触っていないグリフはバイト列をそのまま返す
+def iter_raw_items(glyf_table):
+    if isinstance(glyf_table, GlyfStore):
+        yield from glyf_table.iter_raw_items()
+        return
+    for glyf_name, glyf_data in glyf_table.items():
+        yield (glyf_name, orjson.dumps(glyf_data))
+
+# glyf table を書き出して、同時に index も作る
+def write_glyf_table(glyf_table, GLYF_JSON):
+    names  = []
+    starts = []
+    ends   = []
+    offset = 0
+    sha256 = hashlib.sha256()
+    with open(GLYF_JSON, "wb") as write_file:
+        def write(data):
+            write_file.write(data)
+            sha256.update(data)
+        write(b"{")
+        offset += 1
+        for i, (glyf_name, raw_glyf_data) in enumerate(iter_raw_items(glyf_table)):
+            key = (b"," if i > 0 else b"") + orjson.dumps(glyf_name) + b":"
+            write(key)
+            write(raw_glyf_data)
+            names.append(glyf_name)
+            starts.append(offset + len(key))
+            offset += len(key) + len(raw_glyf_data)
+            ends.append(offset)
+        write(b"}")
+        offset += 1
+    index = {"size": offset, "mtime_ns": os.stat(GLYF_JSON).st_mtime_ns, "sha256": sha256.hexdigest(), "names": names, "starts": starts, "ends": ends}
+    write_index(index, GLYF_JSON)
+
+def write_index(index, GLYF_JSON):
+    with open(get_index_path(GLYF_JSON), "wb") as write_file:
+        write_file.write(orjson.dumps(index))
+
+class GlyfStore():
+    def __init__(self, GLYF_JSON):
+        self.GLYF_JSON = GLYF_JSON
+        if not self.load_index():
+            # index が無いか、json と合っていないので、index を付けて書き直す
+            with open(GLYF_JSON, "rb") as read_file:
+                glyf_table = orjson.loads(read_file.read())
+            write_glyf_table(glyf_table, GLYF_JSON)
+            del glyf_table
+            self.load_index()
+        self.read_file = open(GLYF_JSON, "rb")
+        self.mm = mmap.mmap(self.read_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # 書き換えた・追加したグリフ
+        self.overrides = {}
+        # 削除したグリフ
+        self.deleted = set()
+
+    def load_index(self):
+        INDEX_JSON = get_index_path(self.GLYF_JSON)
+        if not os.path.exists(INDEX_JSON):
+            return False
+        with open(INDEX_JSON, "rb") as read_file:
+            index = orjson.loads(read_file.read())
+        # json だけ書き換えられていたら使えない
+        stat = os.stat(self.GLYF_JSON)
+        if index["size"] != stat.st_size:
+            return False
+        if index.get("mtime_ns") != stat.st_mtime_ns:
+            # 同じサイズで書き換えられたかもしれないので、中身を比べる
+            if index.get("sha256") != dump_cache.calc_file_hash(self.GLYF_JSON):
+                return False
+            # 次からはハッシュを計算しなくて済むように、更新時刻を記録し直す
+            index["mtime_ns"] = stat.st_mtime_ns
+            write_index(index, self.GLYF_JSON)
+        self.names   = index["names"]
+        self.indexes = { glyf_name : i for i, glyf_name in enumerate(self.names) }
+        self.starts  = array.array("q", index["starts"])
+        self.ends    = array.array("q", index["ends"])
+        return True
+
+    def close(self):
+        self.mm.close()
+        self.read_file.close()
+
+    def get_raw(self, glyf_name):
+        i = self.indexes[glyf_name]
+        return self.mm[self.starts[i]:self.ends[i]]
+
+    def __getitem__(self, glyf_name):
+        if glyf_name in self.overrides:
+            return self.overrides[glyf_name]
+        if glyf_name in self.deleted or not (glyf_name in self.indexes):
+            raise KeyError(glyf_name)
+        return orjson.loads(self.get_raw(glyf_name))
+
+    def __setitem__(self, glyf_name, glyf_data):
+        self.deleted.discard(glyf_name)
+        self.overrides[glyf_name] = glyf_data
+
+    def __delitem__(self, glyf_name):
+        if not (glyf_name in self):
+            raise KeyError(glyf_name)
+        self.overrides.pop(glyf_name, None)
+        if glyf_name in self.indexes:
+            self.deleted.add(glyf_name)
+
+    def __contains__(self, glyf_name):
+        if glyf_name in self.overrides:
+            return True
+        return glyf_name in self.indexes and not (glyf_name in self.deleted)
+
+    def __len__(self):
+        added_num = len([glyf_name for glyf_name in self.overrides if not (glyf_name in self.indexes)])
+        return len(self.names) - len(self.deleted) + added_num
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        names = [glyf_name for glyf_name in self.names if not (glyf_name in self.deleted)]
+        return names + [glyf_name for glyf_name in self.overrides if not (glyf_name in self.indexes)]
+
+    def items(self):
+        for glyf_name in self.keys():
+            yield (glyf_name, self[glyf_name])
+
+    def get(self, glyf_name, default=None):
+        return self[glyf_name] if glyf_name in self else default
+
+    def update(self, other):
+        for glyf_name, glyf_data in other.items():
+            self[glyf_name] = glyf_data
+
+    def iter_raw_items(self):
+        for glyf_name in self.keys():
+            if glyf_name in self.overrides:
+                yield (glyf_name, orjson.dumps(self.overrides[glyf_name]))
+            else:
+                yield (glyf_name, self.get_raw(glyf_name))
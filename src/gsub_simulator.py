@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/gsub_simulator.py 参差不齐 背着手
+# python3 src/gsub_simulator.py --testcase res/phonics/duo_yin_zi/phrase_testcase.txt
+
+# Note
+# GSUBTable.get_GSUB_table() が作る GSUB（otfcc の json の形式）を、シェイパーと同じ手順で漢字の列に適用する。
+# フォントをビルドしなくても（otfcc もレンダラーも使わずに）、どの漢字がどの .ssNN になるかを確かめられる。
+#
+# シェイパー (HarfBuzz) と同じにしていること
+#   - 既定で有効な feature は rclt だけ（aalt はユーザーが選んだときだけ使うので適用しない）
+#   - lookup は feature に書いた順ではなく、LookupList (lookupOrder) の順に、文字列の先頭から適用する
+#   - 一つの位置では、最初に一致した subtable だけを使う（apply が空の subtable は ignore sub になる）
+#   - chaining が一致したら、入力 (inputBegins から inputEnds) の後ろから続ける
+#   - 一致するかどうかは、前の lookup で置き換えた後のグリフで調べる
+#
+# cmap はソースフォントの template_main.json を使う。無いときは辞書の漢字に uniXXXX の名前を付けたものを使う（グリフ名は結果に関係しない）。
+
+import os
+import re
+import sys
+import argparse
+import orjson
+import path as p
+import pinyin_getter as pg
+import utility
+import GSUB_table as gt
+
+TESTCASE_TXT = os.path.join(p.DIR_PHONICS, "duo_yin_zi", "phrase_testcase.txt")
+
+# 既定で有効な feature
+DEFAULT_FEATURES = ["rclt"]
+SCRIPT_NAME = "hani_DFLT"
+
+SS_PATTERN = re.compile(r"\.ss(\d\d)$")
+
+class GSUBSimulator():
+    def __init__(self, GSUB, cmap_table, features=DEFAULT_FEATURES, script_name=SCRIPT_NAME):
+        self.cmap_table = cmap_table
+        lookups = GSUB["lookups"]
+        # lookupOrder に無いものは後ろに付ける（fonttools_writer.setup_GSUB と同じ）
+        lookup_order = [lookup_name for lookup_name in GSUB.get("lookupOrder", []) if lookup_name in lookups]
+        lookup_order += [lookup_name for lookup_name in lookups.keys() if not (lookup_name in lookup_order)]
+
+        feature_lookups = set()
+        for feature_name in GSUB["languages"][script_name]["features"]:
+            if feature_name[:4] in features:
+                feature_lookups.update(GSUB["features"][feature_name])
+        self.lookup_names = [lookup_name for lookup_name in lookup_order if lookup_name in feature_lookups]
+
+        # 何度も引くので、match は set に、single は dict にしておく
+        self.singles = {}
+        self.chainings = {}
+        for lookup_name, lookup in lookups.items():
+            if lookup["type"] == "gsub_single":
+                table = {}
+                for subtable in lookup["subtables"]:
+                    for glyf_name, substitute in subtable.items():
+                        # 最初の subtable を優先する
+                        table.setdefault(glyf_name, substitute)
+                self.singles[lookup_name] = table
+            elif lookup["type"] == "gsub_chaining":
+                self.chainings[lookup_name] = [
+                    ([set(glyf_names) for glyf_names in subtable["match"]],
+                     [(apply["at"], apply["lookup"]) for apply in subtable["apply"]],
+                     subtable["inputBegins"], subtable["inputEnds"])
+                    for subtable in lookup["subtables"]
+                ]
+        # 入力の最初のグリフから、その位置で試す subtable を引けるようにする（順番は subtable の順のまま）
+        self.chaining_indexes = {}
+        for lookup_name, subtables in self.chainings.items():
+            chaining_index = {}
+            for subtable in subtables:
+                (match, _, input_begins, _) = subtable
+                for glyf_name in match[input_begins]:
+                    chaining_index.setdefault(glyf_name, []).append(subtable)
+            self.chaining_indexes[lookup_name] = chaining_index
+        for lookup_name in self.lookup_names:
+            if not (lookup_name in self.chainings) and not (lookup_name in self.singles):
+                raise Exception("{} の type ({}) には対応していません".format(lookup_name, lookups[lookup_name]["type"]))
+
+    def apply_single(self, lookup_name, glyf_names, i):
+        glyf_names[i] = self.singles[lookup_name].get(glyf_names[i], glyf_names[i])
+
+    # 一致した subtable の入力の終わりを返す。一致しなければ None
+    def apply_chaining(self, lookup_name, glyf_names, i):
+        for (match, applies, input_begins, input_ends) in self.chaining_indexes[lookup_name].get(glyf_names[i], []):
+            start = i - input_begins
+            if start < 0 or start + len(match) > len(glyf_names):
+                continue
+            if all( glyf_names[start + k] in glyf_name_set for k, glyf_name_set in enumerate(match) ):
+                for (at, nested_lookup_name) in applies:
+                    if nested_lookup_name in self.singles:
+                        self.apply_single(nested_lookup_name, glyf_names, start + at)
+                    else:
+                        raise Exception("入れ子の lookup ({}) は gsub_single だけに対応しています".format(nested_lookup_name))
+                return start + input_ends
+        return None
+
+    # グリフ名の列に適用する
+    def apply(self, glyf_names):
+        glyf_names = list(glyf_names)
+        for lookup_name in self.lookup_names:
+            i = 0
+            while i < len(glyf_names):
+                if lookup_name in self.singles:
+                    self.apply_single(lookup_name, glyf_names, i)
+                    i += 1
+                    continue
+                end = self.apply_chaining(lookup_name, glyf_names, i)
+                i = end if end != None and end > i else i + 1
+        return glyf_names
+
+    # 漢字の列に適用して、文字ごとに (漢字, グリフ名, ss の番号) を返す
+    # 置き換わらなかったときは標準の読み (SS_NORMAL_PRONUNCIATION) とする。cmap に無い文字は (文字, None, None)
+    def shape(self, text):
+        glyf_names = [self.cmap_table.get(str(ord(hanzi))) for hanzi in text]
+        shaped_glyf_names = self.apply(glyf_names)
+        results = []
+        for hanzi, glyf_name in zip(text, shaped_glyf_names):
+            if glyf_name == None:
+                results.append((hanzi, None, None))
+                continue
+            matched = SS_PATTERN.search(glyf_name)
+            ss_num = int(matched.group(1)) if matched != None else pg.SS_NORMAL_PRONUNCIATION
+            results.append((hanzi, glyf_name, ss_num))
+        return results
+
+    # 文字ごとの読みを返す（辞書に無い文字は None）
+    def get_pinyins(self, text):
+        pinyin_table = utility.get_pinyin_mapping_table()
+        pinyins = []
+        for (hanzi, _, ss_num) in self.shape(text):
+            if not (hanzi in pinyin_table) or ss_num == None:
+                pinyins.append(None)
+            else:
+                # ss01 は標準の読み、ss02 から異読
+                pinyins.append(pinyin_table[hanzi][max(ss_num, pg.SS_NORMAL_PRONUNCIATION) - pg.SS_NORMAL_PRONUNCIATION])
+        return pinyins
+
+def load_cmap_table(TAMPLATE_MAIN_JSON):
+    if os.path.exists(TAMPLATE_MAIN_JSON):
+        with open(TAMPLATE_MAIN_JSON, "rb") as read_file:
+            return orjson.loads(read_file.read())["cmap"]
+    return { str(ord(hanzi)) : "uni{:04X}".format(ord(hanzi)) for hanzi in utility.get_pinyin_mapping_table() }
+
+# パターンから GSUB を作って (GSUB, cmap_table) を返す
+def make_GSUB(TAMPLATE_MAIN_JSON, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON):
+    cmap_table = load_cmap_table(TAMPLATE_MAIN_JSON)
+    utility.set_cmap_table(cmap_table)
+    GSUB = gt.GSUBTable(None, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON).get_GSUB_table()
+    return (GSUB, cmap_table)
+
+# outputs/ のパターンから GSUB を作ってシミュレータを返す
+def make_simulator(TAMPLATE_MAIN_JSON, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON):
+    (GSUB, cmap_table) = make_GSUB(TAMPLATE_MAIN_JSON, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON)
+    return GSUBSimulator(GSUB, cmap_table)
+
+# phrase_testcase.txt の "単語: ピンイン/ピンイン" の行を返す（字下げした行、コメント、説明の行は使わない）
+def load_testcases(TESTCASE_FILE):
+    testcases = []
+    with open(TESTCASE_FILE, mode='r', encoding='utf-8') as read_file:
+        for line_num, line in enumerate(read_file, 1):
+            line = line.rstrip()
+            matched = re.match(r"^([^\s#:]+): (\S+)$", line)
+            if matched == None:
+                continue
+            (phrase, str_pinyin) = matched.groups()
+            pinyins = str_pinyin.split('/')
+            if len(phrase) == len(pinyins):
+                testcases.append((line_num, phrase, pinyins))
+    return testcases
+
+# 読みが複数ある漢字について、期待する読みと違うものを返す [(行番号, 単語, 期待する読み, 結果の読み)]
+def run_testcases(simulator, testcases):
+    pinyin_table = utility.get_pinyin_mapping_table()
+    failures = []
+    for (line_num, phrase, expected_pinyins) in testcases:
+        pinyins = simulator.get_pinyins(phrase)
+        if any( hanzi in pinyin_table and 1 < len(pinyin_table[hanzi]) and expected != pinyin
+                for hanzi, expected, pinyin in zip(phrase, expected_pinyins, pinyins) ):
+            failures.append((line_num, phrase, expected_pinyins, pinyins))
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the generated GSUB (rclt) to hanzi without building a font")
+    parser.add_argument("texts", nargs="*", help="シミュレートする文字列")
+    parser.add_argument("--testcase", nargs="?", const=TESTCASE_TXT, help="phrase_testcase.txt の単語がすべて期待する読みになるか調べる")
+    parser.add_argument("--expected-failures", type=int, default=None, help="--testcase で失敗してもよい数（これを超えたら終了コードを 1 にする）")
+    parser.add_argument("--template", default=os.path.join(p.DIR_TEMP, "template_main.json"), help="cmap を取るテンプレート")
+    args = parser.parse_args()
+
+    simulator = make_simulator(args.template,
+                               os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt"),
+                               os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json"),
+                               os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json"))
+
+    for text in args.texts:
+        for (hanzi, glyf_name, ss_num), pinyin in zip(simulator.shape(text), simulator.get_pinyins(text)):
+            print("{}\t{}\tss{:02}\t{}".format(hanzi, glyf_name, ss_num, pinyin) if glyf_name != None else "{}\t-".format(hanzi))
+        print()
+
+    if args.testcase != None:
+        testcases = load_testcases(args.testcase)
+        failures = run_testcases(simulator, testcases)
+        for (line_num, phrase, expected_pinyins, pinyins) in failures:
+            print("{}:{}: {} expected {} but {}".format(os.path.basename(args.testcase), line_num, phrase, "/".join(expected_pinyins), "/".join(str(pinyin) for pinyin in pinyins)))
+        print("{} / {} phrases passed".format(len(testcases) - len(failures), len(testcases)))
+        if args.expected_failures != None and len(failures) > args.expected_failures:
+            sys.exit(1)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/gsub_size.py
+# python3 src/gsub_size.py --json tmp/gsub_size.json
+
+# Note
+# GSUBTable.get_GSUB_table() が作る GSUB（otfcc の json の形式）の、バイナリにしたときの大きさを書き出す前に見積もる。
+# GSUB の中のオフセットは 16 ビットなので、辞書が大きくなると
+#   - subtable から coverage などへのオフセット（subtable の大きさ）
+#   - lookup から subtable へのオフセット（lookup の大きさ、LookupList の中での位置）
+# が 0xFFFF を超えて、otfccbuild がエラーになるか、端末で置き換わらなくなる。
+#
+# 見積もりは実際の大きさより小さくならないようにしている
+#   - coverage は format 1（グリフ ID が分からないので、format 2 の方が小さくなるかは見ない）
+#   - gsub_single は format 2、gsub_chaining は format 3（otfcc と fonttools_writer が使う形式）
+#   - 同じ coverage が何度出てきても共有しない
+#
+# LookupList の中の並びは fontTools と同じく、lookupOrder の順に「lookup の表、その subtable」を並べるとする。
+# この並びで LookupList から届かない lookup があれば、その前の lookup を extension (lookup type 7) にする必要がある。
+
+import os
+import sys
+import argparse
+import orjson
+import path as p
+
+OFFSET_LIMIT = 0xFFFF
+# これより大きい subtable は分ける（オフセットの上限に近づいたら分けて、余裕を残す）
+SPLIT_SIZE = 0xC000
+
+LOOKUP_HEADER_SIZE = 6
+# ExtensionSubstFormat1: format, extensionLookupType, extensionOffset (32 bit)
+EXTENSION_SUBTABLE_SIZE = 8
+
+def get_coverage_size(glyf_names):
+    # format 1: format, glyphCount, glyphArray
+    return 4 + 2 * len(glyf_names)
+
+def get_single_subtable_size(subtable):
+    # format 2: format, coverageOffset, glyphCount, substituteGlyphIDs + coverage
+    return 6 + 2 * len(subtable) + get_coverage_size(subtable)
+
+def get_alternate_subtable_size(subtable):
+    # format 1: format, coverageOffset, alternateSetCount, alternateSetOffsets + AlternateSet (glyphCount, alternateGlyphIDs) + coverage
+    alternate_sets_size = sum( 2 + 2 * len(alternates) for alternates in subtable.values() )
+    return 6 + 2 * len(subtable) + alternate_sets_size + get_coverage_size(subtable)
+
+def get_chaining_subtable_size(subtable):
+    # format 3: format, backtrackGlyphCount, inputGlyphCount, lookaheadGlyphCount, seqLookupCount,
+    #           coverageOffsets (match の位置ごと), seqLookupRecords (sequenceIndex, lookupListIndex) + coverage
+    match = subtable["match"]
+    coverages_size = sum( get_coverage_size(glyf_names) for glyf_names in match )
+    return 10 + 2 * len(match) + 4 * len(subtable["apply"]) + coverages_size
+
+SUBTABLE_SIZE_FUNCTIONS = {
+    "gsub_single"    : get_single_subtable_size,
+    "gsub_alternate" : get_alternate_subtable_size,
+    "gsub_chaining"  : get_chaining_subtable_size,
+}
+
+def get_subtable_size(lookup_type, subtable):
+    if not (lookup_type in SUBTABLE_SIZE_FUNCTIONS):
+        raise Exception("lookup type {} の大きさは見積もれません".format(lookup_type))
+    return SUBTABLE_SIZE_FUNCTIONS[lookup_type](subtable)
+
+def get_lookup_header_size(lookup):
+    # lookupType, lookupFlag, subTableCount, subtableOffsets
+    return LOOKUP_HEADER_SIZE + 2 * len(lookup["subtables"])
+
+def get_lookup_size(lookup):
+    return get_lookup_header_size(lookup) + sum( get_subtable_size(lookup["type"], subtable) for subtable in lookup["subtables"] )
+
+# gsub_single, gsub_alternate の subtable ({グリフ名: 置き換え先}) を、大きさが limit を超えないように分ける
+# グリフ名は subtable の中で一度しか出てこないので、分けても置き換えの結果は変わらない
+def split_glyph_subtable(lookup_type, subtable, limit=None):
+    limit = SPLIT_SIZE if limit == None else limit
+    if get_subtable_size(lookup_type, subtable) <= limit:
+        return [subtable]
+    subtables = [{}]
+    for glyf_name, substitute in subtable.items():
+        subtables[-1][glyf_name] = substitute
+        if get_subtable_size(lookup_type, subtables[-1]) > limit and len(subtables[-1]) > 1:
+            del subtables[-1][glyf_name]
+            subtables.append({glyf_name: substitute})
+    return subtables
+
+# lookupOrder の順の lookup 名（lookupOrder に無いものは後ろ。fonttools_writer.setup_GSUB と同じ）
+def get_lookup_names(GSUB):
+    lookups = GSUB["lookups"]
+    lookup_names = [lookup_name for lookup_name in GSUB.get("lookupOrder", []) if lookup_name in lookups]
+    lookup_names += [lookup_name for lookup_name in lookups.keys() if not (lookup_name in lookup_names)]
+    return lookup_names
+
+# lookup ごとの見積もり
+# {lookup 名: {"type", "size", "subtables" (subtable の数), "max_subtable_size", "offset", "max_offset", "extension"}}
+#   offset     : LookupList から lookup の表までのオフセット
+#   max_offset : lookup の表から最後の subtable までのオフセット
+def estimate_lookups(GSUB):
+    lookups = GSUB["lookups"]
+    lookup_names = get_lookup_names(GSUB)
+    estimates = {}
+    for lookup_name in lookup_names:
+        lookup = lookups[lookup_name]
+        subtable_sizes = [get_subtable_size(lookup["type"], subtable) for subtable in lookup["subtables"]]
+        header_size = get_lookup_header_size(lookup)
+        estimates[lookup_name] = {
+            "type"              : lookup["type"],
+            "size"              : header_size + sum(subtable_sizes),
+            "subtables"         : len(subtable_sizes),
+            "max_subtable_size" : max(subtable_sizes, default=0),
+            "offset"            : 0,
+            "max_offset"        : header_size + sum(subtable_sizes[:-1]),
+            "extension"         : False,
+        }
+    # extension にした lookup の subtable は GSUB の後ろの方に置かれるので、LookupList の中では表と ExtensionSubst だけになる
+    def get_size_in_list(estimate):
+        if estimate["extension"]:
+            return LOOKUP_HEADER_SIZE + (2 + EXTENSION_SUBTABLE_SIZE) * estimate["subtables"]
+        return estimate["size"]
+    for lookup_name in lookup_names:
+        if estimates[lookup_name]["max_offset"] > OFFSET_LIMIT:
+            estimates[lookup_name]["extension"] = True
+    # 届かない lookup があれば、その前の lookup を後ろから extension にする（fontTools が overflow を直すのと同じ）
+    for k, lookup_name in enumerate(lookup_names):
+        while True:
+            offset = 2 + 2 * len(lookup_names) + sum( get_size_in_list(estimates[name]) for name in lookup_names[:k] )
+            if offset <= OFFSET_LIMIT:
+                break
+            promotables = [name for name in reversed(lookup_names[:k]) if not estimates[name]["extension"]]
+            if len(promotables) == 0:
+                raise Exception("lookup の数が多すぎて、{} が LookupList から届きません".format(lookup_name))
+            estimates[promotables[0]]["extension"] = True
+        estimates[lookup_name]["offset"] = offset
+    return estimates
+
+# GSUB 全体の見積もり
+def estimate(GSUB):
+    lookups = estimate_lookups(GSUB)
+    return {
+        "size"       : sum( lookup["size"] for lookup in lookups.values() ),
+        "extensions" : [lookup_name for lookup_name, lookup in lookups.items() if lookup["extension"]],
+        # subtable の中のオフセットが上限を超えるもの（分けないと書き出せない）
+        "overflows"  : [lookup_name for lookup_name, lookup in lookups.items() if lookup["max_subtable_size"] > OFFSET_LIMIT],
+        "lookups"    : lookups,
+    }
+
+def print_estimate(GSUB_estimate, max_num=10):
+    lookups = GSUB_estimate["lookups"]
+    print("GSUB size estimate: {:.1f} KB, {} lookups, {} need extension".format(GSUB_estimate["size"] / 1024, len(lookups), len(GSUB_estimate["extensions"])))
+    for lookup_name in sorted(lookups.keys(), key=lambda lookup_name: -lookups[lookup_name]["size"])[:max_num]:
+        lookup = lookups[lookup_name]
+        print("  {}\t{}\t{:.1f} KB\t{} subtables{}".format(lookup_name, lookup["type"], lookup["size"] / 1024, lookup["subtables"],
+                                                       "\textension" if lookup["extension"] else ""))
+    for lookup_name in GSUB_estimate["overflows"]:
+        print("  error: {} has a subtable over {} bytes".format(lookup_name, OFFSET_LIMIT))
+
+def save_estimate(GSUB_estimate, SIZE_JSON):
+    with open(SIZE_JSON, "wb") as write_file:
+        write_file.write( orjson.dumps(GSUB_estimate, option=orjson.OPT_INDENT_2) )
+
+if __name__ == "__main__":
+    import gsub_simulator as gs
+    parser = argparse.ArgumentParser(description="Estimate the binary size of every GSUB lookup before serialization")
+    parser.add_argument("--json", help="見積もりを書き出す json")
+    parser.add_argument("--max", type=int, default=20, help="表示する lookup の数")
+    parser.add_argument("--template", default=os.path.join(p.DIR_TEMP, "template_main.json"), help="cmap を取るテンプレート")
+    args = parser.parse_args()
+
+    (GSUB, _) = gs.make_GSUB(args.template,
+                             os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt"),
+                             os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json"),
+                             os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json"))
+    GSUB_estimate = estimate(GSUB)
+    print_estimate(GSUB_estimate, args.max)
+    if args.json != None:
+        save_estimate(GSUB_estimate, args.json)
+    # ビルドと同じく、書き出せない subtable があれば失敗にする
+    if len(GSUB_estimate["overflows"]) > 0:
+        sys.exit(1)
@@ -4,58 +4,210 @@
 # time python3 src/main.py
 
 import os
-import subprocess
-import shell
 import sys
 import orjson
 import argparse
+import concurrent.futures
 import font as ft
+import font_backend
 import path as p
 import config
 import make_template_jsons
 import retrieve_latin_alphabet
+import dump_cache
+import build_graph as bg
+import profiler
+import pinyin_getter as pg
+import GSUB_table as gt
+import utility
+import name_table
+import glyf_store
+import subset
+import rule_analyzer
+import gsub_size
 
 def parse_args(args):
     parser = argparse.ArgumentParser(
-        description="Select font style (\"han_serif\" or \"handwritten\")")
-    parser.add_argument('-t', '--style', choices=['han_serif', 'handwritten'], default='han_serif')
-    return parser.parse_args(args)
+        description="Select font style (\"han_serif\", \"handwritten\" or \"all\")")
+    parser.add_argument('-t', '--style', choices=config.STYLES + ['all'], default='han_serif',
+                        help="all を指定すると、すべてのスタイルを別プロセスで並列にビルドする")
+    parser.add_argument('--no-cache', action='store_true', help="otfccdump のキャッシュを使わずにダンプし直す")
+    parser.add_argument('--force', action='store_true', help="前回のビルドから変更が無いステージも含めて、すべて実行し直す")
+    parser.add_argument('--stream', action='store_true', help="template.json を書き出さずに、compact な json を otfccbuild の標準入力に直接流し込む（otfcc backend のみ）")
+    parser.add_argument('--backend', choices=list(font_backend.BACKENDS.keys()), default='otfcc',
+                        help="フォントファイルを作る方法。fonttools は otfccbuild を使わずに直接 ttf を書き出す")
+    parser.add_argument('--profile', action='store_true',
+                        help="ステージごとの時間とメモリ使用量のピークを、出力フォントの隣の *.profile.json に書き出す（tracemalloc を使うので遅くなる）")
+    parser.add_argument('--subset-chars', help="指定した文字だけを含むフォント（*-Subset.ttf）を作る")
+    parser.add_argument('--subset-file', help="テキストファイル（コーパス）に含まれる文字だけを含むフォント（*-Subset.ttf）を作る。--subset-chars と併用できる")
+    options = parser.parse_args(args)
+    # fonttools は json を使わないので、流し込むものが無い
+    if options.stream and options.backend != "otfcc":
+        parser.error("--stream は otfcc backend でしか使えません (--backend {})".format(options.backend))
+    return options
 
-def main(args=None):
-    options = parse_args(args)
-    if options.style == "han_serif":
+# 一つのスタイルをビルドする。
+# スタイルごとに作業ディレクトリ（tmp/json/{style}）を分けているので、並列に実行しても中間ファイルが衝突しない
+def build_style(style, options):
+    DIR_WORK = os.path.join(p.DIR_TEMP, style)
+    os.makedirs(DIR_WORK, exist_ok=True)
+    if options.profile:
+        profiler.enable()
+
+    if style == "han_serif":
         FONT_TYPE       = config.HAN_SERIF_TYPE
         FONT_FOR_MAIN   = config.HAN_SERIF_MAIN
         FONT_FOR_PINYIN = config.HAN_SERIF_PINYIN
+        METADATA        = config.METADATA_FOR_HAN_SERIF
+        NAME_TABLE      = name_table.HAN_SERIF
         OUTPUT_FONT     = os.path.join(p.DIR_OUTPUT, "Mengshen-HanSerif.ttf")
-    elif options.style == "handwritten":
+    elif style == "handwritten":
         FONT_TYPE = config.HANDWRITTEN_TYPE
         FONT_FOR_MAIN   = config.HAN_HANDWRITTEN_MAIN
         FONT_FOR_PINYIN = config.HAN_HANDWRITTEN_PINYIN
+        METADATA        = config.METADATA_FOR_HANDWRITTEN
+        NAME_TABLE      = name_table.HANDWRITTEN
         OUTPUT_FONT     = os.path.join(p.DIR_OUTPUT, "Mengshen-Handwritten.ttf")
-        OUTPUT_FONT
     else:
         pass
 
-    # font (otf/ttf)を編集可能な json にダンプする
-    make_template_jsons.make_template(FONT_FOR_MAIN)
-    retrieve_latin_alphabet.make_alphabet_glyf_json(FONT_FOR_PINYIN)
-    print("finished dumping font")
+    # サブセットのときは、指定した文字の漢字だけを扱う
+    SUBSET_CHARS = None
+    if options.subset_chars != None or options.subset_file != None:
+        SUBSET_CHARS = subset.load_chars(options.subset_chars, options.subset_file)
+        subset.enable(SUBSET_CHARS)
+        OUTPUT_FONT = os.path.splitext(OUTPUT_FONT)[0] + "-Subset.ttf"
 
     # 編集可能ファイルである json の出力名を指定する
-    ALPHABET_FOR_PINYIN_JSON = os.path.join(p.DIR_TEMP, "alphabet4pinyin.json")
-    TAMPLATE_MAIN_JSON       = os.path.join(p.DIR_TEMP, "template_main.json")
-    TAMPLATE_GLYF_JSON       = os.path.join(p.DIR_TEMP, "template_glyf.json")
+    ALPHABET_FOR_PINYIN_JSON = os.path.join(DIR_WORK, retrieve_latin_alphabet.ALPHABET_FOR_PINYIN_JSON)
+    TAMPLATE_MAIN_JSON       = os.path.join(DIR_WORK, make_template_jsons.TAMPLATE_MAIN_JSON)
+    TAMPLATE_GLYF_JSON       = os.path.join(DIR_WORK, make_template_jsons.TAMPLATE_GLYF_JSON)
+    # ステージ間で受け渡す中間ファイル
+    STAGE_GLYF_JSON          = os.path.join(DIR_WORK, "stage_glyf.json")
+    # glyf table だけは GlyfStore で必要な分だけ読み込めるように別にする
+    STAGE_GLYF_TABLE_JSON    = os.path.join(DIR_WORK, "stage_glyf_table.json")
+    STAGE_CMAP_JSON          = os.path.join(DIR_WORK, "stage_cmap.json")
+    STAGE_GSUB_JSON          = os.path.join(DIR_WORK, "stage_GSUB.json")
+    STAGE_RULES_JSON         = os.path.join(DIR_WORK, "rule_conflicts.json")
+    STAGE_GSUB_SIZE_JSON     = os.path.join(DIR_WORK, "gsub_size.json")
+    MANIFEST_JSON            = os.path.join(DIR_WORK, "build_manifest.json")
 
     # 読み込む多音字の辞書データ
+    MAPPING_TABLE_TXT        = os.path.join(p.DIR_OUTPUT, pg.MARGED_MAPPING_TABLE)
     PATTERN_ONE_TXT          = os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt")
     PATTERN_TWO_JSON         = os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json")
     EXCEPTION_PATTERN_JSON   = os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json")
 
-    font = ft.Font( TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
-                    PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE )
+    # font (otf/ttf)を編集可能な json にダンプする
+    # ソースフォントが変わっていなければ、キャッシュしたダンプ結果を使う
+    def dump_main():
+        TEMPLATE_FILES = [make_template_jsons.TAMPLATE_MAIN_JSON, make_template_jsons.TAMPLATE_GLYF_JSON,
+                          glyf_store.get_index_path(make_template_jsons.TAMPLATE_GLYF_JSON)]
+        if options.no_cache or not dump_cache.restore(FONT_FOR_MAIN, TEMPLATE_FILES, DIR_WORK):
+            make_template_jsons.make_template(FONT_FOR_MAIN, DIR_WORK)
+            dump_cache.store(FONT_FOR_MAIN, TEMPLATE_FILES, DIR_WORK)
+        print("finished dumping font")
+
+    def dump_pinyin():
+        ALPHABET_FILES = [retrieve_latin_alphabet.ALPHABET_FOR_PINYIN_JSON]
+        if options.no_cache or not dump_cache.restore(FONT_FOR_PINYIN, ALPHABET_FILES, DIR_WORK):
+            retrieve_latin_alphabet.make_alphabet_glyf_json(FONT_FOR_PINYIN, DIR_WORK)
+            dump_cache.store(FONT_FOR_PINYIN, ALPHABET_FILES, DIR_WORK)
+        print("finished dumping font for pinyin")
+
     # glyf に追加するpinyin の種類は、mapping_table に準拠する
-    font.build(OUTPUT_FONT)
-    
+    def build_glyf():
+        font = ft.Font( TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
+                        PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE )
+        font.build_glyf()
+        if subset.is_enabled():
+            with profiler.stage("subset"):
+                subset.subset_font(font.marged_font)
+        # GSUB のステージは cmap だけを使うので、別ファイルにしておく
+        ft.save_as_json(font.marged_font["cmap"], STAGE_CMAP_JSON, option=None)
+        glyf_store.write_glyf_table(font.marged_font["glyf"], STAGE_GLYF_TABLE_JSON)
+        font.substance_glyf_table.close()
+        ft.save_as_json({ table_name : table for table_name, table in font.marged_font.items() if table_name != "glyf" }, STAGE_GLYF_JSON, option=None)
+
+    def build_GSUB():
+        with profiler.stage("load_json"):
+            with open(STAGE_CMAP_JSON, "rb") as read_file:
+                utility.set_cmap_table( orjson.loads(read_file.read()) )
+        with profiler.stage("add_GSUB"):
+            GSUB = gt.GSUBTable(None, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON)
+        ft.save_as_json(GSUB.get_GSUB_table(), STAGE_GSUB_JSON, option=None)
+        print("GSUB table を追加完了")
+        # 16 ビットのオフセットに収まるか、書き出す前に見積もる（大きい subtable は GSUBTable で分けてある）
+        GSUB_estimate = gsub_size.estimate(GSUB.get_GSUB_table())
+        gsub_size.save_estimate(GSUB_estimate, STAGE_GSUB_SIZE_JSON)
+        gsub_size.print_estimate(GSUB_estimate, max_num=5)
+        # subtable の中のオフセットが 16 ビットを超えると、壊れたフォントになるので止める
+        if len(GSUB_estimate["overflows"]) > 0:
+            raise Exception("GSUB の subtable が {} バイトを超えています: {}".format(gsub_size.OFFSET_LIMIT, ", ".join(GSUB_estimate["overflows"])))
+        # rclt のルールどうしが邪魔していないか調べる（ビルドは止めない）
+        with profiler.stage("analyze_rules"):
+            issues = rule_analyzer.analyze(GSUB.get_GSUB_table(), utility.cmap_table)
+        rule_analyzer.save_report(issues, STAGE_RULES_JSON)
+        rule_analyzer.print_issues(issues)
+
+    def build_font():
+        with profiler.stage("load_json"):
+            with open(STAGE_GLYF_JSON, "rb") as read_file:
+                marged_font = orjson.loads(read_file.read())
+            marged_font["glyf"] = glyf_store.GlyfStore(STAGE_GLYF_TABLE_JSON)
+            with open(STAGE_GSUB_JSON, "rb") as read_file:
+                marged_font["GSUB"] = orjson.loads(read_file.read())
+        ft.set_copyright(marged_font, FONT_TYPE)
+        backend = font_backend.get_backend(options.backend, DIR_WORK, options.stream)
+        try:
+            backend.compile(marged_font, OUTPUT_FONT)
+        finally:
+            marged_font["glyf"].close()
+
+    # sources にはステージの処理が直接使うモジュールを書く（そこから import しているモジュールは build_graph が辿る）
+    graph = bg.BuildGraph(MANIFEST_JSON)
+    graph.add_stage( bg.Stage("dump_main",   dump_main,   inputs=[FONT_FOR_MAIN],
+                              sources=[make_template_jsons, dump_cache, glyf_store],
+                              artifacts=[TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, glyf_store.get_index_path(TAMPLATE_GLYF_JSON)]) )
+    graph.add_stage( bg.Stage("dump_pinyin", dump_pinyin, inputs=[FONT_FOR_PINYIN],
+                              sources=[retrieve_latin_alphabet, dump_cache],
+                              artifacts=[ALPHABET_FOR_PINYIN_JSON]) )
+    graph.add_stage( bg.Stage("glyf", build_glyf,
+                              inputs=[MAPPING_TABLE_TXT],
+                              sources=[ft, subset, glyf_store],
+                              params={"font_type": FONT_TYPE, "metadata": METADATA, "subset": SUBSET_CHARS},
+                              depends=["dump_main", "dump_pinyin"],
+                              artifacts=[STAGE_GLYF_JSON, STAGE_GLYF_TABLE_JSON, glyf_store.get_index_path(STAGE_GLYF_TABLE_JSON), STAGE_CMAP_JSON]) )
+    graph.add_stage( bg.Stage("GSUB", build_GSUB,
+                              inputs=[MAPPING_TABLE_TXT, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON],
+                              sources=[gt, gsub_size, rule_analyzer, utility],
+                              params={"subset": SUBSET_CHARS},
+                              depends=["glyf"],
+                              artifacts=[STAGE_GSUB_JSON, STAGE_RULES_JSON, STAGE_GSUB_SIZE_JSON]) )
+    graph.add_stage( bg.Stage("compile", build_font,
+                              sources=[ft, font_backend, glyf_store],
+                              params={"version": name_table.VERSION, "name": NAME_TABLE, "output_font": OUTPUT_FONT, "backend": options.backend},
+                              depends=["glyf", "GSUB"],
+                              artifacts=[OUTPUT_FONT]) )
+    graph.run(force=options.force)
+
+    if options.profile:
+        PROFILE_JSON = os.path.splitext(OUTPUT_FONT)[0] + ".profile.json"
+        profiler.save_report(PROFILE_JSON, {"style": style, "backend": options.backend, "output_font": OUTPUT_FONT, "subset": SUBSET_CHARS})
+        profiler.disable()
+    return OUTPUT_FONT
+
+def main(args=None):
+    options = parse_args(args)
+    if options.style != "all":
+        build_style(options.style, options)
+        return
+
+    # スタイルごとに別プロセスでビルドする。全体の時間は最も遅いスタイルの時間に近くなる
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(config.STYLES)) as executor:
+        futures = { executor.submit(build_style, style, options) : style for style in config.STYLES }
+        for future in concurrent.futures.as_completed(futures):
+            print("finished building {} : {}".format(futures[future], future.result()))
+
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
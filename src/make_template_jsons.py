@@ -19,43 +19,52 @@
 import os
 import sys
 import argparse
-import subprocess
+import orjson
 import shell
 import path as p
-import getSystem as gs
+import profiler
+import glyf_store
 
 TAMPLATE_TEMP_JSON = "template_temp.json"
 TAMPLATE_MAIN_JSON = "template_main.json"
 TAMPLATE_GLYF_JSON = "template_glyf.json"
 
-def convert_otf2json(source_font_name):
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
-    cmd = "otfccdump -o {} --pretty {}".format(template_temp_json_path, source_font_name)
+def convert_otf2json(source_font_name, dir_temp=p.DIR_TEMP):
+    template_temp_json_path = os.path.join(dir_temp, TAMPLATE_TEMP_JSON)
+    # 人が読むためのファイルではないので、--pretty は付けない（出力も読み込みも速くなる）
+    cmd = "otfccdump -o {} {}".format(template_temp_json_path, source_font_name)
     shell.process(cmd)
 
-# TAMPLATE_MAIN_JSON の glyf table を別ファイルに分離する
-def make_new_glyf_table_json():
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
-    template_glyf_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_GLYF_JSON)
-    cmd = 'type {} | jq ".glyf" > {}'.format(template_temp_json_path, template_glyf_json_path)
-    shell.process(cmd)
-
-# TAMPLATE_MAIN_JSON の glyf のグリフ情報（contours）を削除する。これをビルドすると空のフォントができる。
-def delete_glyf_table_on_main_json():
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
-    template_main_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_MAIN_JSON)
-    if gs.SYSTEM_NAME == gs.W:
-        cmd = 'type {} | jq ".glyf |= map_values( (select(1).contours |= []) // .)" > {}'.format(template_temp_json_path, template_main_json_path)
-    else:
-        cmd = 'cat {} | jq ".glyf |= map_values( (select(1).contours |= []) // .)" > {}'.format(template_temp_json_path, template_main_json_path)
-    shell.process(cmd)
-
-def make_template(source_font_name):
-    convert_otf2json(source_font_name)
-    make_new_glyf_table_json()
-    delete_glyf_table_on_main_json()
-
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
+# otfccdump の出力を一度だけ読み込んで、TAMPLATE_GLYF_JSON と TAMPLATE_MAIN_JSON を作る
+# 以前は jq で二回読み込んでいた
+# $ cat template_temp.json | jq ".glyf" > template_glyf.json
+# $ cat template_temp.json | jq ".glyf |= map_values( (select(1).contours |= []) // .)" > template_main.json
+def split_template_json(dir_temp=p.DIR_TEMP):
+    template_temp_json_path = os.path.join(dir_temp, TAMPLATE_TEMP_JSON)
+    template_main_json_path = os.path.join(dir_temp, TAMPLATE_MAIN_JSON)
+    template_glyf_json_path = os.path.join(dir_temp, TAMPLATE_GLYF_JSON)
+    with open(template_temp_json_path, "rb") as read_file:
+        template = orjson.loads(read_file.read())
+
+    # TAMPLATE_MAIN_JSON の glyf table を別ファイルに分離する
+    # 中身は orjson.dumps(glyf_table) と同じ。GlyfStore で使うための index も一緒に作る
+    glyf_table = template["glyf"]
+    glyf_store.write_glyf_table(glyf_table, template_glyf_json_path)
+
+    # TAMPLATE_MAIN_JSON の glyf のグリフ情報（contours）を削除する。これをビルドすると空のフォントができる。
+    # glyf table は書き出し済みなので、コピーせずにそのまま書き換える
+    for glyf_data in glyf_table.values():
+        glyf_data["contours"] = []
+    with open(template_main_json_path, "wb") as write_file:
+        write_file.write(orjson.dumps(template))
+
+def make_template(source_font_name, dir_temp=p.DIR_TEMP):
+    with profiler.stage("dump"):
+        convert_otf2json(source_font_name, dir_temp)
+    with profiler.stage("split"):
+        split_template_json(dir_temp)
+
+    template_temp_json_path = os.path.join(dir_temp, TAMPLATE_TEMP_JSON)
     os.remove(template_temp_json_path)
 
 def parse_args(args):
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/mapping_table_binary.py
+
+# marged-mapping-table.txt をコンパイルしたバイナリ
+# 毎回 16k 行のテキストを split して list を作る代わりに、mmap したバイナリを二分探索で引く。
+#
+# tmp/cache/mapping_table/{sha256(marged-mapping-table.txt)}.v{FORMAT_VERSION}.{byteorder}.bin
+#   header            MAGIC, FORMAT_VERSION, 漢字の数, 発音の数, 読みの数 (u32)
+#   codepoints        u32 * 漢字の数        コードポイント順
+#   reading_offsets   u32 * (漢字の数 + 1)  i 番目の漢字の発音は pronunciation_ids[reading_offsets[i]:reading_offsets[i+1]]
+#   string_offsets    u32 * (発音の数 + 1)  j 番目の発音は strings[string_offsets[j]:string_offsets[j+1]]
+#   pronunciation_ids u16 * 読みの数
+#   strings           発音の utf-8
+#
+# 数値はビルドしたマシンのバイトオーダーのまま書き出す（ファイル名に含めるので、別のマシンのものや、形式の違うものは使わない）。
+# 辞書はコードポイント順に並んでいるので、その順で書き出す。並んでいないときはコンパイルしない。
+
+import os
+import sys
+import shutil
+import array
+import mmap
+import struct
+import bisect
+from collections.abc import Mapping
+import path as p
+
+DIR_MAPPING_TABLE_CACHE = os.path.join(p.DIR_CACHE, "mapping_table")
+MAGIC = b"MSPY"
+# 形式を変えたときは、この値を変える
+FORMAT_VERSION = 1
+HEADER = struct.Struct("=4sIIII")
+
+# 辞書のバイナリとして読めないとき（壊れている、形式が違う）。読み込む側はコンパイルし直すか、テキストを使う
+class InvalidBinaryError(Exception):
+    pass
+
+def get_binary_path(digest):
+    return os.path.join(DIR_MAPPING_TABLE_CACHE, "{}.v{}.{}.bin".format(digest, FORMAT_VERSION, sys.byteorder))
+
+# pinyin_table ({hanzi: (pinyin, ...)}) をバイナリにする。コードポイント順でなければ False を返す
+def compile_mapping_table(pinyin_table, BINARY_PATH):
+    codepoints = array.array("I", [ord(hanzi) for hanzi in pinyin_table.keys()])
+    if any(codepoints[i] >= codepoints[i+1] for i in range(len(codepoints)-1)):
+        return False
+
+    pronunciation_ids = array.array("H")
+    reading_offsets   = array.array("I", [0])
+    # 同じ発音は一つの id にまとめる
+    ids_of_pronunciation = {}
+    for pinyins in pinyin_table.values():
+        for pinyin in pinyins:
+            if not (pinyin in ids_of_pronunciation):
+                ids_of_pronunciation[pinyin] = len(ids_of_pronunciation)
+            pronunciation_ids.append(ids_of_pronunciation[pinyin])
+        reading_offsets.append(len(pronunciation_ids))
+    if len(ids_of_pronunciation) > 0xFFFF:
+        raise Exception("発音は {} 種類までしか対応していません".format(0xFFFF))
+
+    strings = b""
+    string_offsets = array.array("I", [0])
+    for pinyin in ids_of_pronunciation.keys():
+        strings += pinyin.encode('utf-8')
+        string_offsets.append(len(strings))
+
+    os.makedirs(os.path.dirname(BINARY_PATH), exist_ok=True)
+    # 途中で止まっても壊れたファイルが残らないように、一時ファイルに書いてから置き換える
+    tmp_path = "{}.{}.tmp".format(BINARY_PATH, os.getpid())
+    with open(tmp_path, "wb") as write_file:
+        write_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(codepoints), len(ids_of_pronunciation), len(pronunciation_ids)))
+        for table in [codepoints, reading_offsets, string_offsets, pronunciation_ids]:
+            write_file.write(table.tobytes())
+        write_file.write(strings)
+    os.replace(tmp_path, BINARY_PATH)
+    return True
+
+def clear():
+    if os.path.exists(DIR_MAPPING_TABLE_CACHE):
+        shutil.rmtree(DIR_MAPPING_TABLE_CACHE)
+
+# コンパイルしたバイナリを読み取り専用の dict のように扱う
+# {hanzi: (pinyin, ...)}
+class CompiledMappingTable(Mapping):
+    def __init__(self, BINARY_PATH):
+        with open(BINARY_PATH, "rb") as read_file:
+            if os.fstat(read_file.fileno()).st_size < HEADER.size:
+                raise InvalidBinaryError("{} は辞書のバイナリではありません".format(BINARY_PATH))
+            self.mm = mmap.mmap(read_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, format_version, hanzi_num, pronunciation_num, reading_num) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self.mm.close()
+            raise InvalidBinaryError("{} は辞書のバイナリではありません（形式 {}）".format(BINARY_PATH, format_version))
+        # 途中までしか書かれていないもの
+        if len(self.mm) < HEADER.size + 4 * hanzi_num + 4 * (hanzi_num + 1) + 4 * (pronunciation_num + 1) + 2 * reading_num:
+            self.mm.close()
+            raise InvalidBinaryError("{} が途中で切れています".format(BINARY_PATH))
+
+        buffer = memoryview(self.mm)
+        offset = HEADER.size
+        def take(item_size, item_num, format):
+            nonlocal offset
+            view = buffer[offset:offset + item_size * item_num].cast(format)
+            offset += item_size * item_num
+            return view
+        self.codepoints        = take(4, hanzi_num, "I")
+        self.reading_offsets   = take(4, hanzi_num + 1, "I")
+        string_offsets         = take(4, pronunciation_num + 1, "I")
+        self.pronunciation_ids = take(2, reading_num, "H")
+        strings = buffer[offset:]
+        # 発音は 1400 種類ほどしかないので、最初に str にしておく
+        self.pronunciations = tuple( str(strings[string_offsets[j]:string_offsets[j+1]], 'utf-8') for j in range(pronunciation_num) )
+
+    def find(self, codepoint):
+        i = bisect.bisect_left(self.codepoints, codepoint)
+        if i < len(self.codepoints) and self.codepoints[i] == codepoint:
+            return i
+        return -1
+
+    def get_pinyins(self, i):
+        ids = self.pronunciation_ids[self.reading_offsets[i]:self.reading_offsets[i+1]]
+        return tuple( self.pronunciations[j] for j in ids )
+
+    def __getitem__(self, hanzi):
+        i = self.find(ord(hanzi)) if isinstance(hanzi, str) and len(hanzi) == 1 else -1
+        if i < 0:
+            raise KeyError(hanzi)
+        return self.get_pinyins(i)
+
+    def __contains__(self, hanzi):
+        return isinstance(hanzi, str) and len(hanzi) == 1 and self.find(ord(hanzi)) >= 0
+
+    def __iter__(self):
+        for codepoint in self.codepoints:
+            yield chr(codepoint)
+
+    def __len__(self):
+        return len(self.codepoints)
+
+    # 二分探索をせずに順に取り出す
+    def items(self):
+        return [ (chr(self.codepoints[i]), self.get_pinyins(i)) for i in range(len(self.codepoints)) ]
+
+    def values(self):
+        return [ self.get_pinyins(i) for i in range(len(self.codepoints)) ]
+
+if __name__ == "__main__":
+    import pinyin_getter as pg
+    pg.mapping_table_registry.get_table()
+    print("{} -> {}".format(pg.mapping_table_registry.path, pg.mapping_table_registry.binary_path))
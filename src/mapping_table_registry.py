@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# marged-mapping-table.txt を読み込んで共有する
+# src/pinyin_getter.py と res/phonics/duo_yin_zi/scripts/pinyin_getter.py の両方がこれを使う
+
+import io
+import os
+import time
+import hashlib
+from types import MappingProxyType
+import mapping_table_binary as mtb
+
+# 辞書のファイルが変わっていないかを確認する間隔（秒）。辞書の view は何度も引くので、そのたびに stat しない
+CHECK_INTERVAL = 1.0
+
+# 辞書（MARGED_MAPPING_TABLE）をプロセス全体で共有する
+# 最初に使われたときに一度だけ読み込み、読み取り専用（MappingProxyType, ピンインは tuple）で返す。
+# 使うときにファイルの mtime とサイズを確認し（CHECK_INTERVAL 秒に一度まで。パスが変わったときと reload() のあとはすぐに）、
+# 変わっていたらハッシュを比べて、中身が変わっていれば読み込み直す。
+class MappingTableRegistry():
+    def __init__(self, get_path):
+        self.get_path = get_path
+        # サブセットのビルドで使う漢字。None のときはすべての漢字
+        self.hanzi_filter = None
+        self.clear()
+
+    def clear(self):
+        self.path   = None
+        self.stat   = None
+        self.digest = None
+        self.binary_path  = None
+        self.pinyin_table = None
+        self.views = {}
+        # 最後にファイルを確認した時刻 (time.monotonic)
+        self.checked_at = None
+
+    def is_valid(self, path):
+        if self.pinyin_table == None or path != self.path:
+            return False
+        stat = get_file_stat(path)
+        if stat == self.stat:
+            return True
+        # touch や git checkout で mtime だけが変わったときは読み込み直さない
+        with open(path, "rb") as read_file:
+            digest = hashlib.sha256(read_file.read()).hexdigest()
+        if digest != self.digest:
+            return False
+        self.stat = stat
+        return True
+
+    def load(self, path):
+        stat = get_file_stat(path)
+        with open(path, "rb") as read_file:
+            data = read_file.read()
+        self.clear()
+        self.path   = path
+        self.stat   = stat
+        self.digest = hashlib.sha256(data).hexdigest()
+        # 同じ中身の辞書をコンパイルしたバイナリ（tmp/cache/mapping_table/）があれば、それを mmap して使う
+        binary_path = mtb.get_binary_path(self.digest)
+        if os.path.exists(binary_path) and self.load_binary(binary_path):
+            return
+        # 無いか壊れているときはコンパイルし直す
+        pinyin_table = parse_mapping_table( io.StringIO(data.decode('utf-8'), newline=None) )
+        try:
+            is_compiled = mtb.compile_mapping_table(pinyin_table, binary_path)
+        except OSError:
+            # キャッシュに書き込めなくても、テキストを読み込んだものを使えばよい
+            is_compiled = False
+        if is_compiled and self.load_binary(binary_path):
+            return
+        self.pinyin_table = pinyin_table
+
+    def load_binary(self, binary_path):
+        try:
+            self.pinyin_table = mtb.CompiledMappingTable(binary_path)
+        except (mtb.InvalidBinaryError, OSError):
+            return False
+        self.binary_path = binary_path
+        return True
+
+    def set_hanzi_filter(self, hanzi_filter):
+        self.hanzi_filter = None if hanzi_filter == None else frozenset(hanzi_filter)
+        self.views = {}
+
+    # 次に使うときに、CHECK_INTERVAL を待たずにファイルを確認する
+    def reload(self):
+        self.checked_at = None
+
+    def get_view(self, name, make_view):
+        path = self.get_path()
+        now = time.monotonic()
+        if path != self.path or self.checked_at == None or now - self.checked_at >= CHECK_INTERVAL:
+            if not self.is_valid(path):
+                self.load(path)
+            self.checked_at = now
+        if not (name in self.views):
+            self.views[name] = make_view()
+        return self.views[name]
+
+    # {hanzi: (pinyin, ...)}
+    def get_table(self):
+        def make_table():
+            if self.hanzi_filter == None:
+                return MappingProxyType(self.pinyin_table)
+            return MappingProxyType({ hanzi : pinyins for hanzi, pinyins in self.pinyin_table.items() if hanzi in self.hanzi_filter })
+        return self.get_view("table", make_table)
+
+    # ピンインが一つだけの漢字 ((hanzi, pinyins), ...)
+    def get_single_pinyin_hanzi(self):
+        return self.get_view("single", lambda: tuple( (hanzi, pinyins) for hanzi, pinyins in self.get_table().items() if 1 == len(pinyins) ))
+
+    # ピンインが2つ以上の漢字 ((hanzi, pinyins), ...)
+    def get_multiple_pinyin_hanzi(self):
+        return self.get_view("multiple", lambda: tuple( (hanzi, pinyins) for hanzi, pinyins in self.get_table().items() if 1 < len(pinyins) ))
+
+    # すべての発音
+    def get_pronunciations(self):
+        return self.get_view("pronunciations", lambda: frozenset( pinyin for pinyins in self.get_table().values() for pinyin in pinyins ))
+
+def get_file_stat(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def parse_mapping_table(lines):
+    pinyin_table = {}
+    for line in lines:
+        str_unicode = line.split(':')[0]
+        int_unicode = int(str_unicode[2:], 16)
+        hanzi = chr(int_unicode)
+        str_pinyins = line.split(' ')[1]
+        pinyins = str_pinyins.split(",")
+        pinyin_table[hanzi] = tuple(pinyins)
+    return pinyin_table
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/pattern_ir.py
+# python3 src/pattern_ir.py --dir outputs/
+
+# Note
+# 多音字のパターン（duoyinzi_pattern_one.txt, duoyinzi_pattern_two.json, duoyinzi_exceptional_pattern.json）を、
+# GSUBTable がそのまま使える型付きのルール (PatternIR) にする。
+# テキストの "order, hanzi, pinyin, [~a|b~|c~d]" の split や、パターンの種類を見分ける処理は、ここで一度だけ行う。
+#
+# 三つのファイルの中身が同じなら、コンパイルした結果を pickle で tmp/cache/pattern_ir/{sha256}.v{FORMAT_VERSION}.pickle に置いて使い回す。
+# 漢字のままにしておき、グリフ名（cid）にはしない（グリフ名はフォントのスタイルごとに違うので、GSUBTable で変換する）。
+#
+# PatternIR
+#   pattern_one         : (PatternOneRule, ...)  lookup_rclt_0 に書く順（slot の順、同じ slot ではファイルの順）
+#   slot_num            : lookup_pattern_0{slot} の数
+#   pattern_two_lookups : {lookup 名: {漢字: ss の番号}}
+#   pattern_two         : (PhraseRule, ...)
+#   exception_lookups   : {lookup 名: {漢字: ss の番号}}
+#   exception_pattern   : (PhraseRule, ...)
+
+import os
+import re
+import sys
+import shutil
+import pickle
+import hashlib
+import argparse
+import collections
+import orjson
+import path as p
+
+DIR_PATTERN_IR_CACHE = os.path.join(p.DIR_CACHE, "pattern_ir")
+# 形式を変えたときは、この値を変える
+FORMAT_VERSION = 1
+
+# pattern one の一つの異読
+#   target      : 置き換える漢字
+#   slot        : 異読の番号（0 から）。lookup_pattern_0{slot} で ss{SS_VARIATIONAL_PRONUNCIATION + slot} にする
+#   pinyin      : 異読のピンイン
+#   left_match  : ~X の X (target の後ろの漢字) の tuple。まとめて一つのルールにする
+#   right_match : X~ の X (target の前の漢字) の tuple。まとめて一つのルールにする
+#   other_match : それ以外のパターンの (単語, target の位置) の tuple
+PatternOneRule = collections.namedtuple("PatternOneRule", ["target", "slot", "pinyin", "left_match", "right_match", "other_match"])
+# pattern two, exception pattern の一つの単語
+#   applies : 置き換える (位置, lookup 名) の tuple
+#   ignore  : 置き換えない例外の (単語, target の位置)。無いときは None
+PhraseRule = collections.namedtuple("PhraseRule", ["phrase", "applies", "ignore"])
+PatternIR = collections.namedtuple("PatternIR", ["pattern_one", "slot_num", "pattern_two_lookups", "pattern_two", "exception_lookups", "exception_pattern"])
+
+SS_PATTERN = re.compile(r"\.ss(\d+)$")
+
+def compile_pattern_one(lines):
+    rules_of_slots = []
+    for line in lines:
+        [str_order, hanzi, pinyin, str_patterns] = line.rstrip('\n').split(', ')
+        order = int(str_order)
+        # order = 1 は標準的なピンインなので無視する
+        if 1 == order:
+            continue
+        # 2 から異読のピンイン。添字に使うために -2 して 0 にする。
+        slot = order - 2
+        while len(rules_of_slots) <= slot:
+            rules_of_slots.append({})
+        left_match  = []
+        right_match = []
+        other_match = []
+        for pattern in str_patterns.strip("[]").split('|'):
+            at = pattern.index("~")
+            if len(pattern) == 2 and at == 0:
+                left_match.append(pattern[1])
+            elif len(pattern) == 2 and at == 1:
+                right_match.append(pattern[0])
+            else:
+                other_match.append( (pattern.replace("~", hanzi), at) )
+        # 同じ漢字の同じ異読が二度あれば、後のもので上書きする（並びは最初のまま）
+        rules_of_slots[slot][hanzi] = PatternOneRule(hanzi, slot, pinyin, tuple(left_match), tuple(right_match), tuple(other_match))
+    # 異読が無くても lookup_pattern_00 は作る
+    slot_num = max(len(rules_of_slots), 1)
+    return (tuple( rule for rules in rules_of_slots for rule in rules.values() ), slot_num)
+
+# {lookup 名: {漢字: "漢字.ssNN"}} -> {lookup 名: {漢字: NN}}
+def compile_lookup_table(lookup_table):
+    lookups = {}
+    for lookup_name, table in lookup_table.items():
+        lookups[lookup_name] = {}
+        for hanzi, glyf_name in table.items():
+            matched = SS_PATTERN.search(glyf_name)
+            if matched == None:
+                raise Exception("{} の {}: {} はグリフ名ではありません".format(lookup_name, hanzi, glyf_name))
+            lookups[lookup_name][hanzi] = int(matched.group(1))
+    return lookups
+
+# [{漢字: lookup 名 or None}, ...] -> ((位置, lookup 名), ...)
+def compile_applies(list_pattern_table):
+    applies = []
+    for at, table in enumerate(list_pattern_table):
+        # 要素は一つしかない
+        lookup_name = list(table.values())[0]
+        if lookup_name != None:
+            applies.append( (at, lookup_name) )
+    return tuple(applies)
+
+def compile_pattern_two(pattern_two):
+    rules = tuple( PhraseRule(phrase, compile_applies(list_pattern_table), None) for phrase, list_pattern_table in pattern_two["patterns"].items() )
+    return (compile_lookup_table(pattern_two["lookup_table"]), rules)
+
+def compile_exception_pattern(exception_pattern):
+    rules = []
+    for phrase, setting_of_phrase in exception_pattern["patterns"].items():
+        ignore = None
+        ignore_pattern = setting_of_phrase["ignore"]
+        # e.g.: "背 着' 手" -> ("背着手", 1)
+        if ignore_pattern != None:
+            list_ignore_pattern = ignore_pattern.split(' ')
+            tmp = [ hanzi for hanzi in list_ignore_pattern if re.match(".'", hanzi) ]
+            if len(tmp) != 1:
+                # 現在は、対象('がある)漢字はひとつだけと想定している
+                raise Exception("exception pattern の ignore 記述が間違っています。: \n {}".format(ignore_pattern))
+            ignore = ( ignore_pattern.replace(" ", "").replace("'", ""), list_ignore_pattern.index(tmp[0]) )
+        rules.append( PhraseRule(phrase, compile_applies(setting_of_phrase["pattern"]), ignore) )
+    return (compile_lookup_table(exception_pattern["lookup_table"]), tuple(rules))
+
+def compile_patterns(pattern_one_data, pattern_two_data, exception_pattern_data):
+    (pattern_one, slot_num) = compile_pattern_one( pattern_one_data.decode('utf-8').splitlines() )
+    (pattern_two_lookups, pattern_two) = compile_pattern_two( orjson.loads(pattern_two_data) )
+    (exception_lookups, exception_pattern) = compile_exception_pattern( orjson.loads(exception_pattern_data) )
+    return PatternIR(pattern_one, slot_num, pattern_two_lookups, pattern_two, exception_lookups, exception_pattern)
+
+def get_cache_path(digest):
+    return os.path.join(DIR_PATTERN_IR_CACHE, "{}.v{}.pickle".format(digest, FORMAT_VERSION))
+
+def store(pattern_ir, CACHE_PATH):
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    # 途中で止まっても壊れたファイルが残らないように、一時ファイルに書いてから置き換える
+    tmp_path = "{}.{}.tmp".format(CACHE_PATH, os.getpid())
+    with open(tmp_path, "wb") as write_file:
+        # namedtuple のままだと、読み込むときに書き込んだときと同じモジュール名（__main__ など）が要るので、tuple にして保存する
+        data = ( tuple( tuple(rule) for rule in pattern_ir.pattern_one ), pattern_ir.slot_num,
+                 pattern_ir.pattern_two_lookups, tuple( tuple(rule) for rule in pattern_ir.pattern_two ),
+                 pattern_ir.exception_lookups, tuple( tuple(rule) for rule in pattern_ir.exception_pattern ) )
+        pickle.dump(data, write_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, CACHE_PATH)
+
+def restore(CACHE_PATH):
+    with open(CACHE_PATH, "rb") as read_file:
+        (pattern_one, slot_num, pattern_two_lookups, pattern_two, exception_lookups, exception_pattern) = pickle.load(read_file)
+    return PatternIR( tuple( PatternOneRule(*rule) for rule in pattern_one ), slot_num,
+                      pattern_two_lookups, tuple( PhraseRule(*rule) for rule in pattern_two ),
+                      exception_lookups, tuple( PhraseRule(*rule) for rule in exception_pattern ) )
+
+def clear():
+    if os.path.exists(DIR_PATTERN_IR_CACHE):
+        shutil.rmtree(DIR_PATTERN_IR_CACHE)
+
+# 同じプロセスで何度も GSUBTable を作る（gsub_simulator, pinyin_annotator など）ので、読み込んだものは digest ごとに持っておく
+loaded = {}
+
+# パターンのファイルから PatternIR を返す。同じ中身のものをコンパイルしたキャッシュがあれば、それを使う
+def load_patterns(PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON):
+    datas = []
+    for PATTERN_FILE in [PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON]:
+        with open(PATTERN_FILE, "rb") as read_file:
+            datas.append(read_file.read())
+    digest = hashlib.sha256( b"\0".join(datas) ).hexdigest()
+    if digest in loaded:
+        return loaded[digest]
+
+    CACHE_PATH = get_cache_path(digest)
+    pattern_ir = None
+    if os.path.exists(CACHE_PATH):
+        try:
+            pattern_ir = restore(CACHE_PATH)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError):
+            # 壊れたキャッシュは作り直す
+            pattern_ir = None
+    if pattern_ir == None:
+        pattern_ir = compile_patterns(*datas)
+        try:
+            store(pattern_ir, CACHE_PATH)
+        except OSError:
+            # キャッシュに書き込めなくても、コンパイルしたものを使えばよい
+            pass
+    loaded[digest] = pattern_ir
+    return pattern_ir
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the duoyinzi patterns into the rule IR used by GSUBTable")
+    parser.add_argument("--dir", default=p.DIR_OUTPUT, help="duoyinzi_pattern_* のあるディレクトリ")
+    args = parser.parse_args()
+
+    pattern_ir = load_patterns(os.path.join(args.dir, "duoyinzi_pattern_one.txt"),
+                               os.path.join(args.dir, "duoyinzi_pattern_two.json"),
+                               os.path.join(args.dir, "duoyinzi_exceptional_pattern.json"))
+    print("pattern one: {} rules ({} slots), pattern two: {} rules, exception pattern: {} rules".format(
+        len(pattern_ir.pattern_one), pattern_ir.slot_num, len(pattern_ir.pattern_two), len(pattern_ir.exception_pattern)))
+    print("cache: {}".format(os.path.normpath(DIR_PATTERN_IR_CACHE)))
+    sys.exit(0)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# 複数の単語をまとめて探す Aho–Corasick のオートマトン
+# 単語ごとに re.findall で全単語を調べると、単語の数の二乗に比例して遅くなる。
+# オートマトンを一度作れば、全単語を一回なぞるだけで、どの単語がどの単語に含まれているかが分かる。
+# 単語は正規表現ではなく、ただの文字列として扱う。
+# 文字列でなくても、hashable なものの列（グリフ名の tuple など）なら同じように使える。
+#
+# res/phonics/duo_yin_zi/scripts/phrase_validator.py（単語の検証）と src/rule_analyzer.py（rclt のルールの検証）が使う
+
+from collections import deque
+
+class PhraseAutomaton():
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+        # 状態ごとの遷移 {文字: 次の状態}
+        self.goto    = [{}]
+        self.fail    = [0]
+        # 状態ごとの、その状態で終わる単語の番号
+        self.outputs = [[]]
+        # fail を辿ったときに、単語が終わる最初の状態（無ければ 0）
+        self.output_link = [0]
+        for phrase_id, phrase in enumerate(self.phrases):
+            self.add(phrase_id, phrase)
+        self.build()
+
+    def add(self, phrase_id, phrase):
+        state = 0
+        for character in phrase:
+            if not (character in self.goto[state]):
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.output_link.append(0)
+                self.goto[state][character] = len(self.goto) - 1
+            state = self.goto[state][character]
+        self.outputs[state].append(phrase_id)
+
+    # 幅優先で fail を作る
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while len(queue) > 0:
+            state = queue.popleft()
+            for character, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail_state = self.fail[state]
+                while fail_state != 0 and not (character in self.goto[fail_state]):
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(character, 0)
+                link = self.fail[next_state]
+                self.output_link[next_state] = link if len(self.outputs[link]) > 0 else self.output_link[link]
+
+    # text に含まれる単語を (終わりの位置, 単語の番号) で返す。重なっているものも含む
+    def search(self, text):
+        state = 0
+        for i, character in enumerate(text):
+            while state != 0 and not (character in self.goto[state]):
+                state = self.fail[state]
+            state = self.goto[state].get(character, 0)
+            matched_state = state if len(self.outputs[state]) > 0 else self.output_link[state]
+            while matched_state != 0:
+                for phrase_id in self.outputs[matched_state]:
+                    yield (i, phrase_id)
+                matched_state = self.output_link[matched_state]
+
+    # 各位置の文字が集合のとき、位置ごとにどれか一つを選んでできる列のどれかに含まれる単語を (終わりの位置, 単語の番号) で返す
+    # 組み合わせを展開せずに、途中まで一致している状態をすべて持って進める（fail は使わない）。
+    # 持っている状態は、その位置までの列で終わる単語の接頭辞なので、単語の数と長さを超えない。
+    def search_sets(self, character_sets):
+        states = []
+        for i, characters in enumerate(character_sets):
+            next_states = []
+            # トライなので、違う状態や違う文字から同じ状態には進まない
+            for state in states + [0]:
+                goto = self.goto[state]
+                if len(goto) < len(characters):
+                    next_states += [next_state for character, next_state in goto.items() if character in characters]
+                else:
+                    next_states += [goto[character] for character in characters if character in goto]
+            states = next_states
+            for state in states:
+                for phrase_id in self.outputs[state]:
+                    yield (i, phrase_id)
+
+    # 別の単語に含まれている単語の組 (含まれる単語の番号, 含む単語の番号) を返す
+    # 同じ単語が二つあるときも、お互いに含まれているとみなす
+    def get_contained_pairs(self):
+        pairs = []
+        for containing_id, phrase in enumerate(self.phrases):
+            # 同じ単語が何度も出てきても一度だけにする（順番は保つ）
+            contained_ids = dict.fromkeys( phrase_id for (_, phrase_id) in self.search(phrase) if phrase_id != containing_id )
+            pairs += [(contained_id, containing_id) for contained_id in contained_ids]
+        return pairs
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/pinyin_annotator.py 参差不齐
+# python3 src/pinyin_annotator.py --input corpus.txt --output corpus.jsonl --processes 8
+
+# Note
+# フォント（Mengshen）が表示するのと同じ読みを、データとして取り出す（検索のインデックス、TTS のアライメントなど）
+# duoyinzi_pattern_one.txt, duoyinzi_pattern_two.json, duoyinzi_exceptional_pattern.json から GSUB を作り、
+# gsub_simulator.GSUBSimulator でフォントと同じ手順で置き換えてから、グリフを marged-mapping-table.txt の読みにする。
+#
+# 大きなファイルは行をまとめた chunk ごとに、別プロセスで並列に処理する。
+# 出力の順番は入力と同じで、処理中の chunk は processes * 2 個までにするので、ファイルの大きさによらずメモリは増えない。
+# シェイパーは行をまたいで置き換えないので、行の途中で区切らなければ結果は一つのプロセスで処理したときと同じになる。
+#
+# 出力 (--format)
+#   jsonl  : 一行ごとに {"text": "参差不齐", "pinyins": ["cēn", "cī", "bù", "qí"]}  読みの無い文字は null
+#   inline : 参(cēn)差(cī)不(bù)齐(qí)
+
+import os
+import sys
+import time
+import argparse
+import collections
+import concurrent.futures
+import orjson
+import path as p
+import utility
+import gsub_simulator as gs
+
+FORMATS = ["jsonl", "inline"]
+# 一つの chunk にまとめる行数
+CHUNK_LINES = 2000
+
+class PinyinAnnotator():
+    def __init__(self, dir_pattern=p.DIR_OUTPUT, TAMPLATE_MAIN_JSON=os.path.join(p.DIR_TEMP, "template_main.json")):
+        self.simulator = gs.make_simulator(TAMPLATE_MAIN_JSON,
+                                           os.path.join(dir_pattern, "duoyinzi_pattern_one.txt"),
+                                           os.path.join(dir_pattern, "duoyinzi_pattern_two.json"),
+                                           os.path.join(dir_pattern, "duoyinzi_exceptional_pattern.json"))
+        pinyin_table = utility.get_pinyin_mapping_table()
+        # 文字 -> グリフ名, グリフ名 -> 読み
+        self.glyf_names = {}
+        self.pinyins = {}
+        for str_unicode, glyf_name in self.simulator.cmap_table.items():
+            hanzi = chr(int(str_unicode))
+            self.glyf_names[hanzi] = glyf_name
+            if not (hanzi in pinyin_table):
+                continue
+            pinyins = pinyin_table[hanzi]
+            self.pinyins[glyf_name] = pinyins[0]
+            # ss01 は標準の読み、ss02 から異読（ss00 はピンインの無いグリフ）
+            for i, pinyin in enumerate(pinyins):
+                self.pinyins["{}.ss{:02}".format(glyf_name, i + 1)] = pinyin
+
+    # 文字ごとの読みを返す。読みの無い文字は None
+    def annotate(self, text):
+        shaped_glyf_names = self.simulator.apply( [self.glyf_names.get(hanzi) for hanzi in text] )
+        return [self.pinyins.get(glyf_name) for glyf_name in shaped_glyf_names]
+
+def format_line(text, pinyins, output_format):
+    if output_format == "jsonl":
+        return orjson.dumps({"text": text, "pinyins": pinyins}).decode('utf-8')
+    return "".join( hanzi if pinyin == None else "{}({})".format(hanzi, pinyin) for hanzi, pinyin in zip(text, pinyins) )
+
+def annotate_lines(annotator, lines, output_format):
+    formatted_lines = []
+    for line in lines:
+        text = line.rstrip('\r\n')
+        formatted_lines.append( format_line(text, annotator.annotate(text), output_format) )
+    return formatted_lines
+
+# 別プロセスでは、最初に一度だけ PinyinAnnotator を作る
+worker_annotator = None
+
+def init_worker(dir_output, dir_pattern, TAMPLATE_MAIN_JSON):
+    global worker_annotator
+    p.DIR_OUTPUT = dir_output
+    worker_annotator = PinyinAnnotator(dir_pattern, TAMPLATE_MAIN_JSON)
+
+def annotate_chunk(lines, output_format):
+    return annotate_lines(worker_annotator, lines, output_format)
+
+def iter_chunks(read_file, chunk_lines):
+    chunk = []
+    for line in read_file:
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+# read_file の各行の読みを write_file に書き出して、処理した文字数を返す
+def annotate_file(read_file, write_file, dir_pattern=p.DIR_OUTPUT, TAMPLATE_MAIN_JSON=os.path.join(p.DIR_TEMP, "template_main.json"),
+                  output_format="jsonl", processes=1, chunk_lines=CHUNK_LINES):
+    char_num = 0
+    def write_chunk(lines, formatted_lines):
+        nonlocal char_num
+        char_num += sum( len(line.rstrip('\r\n')) for line in lines )
+        for formatted_line in formatted_lines:
+            write_file.write(formatted_line + "\n")
+
+    if processes <= 1:
+        annotator = PinyinAnnotator(dir_pattern, TAMPLATE_MAIN_JSON)
+        for lines in iter_chunks(read_file, chunk_lines):
+            write_chunk(lines, annotate_lines(annotator, lines, output_format))
+        return char_num
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                                initargs=(p.DIR_OUTPUT, dir_pattern, TAMPLATE_MAIN_JSON)) as executor:
+        # 入力の順に書き出す
+        pending = collections.deque()
+        for lines in iter_chunks(read_file, chunk_lines):
+            pending.append( (lines, executor.submit(annotate_chunk, lines, output_format)) )
+            if len(pending) >= processes * 2:
+                (done_lines, future) = pending.popleft()
+                write_chunk(done_lines, future.result())
+        while len(pending) > 0:
+            (done_lines, future) = pending.popleft()
+            write_chunk(done_lines, future.result())
+    return char_num
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Annotate text with the pinyin that the font displays")
+    parser.add_argument("texts", nargs="*", help="読みを付ける文字列")
+    parser.add_argument("--input", help="読みを付けるテキストファイル")
+    parser.add_argument("--output", help="出力先（指定しないときは標準出力）")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="--input を処理するプロセスの数")
+    parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES, help="一つのプロセスにまとめて渡す行数")
+    parser.add_argument("--dir", default=p.DIR_OUTPUT, help="duoyinzi_pattern_*, marged-mapping-table.txt のあるディレクトリ")
+    parser.add_argument("--template", default=os.path.join(p.DIR_TEMP, "template_main.json"), help="cmap を取るテンプレート")
+    args = parser.parse_args()
+    p.DIR_OUTPUT = args.dir
+
+    write_file = open(args.output, mode='w', encoding='utf-8') if args.output != None else sys.stdout
+    try:
+        if len(args.texts) > 0:
+            annotator = PinyinAnnotator(args.dir, args.template)
+            for formatted_line in annotate_lines(annotator, args.texts, args.format):
+                write_file.write(formatted_line + "\n")
+        if args.input != None:
+            start = time.perf_counter()
+            with open(args.input, mode='r', encoding='utf-8') as read_file:
+                char_num = annotate_file(read_file, write_file, args.dir, args.template, args.format, args.processes, args.chunk_lines)
+            elapsed = time.perf_counter() - start
+            # 標準出力は結果に使うので、速度は標準エラー出力に出す
+            print("{} chars in {:.2f} s ({:.0f} chars/sec, {} processes)".format(char_num, elapsed, char_num / elapsed if elapsed > 0 else 0, args.processes), file=sys.stderr)
+    finally:
+        if write_file is not sys.stdout:
+            write_file.close()
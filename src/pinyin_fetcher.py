@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# 百度汉语, 汉典 からピンインを取得する
+# 一つの Session で接続を使い回し、asyncio で同時にいくつかのリクエストを送る（同時に送る数は max_concurrency まで）。
+# 取得したページは、ピンインを取り出せたものだけを tmp/cache/web/ に保存し、次からはネットワークを使わずにそれを使う。
+# （200 で返ってきたエラーページなどを保存すると、replay でずっとそれを使うことになる）
+#
+# mode
+#   online  : キャッシュが無いものだけ取得する
+#   refresh : キャッシュを使わずにすべて取得し直す
+#   replay  : ネットワークを使わない。stand-in のディレクトリかキャッシュにあるものだけを使い、無いものは None にする
+#
+# tmp/cache/web/{source}/{sha256(url)}.html
+# {dir_stand_in}/{source}/{query}.html  (replay で使う、手で用意したページ)
+
+import os
+import asyncio
+import hashlib
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+import path as p
+
+DIR_WEB_CACHE = os.path.join(p.DIR_CACHE, "web")
+MODES = ["online", "refresh", "replay"]
+
+BAIDU_URL  = "https://hanyu.baidu.com/s?wd={}&from=zici"
+ZDIC_URL   = "https://www.zdic.net/hans/{}"
+
+def parse_baidu(content):
+    try:
+        soup = BeautifulSoup(content, "html.parser")
+        elem = soup.find("div", id="pinyin")
+        raw_text = elem.find("b")
+        # [ chóng xiāo ] こんな感じの文字列
+        text = raw_text.get_text()
+        text = text.replace("[ ", "")
+        text = text.replace(" ]", "")
+        pinyins = text.split(" ")
+        return pinyins
+    except:
+        # print("not found pinyin")
+        return None
+
+def parse_zdic(content):
+    try:
+        soup = BeautifulSoup(content, "html.parser")
+        elem = soup.find_all(class_="dicpy")
+        text = elem[0].get_text()
+        pinyins = text.split(" ")
+        return pinyins
+    except:
+        # print("not found pinyin")
+        return None
+
+# source : (URL, ページからピンインを取り出す関数)
+SOURCES = {
+    "baidu" : (BAIDU_URL, parse_baidu),
+    "zdic"  : (ZDIC_URL, parse_zdic)
+}
+
+class PinyinFetcher():
+    def __init__(self, mode="online", dir_cache=DIR_WEB_CACHE, dir_stand_in=None, max_concurrency=8, timeout=10):
+        if not (mode in MODES):
+            raise Exception("mode は {} のどれかです: {}".format(MODES, mode))
+        self.mode            = mode
+        self.dir_cache       = dir_cache
+        self.dir_stand_in    = dir_stand_in
+        self.max_concurrency = max_concurrency
+        self.timeout         = timeout
+        self.session = None
+        # 取得できなかった数など
+        self.stats = {"cache": 0, "stand_in": 0, "network": 0, "missing": 0, "error": 0}
+
+    # Session はスレッドで作ると重複するので、リクエストを送る前にイベントループの側で一度だけ作る
+    def open_session(self):
+        if self.session == None:
+            self.session = requests.Session()
+            # 同時に送るリクエストの数だけ接続を残しておく
+            adapter = HTTPAdapter(pool_connections=len(SOURCES), pool_maxsize=self.max_concurrency)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    def close(self):
+        if self.session != None:
+            self.session.close()
+            self.session = None
+
+    def get_cache_path(self, source, url):
+        return os.path.join(self.dir_cache, source, "{}.html".format(hashlib.sha256(url.encode('utf-8')).hexdigest()))
+
+    def get_stand_in_path(self, source, query):
+        return os.path.join(self.dir_stand_in, source, "{}.html".format(query))
+
+    def read_local(self, source, query, url):
+        if self.mode == "replay" and self.dir_stand_in != None:
+            stand_in_path = self.get_stand_in_path(source, query)
+            if os.path.exists(stand_in_path):
+                self.stats["stand_in"] += 1
+                with open(stand_in_path, "rb") as read_file:
+                    return read_file.read()
+        if self.mode != "refresh":
+            cache_path = self.get_cache_path(source, url)
+            if os.path.exists(cache_path):
+                self.stats["cache"] += 1
+                with open(cache_path, "rb") as read_file:
+                    return read_file.read()
+        return None
+
+    def write_cache(self, source, url, content):
+        # 途中で止まっても壊れたファイルが残らないように、一時ファイルに書いてから置き換える
+        cache_path = self.get_cache_path(source, url)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(tmp_path, "wb") as write_file:
+            write_file.write(content)
+        os.replace(tmp_path, cache_path)
+
+    # スレッドで実行する。self.stats はイベントループの側で数える
+    # ページを返す。取得できなければ None
+    def download(self, url):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        return response.content
+
+    async def fetch_async(self, source, query, semaphore):
+        (url_format, parse) = SOURCES[source]
+        url = url_format.format(query)
+        content = self.read_local(source, query, url)
+        if content != None:
+            pinyins = parse(content)
+            # 前の版で保存した、ピンインを取り出せないページは取得し直す
+            if pinyins != None or self.mode == "replay":
+                return pinyins
+        if self.mode == "replay":
+            self.stats["missing"] += 1
+            return None
+        async with semaphore:
+            content = await asyncio.to_thread(self.download, url)
+        if content == None:
+            self.stats["error"] += 1
+            return None
+        self.stats["network"] += 1
+        pinyins = parse(content)
+        if pinyins != None:
+            self.write_cache(source, url, content)
+        return pinyins
+
+    async def fetch_all_async(self, source, queries):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.mode != "replay":
+            self.open_session()
+        # 重複は一度だけ取得する
+        unique_queries = list(dict.fromkeys(queries))
+        results = await asyncio.gather( *[self.fetch_async(source, query, semaphore) for query in unique_queries] )
+        return dict(zip(unique_queries, results))
+
+    # {query: pinyins} を返す。取得できなかったものは None
+    def fetch_all(self, source, queries):
+        return asyncio.run( self.fetch_all_async(source, queries) )
+
+    def fetch(self, source, query):
+        return self.fetch_all(source, [query])[query]
@@ -20,8 +20,6 @@ class PinyinGlyph():
 
     # マージ先のフォントのメインjson（フォントサイズを取得するため）, ピンイン表示に使うためのglyfのjson, ピンインのグリフを追加したjson(出力ファイル)
     def __init__(self, TAMPLATE_MAIN_JSON, ALPHABET_FOR_PINYIN_JSON, FONT_TYPE):
-        self.PINYIN_MAPPING_TABLE = pg.get_pinyin_table_with_mapping_table()
-
         with open(TAMPLATE_MAIN_JSON, "rb") as read_file:
             self.font_main = orjson.loads(read_file.read())
             self.cmap_table = self.font_main["cmap"]
@@ -50,12 +48,9 @@ class PinyinGlyph():
         advanceHeight = self.font_main["glyf"][cid]["advanceHeight"] if "advanceHeight" in self.font_main["glyf"][cid] else advanceWidth
         return (advanceWidth, advanceHeight)
 
-    # PINYIN_MAPPING_TABLE から全発音を取り出して返す
+    # 辞書から全発音を取り出して返す（サブセットのときは使う発音だけ）
     def __get_pronunciations(self):
-        set_pronunciations = set()
-        for _, pinyins in self.PINYIN_MAPPING_TABLE.items():
-            set_pronunciations = set_pronunciations | set(pinyins)
-        pronunciations = list(set_pronunciations)
+        pronunciations = list(pg.mapping_table_registry.get_pronunciations())
         pronunciations.sort()
         return pronunciations
 
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# ビルドのステージごとに、経過時間・CPU 時間・メモリ使用量のピーク（tracemalloc）を記録する
+# enable() を呼ぶまでは stage() は何もしないので、普段のビルドには影響しない。
+# tracemalloc を有効にすると処理自体が遅くなるので、時間は他の計測結果と比べるときの目安として使う。
+#
+# e.g.:
+#   with profiler.stage("add_glyf"):
+#       font.add_glyf()
+#
+# ステージは入れ子にできる。記録する名前は "glyf/add_glyf" のように親のステージ名を含める。
+
+import time
+import datetime
+import tracemalloc
+import contextlib
+import orjson
+
+enabled = False
+records = []
+# 実行中のステージ
+stack = []
+
+def enable():
+    global enabled
+    enabled = True
+    records.clear()
+    stack.clear()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    global enabled
+    enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+# 入れ子になったステージのピークが外側のステージにも反映されるように、
+# ピークをリセットする前に、それまでのピークを実行中のステージに渡しておく
+def update_peak():
+    (_, peak) = tracemalloc.get_traced_memory()
+    for frame in stack:
+        frame["peak_memory"] = max(frame["peak_memory"], peak)
+    tracemalloc.reset_peak()
+
+@contextlib.contextmanager
+def stage(name):
+    if not enabled:
+        yield
+        return
+
+    update_peak()
+    # 開始した順に並ぶように、先に追加しておく
+    frame = {
+        "name"        : "{}/{}".format(stack[-1]["name"], name) if len(stack) > 0 else name,
+        "wall_time"   : 0,
+        "cpu_time"    : 0,
+        "peak_memory" : 0
+    }
+    records.append(frame)
+    stack.append(frame)
+    start_wall_time = time.perf_counter()
+    start_cpu_time  = time.process_time()
+    try:
+        yield
+    finally:
+        frame["wall_time"] = time.perf_counter() - start_wall_time
+        frame["cpu_time"]  = time.process_time() - start_cpu_time
+        update_peak()
+        stack.pop()
+
+def get_report(info={}):
+    report = dict(info)
+    report["created"] = datetime.datetime.now().isoformat(timespec="seconds")
+    report["stages"]  = list(records)
+    return report
+
+def save_report(REPORT_JSON, info={}):
+    with open(REPORT_JSON, "wb") as write_file:
+        write_file.write(orjson.dumps(get_report(info), option=orjson.OPT_INDENT_2))
+    print("profile: {}".format(REPORT_JSON))
@@ -8,9 +8,10 @@ import re
 import argparse
 import subprocess
 import json
+import orjson
 import utility
 import path as p
-import getSystem as gs
+import profiler
 
 # できた
 # cat alphabet4pinyin.json | jq '.glyf | with_entries(select(.key|match("^a$|^b$")))' > out.json
@@ -50,15 +51,8 @@ def convert_otf2json(source_font_name, output_json):
 
 # cmap の大きさなら、全部取得しても 65536 程度だから、フィルターしなくてもいいな
 def get_cmap_table(source_font_json):
-    if gs.SYSTEM_NAME == gs.W:
-        cmd = 'type {} | jq ".cmap" '.format(source_font_json)
-    else:
-        cmd = 'cat {} | jq ".cmap" '.format(source_font_json)
-    try:
-        cmap_table = json.loads( process_shell(cmd) )
-    except Exception as e:
-        print("line 55")
-        print(e)
+    with open(source_font_json, "rb") as read_file:
+        cmap_table = orjson.loads(read_file.read())["cmap"]
     return cmap_table
 
 def expand_pattern_list2match_pattern(ALPHABET):
@@ -69,8 +63,8 @@ def expand_pattern_list2match_pattern(ALPHABET):
     return match_pattern  # 使用原版的python
 
 
-def get_reversed_cmap_table():
-    output_json = os.path.join(p.DIR_TEMP, OUTPUT_JSON)
+def get_reversed_cmap_table(dir_temp=p.DIR_TEMP):
+    output_json = os.path.join(dir_temp, OUTPUT_JSON)
     cmap_table = get_cmap_table( output_json )
 
     reversed_cmap_table = {}
@@ -80,11 +74,11 @@ def get_reversed_cmap_table():
 
     return reversed_cmap_table
 
-def rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json):
+def rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json, dir_temp=p.DIR_TEMP):
     with open(alphabet_glyf4pinyin_json, mode='r', encoding='utf-8') as read_file:
         glyf_json = json.load(read_file) 
     
-    reversed_cmap_table = get_reversed_cmap_table()
+    reversed_cmap_table = get_reversed_cmap_table(dir_temp)
 
     new_glyf_json = {}
     for cid, glyf_data in glyf_json.items():
@@ -116,21 +110,23 @@ def filter_glyf_by_pattern(input_json_path, output_json_path, match_pattern):
         json.dump(filtered_data, f, ensure_ascii=False, indent=4)
 
 
-def make_alphabet_glyf_json(source_font_name):
-    output_json = os.path.join(p.DIR_TEMP, OUTPUT_JSON)
-    convert_otf2json( source_font_name, output_json )
+def make_alphabet_glyf_json(source_font_name, dir_temp=p.DIR_TEMP):
+    output_json = os.path.join(dir_temp, OUTPUT_JSON)
+    with profiler.stage("dump"):
+        convert_otf2json( source_font_name, output_json )
     cmap_table = get_cmap_table( output_json )
     cid_table_of_alphabet  = [cmap_table[str(ucode)] for ucode in UNICODE_ALPHABET]
     match_pattern = expand_pattern_list2match_pattern( cid_table_of_alphabet )
     
-    alphabet_glyf4pinyin_json = os.path.join(p.DIR_TEMP, ALPHABET_FOR_PINYIN_JSON)
+    alphabet_glyf4pinyin_json = os.path.join(dir_temp, ALPHABET_FOR_PINYIN_JSON)
     # match_pattern = ' "^a$|^b$" '
     # cmd = 'cat {} | jq ".glyf | with_entries(select(.key|match({})))" > {}'.format(output_json, match_pattern, alphabet_glyf4pinyin_json)
     try:
         # print(cmd)
         # process_shell(cmd)
-        filter_glyf_by_pattern(output_json, alphabet_glyf4pinyin_json, match_pattern)
-        rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json)
+        with profiler.stage("split"):
+            filter_glyf_by_pattern(output_json, alphabet_glyf4pinyin_json, match_pattern)
+            rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json, dir_temp)
     except Exception as e:
         print("line 130")
         print(e)
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/rule_analyzer.py
+# python3 src/rule_analyzer.py --json tmp/rule_conflicts.json
+
+# Note
+# lookup_rclt_0 (pattern one), lookup_rclt_1 (pattern two), lookup_rclt_2 (exception pattern) は別々に作るので、
+# あるルールが他のルールを邪魔していても、文字を表示するまで分からない。
+# ここでは、すべてのルールの match を coverage（位置ごとのグリフの集合）の列として一つのトライ（phrase_automaton）に入れて、
+# 各ルールを一度なぞるだけで、その中に現れうる他のルールをすべて見つける。
+# グリフの組み合わせ（coverage の直積）は、他のルールが中に現れうるルールだけ展開する。
+# そのため、展開する列の数は、他のルールと重なるルールの直積の大きさの和（と、問題として報告する列の数）までになる。
+#
+# 問題の種類
+#   shadowed      : 同じ lookup の前の subtable が、同じ位置で必ず先に一致する（この subtable は一度も使われない）
+#   unreachable   : 前の lookup がこのルールの match の中のグリフを置き換えるので一致しない（置き換えた結果はこのルールと同じ）
+#                   apply の lookup が、どのグリフも置き換えないルールもこれにする
+#   contradictory : 前の lookup がこのルールの match の中のグリフを、このルールとは違う読みに置き換える
+# 前の lookup によるもの（unreachable, contradictory）は、gsub_simulator でその列を実際に置き換えて、結果がこのルールの通りでないものだけを報告する。
+
+import os
+import argparse
+import itertools
+import collections
+import orjson
+import path as p
+import gsub_simulator as gs
+import phrase_automaton
+
+SHADOWED      = "shadowed"
+UNREACHABLE   = "unreachable"
+CONTRADICTORY = "contradictory"
+ISSUE_TYPES = [SHADOWED, UNREACHABLE, CONTRADICTORY]
+
+# 一つの chaining subtable
+Rule = collections.namedtuple("Rule", ["lookup_name", "index", "match", "applies", "input_begins", "input_ends"])
+
+class RuleAnalyzer():
+    def __init__(self, GSUB, cmap_table):
+        self.simulator = gs.GSUBSimulator(GSUB, cmap_table)
+        self.hanzes = { glyf_name : chr(int(str_unicode)) for str_unicode, glyf_name in cmap_table.items() }
+        # rclt の chaining lookup を lookupOrder の順に
+        self.lookup_ranks = {}
+        self.rules = []
+        for lookup_name in self.simulator.lookup_names:
+            if not (lookup_name in self.simulator.chainings):
+                continue
+            self.lookup_ranks[lookup_name] = len(self.lookup_ranks)
+            for index, subtable in enumerate(GSUB["lookups"][lookup_name]["subtables"]):
+                self.rules.append( Rule(lookup_name, index, [tuple(glyf_names) for glyf_names in subtable["match"]],
+                                        [(apply["at"], apply["lookup"]) for apply in subtable["apply"]],
+                                        subtable["inputBegins"], subtable["inputEnds"]) )
+        self.match_sets = [ [frozenset(glyf_names) for glyf_names in rule.match] for rule in self.rules ]
+        # 同じ coverage には同じ番号を付けて、ルールを coverage の番号の列としてトライに入れる
+        coverage_ids = {}
+        # グリフ名: そのグリフを含む coverage の番号
+        self.coverages_of_glyf = collections.defaultdict(set)
+        coverage_sequences = []
+        for glyf_name_sets in self.match_sets:
+            for glyf_name_set in glyf_name_sets:
+                if not (glyf_name_set in coverage_ids):
+                    coverage_ids[glyf_name_set] = len(coverage_ids)
+                    for glyf_name in glyf_name_set:
+                        self.coverages_of_glyf[glyf_name].add(coverage_ids[glyf_name_set])
+            coverage_sequences.append( tuple(coverage_ids[glyf_name_set] for glyf_name_set in glyf_name_sets) )
+        self.automaton = phrase_automaton.PhraseAutomaton(coverage_sequences)
+
+    def get_text(self, sequence):
+        return "".join( self.hanzes.get(glyf_name, "[{}]".format(glyf_name)) for glyf_name in sequence )
+
+    # rule を sequence にだけ適用した結果
+    def apply_rule(self, rule, sequence):
+        glyf_names = list(sequence)
+        for (at, lookup_name) in rule.applies:
+            self.simulator.apply_single(lookup_name, glyf_names, at)
+        return glyf_names
+
+    def make_issue(self, issue_type, rule, sequence, other_rule=None, other_sequence=None):
+        issue = {"type": issue_type, "lookup": rule.lookup_name, "subtable": rule.index, "text": self.get_text(sequence)}
+        if other_rule != None:
+            issue["by"] = {"lookup": other_rule.lookup_name, "subtable": other_rule.index, "text": self.get_text(other_sequence)}
+        return issue
+
+    # rule の中に現れうる（各位置の coverage が重なる）、邪魔をするかもしれないルールを (始まりの位置, ルールの番号) で返す
+    # 同じ位置で入力が始まる、同じ lookup の前の subtable か、前の lookup のルールだけ。並びは、終わりの位置、長いもの、ルールの番号の順
+    def get_candidates(self, rule_id):
+        rule = self.rules[rule_id]
+        coverage_id_sets = [ set().union(*[self.coverages_of_glyf[glyf_name] for glyf_name in glyf_name_set]) for glyf_name_set in self.match_sets[rule_id] ]
+        candidates = []
+        for (end, other_rule_id) in self.automaton.search_sets(coverage_id_sets):
+            other_rule = self.rules[other_rule_id]
+            if other_rule_id == rule_id:
+                continue
+            start = end - len(other_rule.match) + 1
+            if other_rule.lookup_name == rule.lookup_name:
+                if other_rule.index > rule.index or start + other_rule.input_begins != rule.input_begins:
+                    continue
+            elif self.lookup_ranks[other_rule.lookup_name] > self.lookup_ranks[rule.lookup_name]:
+                continue
+            candidates.append( (end, -len(other_rule.match), other_rule_id) )
+        return [ (end - len(self.rules[other_rule_id].match) + 1, other_rule_id) for (end, _, other_rule_id) in sorted(candidates) ]
+
+    # 調べるグリフ名の列
+    # 邪魔をするかもしれないルールが無ければ、apply がどれも置き換えない列（unreachable）だけ
+    def get_sequences(self, rule_id, candidates):
+        rule = self.rules[rule_id]
+        if len(candidates) > 0:
+            return itertools.product(*rule.match)
+        if len(rule.applies) == 0:
+            return []
+        positions = set(at for (at, _) in rule.applies)
+        glyf_names_list = [ [glyf_name for glyf_name in glyf_names if not (position in positions) or self.is_unchanged(rule, position, glyf_name)]
+                            for position, glyf_names in enumerate(rule.match) ]
+        return itertools.product(*glyf_names_list)
+
+    # rule の apply で、position のグリフが置き換わらないか
+    def is_unchanged(self, rule, position, glyf_name):
+        glyf_names = [glyf_name]
+        for (at, lookup_name) in rule.applies:
+            if at == position:
+                self.simulator.apply_single(lookup_name, glyf_names, 0)
+        return glyf_names[0] == glyf_name
+
+    def analyze(self):
+        issues = []
+        for rule_id in range(len(self.rules)):
+            candidates = self.get_candidates(rule_id)
+            for sequence in self.get_sequences(rule_id, candidates):
+                issue = self.analyze_sequence(rule_id, sequence, candidates)
+                if issue != None:
+                    issues.append(issue)
+        return issues
+
+    # rule の match の一つの列を調べて、問題があれば返す
+    def analyze_sequence(self, rule_id, sequence, candidates):
+        rule = self.rules[rule_id]
+        expected = self.apply_rule(rule, sequence)
+        if len(rule.applies) > 0 and expected == list(sequence):
+            return self.make_issue(UNREACHABLE, rule, sequence)
+        shadowed_by = None
+        blockers = []
+        for (start, other_rule_id) in candidates:
+            other_rule = self.rules[other_rule_id]
+            if not all( sequence[start + k] in glyf_name_set for k, glyf_name_set in enumerate(self.match_sets[other_rule_id]) ):
+                continue
+            other_sequence = sequence[start:start + len(other_rule.match)]
+            if other_rule.lookup_name == rule.lookup_name:
+                # 同じ位置で入力が始まる、前の subtable（get_candidates で絞ってある）
+                if shadowed_by == None or other_rule.index < shadowed_by[0].index:
+                    shadowed_by = (other_rule, other_sequence)
+            else:
+                for (at, lookup_name) in other_rule.applies:
+                    position = start + at
+                    substitute = self.simulator.singles[lookup_name].get(sequence[position])
+                    # 置き換えないか、置き換えた後もこのルールに一致するなら邪魔しない
+                    if substitute == None or substitute in self.match_sets[rule_id][position]:
+                        continue
+                    blockers.append( (other_rule, other_sequence, position, substitute) )
+        if shadowed_by != None:
+            return self.make_issue(SHADOWED, rule, sequence, *shadowed_by)
+        if len(blockers) == 0 or len(rule.applies) == 0:
+            return None
+        # 実際に置き換えて、このルールの通りになるなら問題ない
+        shaped = self.simulator.apply(sequence)
+        if shaped == expected:
+            return None
+        (other_rule, other_sequence, position, substitute) = blockers[0]
+        issue_type = UNREACHABLE if all( expected[position] == substitute for (_, _, position, substitute) in blockers ) else CONTRADICTORY
+        return self.make_issue(issue_type, rule, sequence, other_rule, other_sequence)
+
+def get_summary(issues):
+    counter = collections.Counter( (issue["lookup"], issue["type"]) for issue in issues )
+    return { "{}.{}".format(lookup_name, issue_type) : count for (lookup_name, issue_type), count in sorted(counter.items()) }
+
+def save_report(issues, REPORT_JSON):
+    with open(REPORT_JSON, "wb") as write_file:
+        write_file.write( orjson.dumps({"summary": get_summary(issues), "issues": issues}, option=orjson.OPT_INDENT_2) )
+
+def print_issues(issues, max_num=10):
+    if len(issues) == 0:
+        print("rclt rules: no conflicts")
+        return
+    print("rclt rules: {}".format(", ".join( "{} {}".format(key, count) for key, count in get_summary(issues).items() )))
+    for issue in issues[:max_num]:
+        by = " <- {}[{}] {}".format(issue["by"]["lookup"], issue["by"]["subtable"], issue["by"]["text"]) if "by" in issue else ""
+        print("  {} {}[{}] {}{}".format(issue["type"], issue["lookup"], issue["subtable"], issue["text"], by))
+    if len(issues) > max_num:
+        print("  ... ({} more)".format(len(issues) - max_num))
+
+# GSUB を調べて、問題のリストを返す
+def analyze(GSUB, cmap_table):
+    return RuleAnalyzer(GSUB, cmap_table).analyze()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find shadowed, unreachable and contradictory rclt rules")
+    parser.add_argument("--json", help="問題をすべて書き出す json")
+    parser.add_argument("--max", type=int, default=50, help="表示する問題の数")
+    parser.add_argument("--template", default=os.path.join(p.DIR_TEMP, "template_main.json"), help="cmap を取るテンプレート")
+    args = parser.parse_args()
+
+    (GSUB, cmap_table) = gs.make_GSUB(args.template,
+                                      os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt"),
+                                      os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json"),
+                                      os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json"))
+    issues = analyze(GSUB, cmap_table)
+    print_issues(issues, args.max)
+    if args.json != None:
+        save_report(issues, args.json)
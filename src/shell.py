@@ -2,6 +2,7 @@
 #!/usr/bin/env python
 import locale
 import subprocess
+import threading
 
 def process(cmd=""):
     # print('start')
@@ -9,4 +10,33 @@ def process(cmd=""):
     # print(f'returncode: {completed_process.returncode},stdout: {completed_process.stdout},stderr:{completed_process.stderr}')
     if b'' != completed_process.stderr:
         raise Exception(completed_process.stderr.decode(locale.getpreferredencoding()))
-    return completed_process.stdout.decode(locale.getpreferredencoding())
\ No newline at end of file
+    return completed_process.stdout.decode(locale.getpreferredencoding())
+
+# chunks（bytes のイテレータ）を標準入力に流し込みながら cmd を実行する
+# 入力を一時ファイルに書き出さずに済み、書き込みと cmd の読み込みも並行して進む
+def process_with_input(cmd="", chunks=[]):
+    popen = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+    # stdout/stderr のパイプが詰まると、書き込み側と互いに待ち合ってしまうので、別スレッドで読み続ける
+    outputs = {}
+    def read(name, stream):
+        outputs[name] = stream.read()
+    readers = [threading.Thread(target=read, args=(name, stream)) for name, stream in [("stdout", popen.stdout), ("stderr", popen.stderr)]]
+    for reader in readers:
+        reader.start()
+    try:
+        for chunk in chunks:
+            popen.stdin.write(chunk)
+    except BrokenPipeError:
+        # cmd が途中で終了したときは、下の stderr で原因を返す
+        pass
+    finally:
+        try:
+            popen.stdin.close()
+        except BrokenPipeError:
+            pass
+    for reader in readers:
+        reader.join()
+    returncode = popen.wait()
+    if b'' != outputs["stderr"] or returncode != 0:
+        raise Exception(outputs["stderr"].decode(locale.getpreferredencoding()))
+    return outputs["stdout"].decode(locale.getpreferredencoding())
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# サブセットのビルド
+# 指定した文字（文字列またはテキストファイルのコーパス）だけを含むフォントを作る。
+#   - 辞書（pinyin_getter.mapping_table_registry）を指定した漢字だけにする（追加するグリフも、発音のグリフも使う分だけになる）
+#   - cmap, cmap_uvs を指定した文字だけにして、そこから参照されないグリフを削除する
+#   - GSUB は、文脈の漢字がすべてフォントに含まれるパターンだけを残す
+# 「一」はグリフの大きさの基準に使う（Font.get_advance_size_of_hanzi, Font.get_advance_size_of_pinyin_glyf）ので、常に含める。
+
+import utility
+import pinyin_getter as pg
+
+# 常に含める文字
+REQUIRED_CHARS = "一"
+# コーパスの改行は文字として扱わない
+IGNORED_CHARS = "\r\n"
+# グリフ名の参照を調べないテーブル（サブセットで作り直すか、ビルドで置き換えるもの）
+UNCHECKED_TABLES = ["glyf", "glyph_order", "cmap", "cmap_uvs", "GSUB"]
+# 他のテーブルから参照されているグリフは、削除せずに輪郭を消すだけにする
+BLANK_GLYF_KEYS = ["advanceWidth", "advanceHeight", "verticalOrigin"]
+
+# サブセットの文字の set. None のときはサブセットにしない
+chars = None
+
+# 文字列とコーパスから、サブセットの文字を重複なしで並べた文字列を返す
+def load_chars(subset_chars=None, SUBSET_FILE=None):
+    text = ""
+    if subset_chars != None:
+        text += subset_chars
+    if SUBSET_FILE != None:
+        with open(SUBSET_FILE, mode='r', encoding='utf-8') as read_file:
+            text += read_file.read()
+    return "".join( sorted(set(text) - set(IGNORED_CHARS)) )
+
+def enable(subset_chars):
+    global chars
+    chars = set(subset_chars) | set(REQUIRED_CHARS)
+    pg.mapping_table_registry.set_hanzi_filter(chars)
+    print("subset: {} 文字 (ピンインのある漢字: {})".format(len(chars), len(utility.get_pinyin_mapping_table())))
+
+def is_enabled():
+    return chars != None
+
+# text のすべての文字がフォント（サブセット後の cmap）に含まれるか
+def is_covered(text):
+    return all( str(ord(hanzi)) in utility.cmap_table for hanzi in text )
+
+# 異読のグリフを持つ（置き換えの対象にできる）漢字か
+def is_replaceable(hanzi):
+    return hanzi in utility.get_pinyin_mapping_table() and is_covered(hanzi)
+
+def collect_strings(table, strings):
+    if isinstance(table, dict):
+        for key, value in table.items():
+            strings.add(key)
+            collect_strings(value, strings)
+    elif isinstance(table, list):
+        for value in table:
+            collect_strings(value, strings)
+    elif isinstance(table, str):
+        strings.add(table)
+
+# cmap, cmap_uvs から辿れるグリフ（references を含む）を返す
+def get_used_glyf_names(marged_font):
+    glyf_table = marged_font["glyf"]
+    used_glyf_names = set([".notdef"]) | set(marged_font["cmap"].values()) | set(marged_font.get("cmap_uvs", {}).values())
+    stack = list(used_glyf_names)
+    while len(stack) > 0:
+        glyf_name = stack.pop()
+        if not (glyf_name in glyf_table):
+            continue
+        for reference in glyf_table[glyf_name].get("references", []):
+            if not (reference["glyph"] in used_glyf_names):
+                used_glyf_names.add(reference["glyph"])
+                stack.append(reference["glyph"])
+    return used_glyf_names
+
+# Font.build_glyf の後に、サブセットの文字で使わない cmap とグリフを削除する
+def subset_font(marged_font):
+    cmap_table = marged_font["cmap"]
+    # utility.cmap_table と同じものなので、置き換えずに削除する
+    for str_oct_unicode in [str_oct_unicode for str_oct_unicode in cmap_table if not (chr(int(str_oct_unicode)) in chars)]:
+        del cmap_table[str_oct_unicode]
+    if "cmap_uvs" in marged_font:
+        cmap_uvs_table = marged_font["cmap_uvs"]
+        for key in [key for key in cmap_uvs_table if not (key.split(" ")[0] in cmap_table)]:
+            del cmap_uvs_table[key]
+
+    glyf_table = marged_font["glyf"]
+    glyf_num = len(glyf_table)
+    used_glyf_names = get_used_glyf_names(marged_font)
+    refered_names = set()
+    for table_name, table in marged_font.items():
+        if not (table_name in UNCHECKED_TABLES):
+            collect_strings(table, refered_names)
+    for glyf_name in glyf_table.keys():
+        if glyf_name in used_glyf_names:
+            continue
+        if glyf_name in refered_names:
+            glyf_data = glyf_table[glyf_name]
+            glyf_table[glyf_name] = { key : glyf_data[key] for key in BLANK_GLYF_KEYS if key in glyf_data }
+        else:
+            del glyf_table[glyf_name]
+    marged_font["glyph_order"] = [glyf_name for glyf_name in marged_font["glyph_order"] if glyf_name in glyf_table]
+    print("subset: glyf num {} -> {}".format(glyf_num, len(glyf_table)))
+
+# 以下は GSUBTable.load_pattern_table で読み込んだパターン (pattern_ir.PatternIR) を、サブセットで使えるものだけにする
+
+def filter_pattern_one(pattern_one):
+    filtered_pattern_one = []
+    for rule in pattern_one:
+        if not is_replaceable(rule.target):
+            continue
+        left_match  = tuple( hanzi for hanzi in rule.left_match if is_covered(hanzi) )
+        right_match = tuple( hanzi for hanzi in rule.right_match if is_covered(hanzi) )
+        other_match = tuple( (phrase, at) for (phrase, at) in rule.other_match if is_covered(phrase) )
+        if len(left_match) + len(right_match) + len(other_match) == 0:
+            continue
+        filtered_pattern_one.append( rule._replace(left_match=left_match, right_match=right_match, other_match=other_match) )
+    return tuple(filtered_pattern_one)
+
+def filter_lookups(lookups):
+    return { lookup_name : { hanzi : ss_num for hanzi, ss_num in table.items() if is_replaceable(hanzi) }
+             for lookup_name, table in lookups.items() }
+
+def is_applicable(rule):
+    if not is_covered(rule.phrase):
+        return False
+    return all( is_replaceable(rule.phrase[at]) for (at, _) in rule.applies )
+
+def filter_phrase_rules(rules):
+    filtered_rules = []
+    for rule in rules:
+        if not is_applicable(rule):
+            continue
+        # フォントに無い漢字を含む ignore は一致することがないので要らない
+        if rule.ignore != None and not is_covered(rule.ignore[0]):
+            rule = rule._replace(ignore=None)
+        filtered_rules.append(rule)
+    return tuple(filtered_rules)
+
+def filter_pattern_ir(pattern_ir):
+    # slot_num は変えない（lookup_pattern_0{slot} は、空になっても詰めない）
+    return pattern_ir._replace(
+        pattern_one         = filter_pattern_one(pattern_ir.pattern_one),
+        pattern_two_lookups = filter_lookups(pattern_ir.pattern_two_lookups),
+        pattern_two         = filter_phrase_rules(pattern_ir.pattern_two),
+        exception_lookups   = filter_lookups(pattern_ir.exception_lookups),
+        exception_pattern   = filter_phrase_rules(pattern_ir.exception_pattern),
+    )
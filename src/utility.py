@@ -2,6 +2,8 @@
 #!/usr/bin/env python
 
 import os
+import collections
+from types import MappingProxyType
 import orjson
 import pinyin_getter as pg
 import path as p
@@ -36,7 +38,17 @@ SIMPLED_ALPHABET = {
 }
 
 cmap_table = {}
-PINYIN_MAPPING_TABLE = pg.get_pinyin_table_with_mapping_table()
+
+# 漢字ごとに、各テーブルを作るのに使う情報をまとめたもの
+#   str_unicode       : cmap のキー e.g.: "19968"
+#   cid               : グリフ名。cmap に無いときは None
+#   pinyins           : 発音 (標準の読み, 異読, ...)
+#   pronunciation_ids : 簡略化した発音（発音のグリフの名前） e.g.: ("yi1", "yi2", "yi4")
+#   ss_num            : cid.ss00 から始まる、cmap_uvs に登録するグリフの数
+HanziRecord = collections.namedtuple("HanziRecord", ["hanzi", "str_unicode", "cid", "pinyins", "pronunciation_ids", "ss_num"])
+hanzi_records = None
+# hanzi_records を作ったときの (cmap_table, 辞書)。どちらかが別のものになったら作り直す
+hanzi_records_source = None
 
 def get_cmap_table():
     TAMPLATE_MAIN_JSON = os.path.join(p.DIR_TEMP, "template_main.json")
@@ -44,17 +56,58 @@ def get_cmap_table():
         marged_font = orjson.loads(read_file.read())
     cmap_table = marged_font["cmap"]
 
+def set_cmap_table(new_cmap_table):
+    global cmap_table, hanzi_records
+    cmap_table = new_cmap_table
+    hanzi_records = None
+
 # ピンイン表記の簡略化、e.g.: wěi -> we3i
 def simplification_pronunciation(pronunciation):
     return  "".join( [SIMPLED_ALPHABET[c] for c in pronunciation] )
 
+# 辞書は pinyin_getter.mapping_table_registry で共有している（最初に使うときに読み込む）
+def get_pinyin_mapping_table():
+    return pg.mapping_table_registry.get_table()
+
 # ピンインが一つだけの漢字をすべて取得する
 def get_has_single_pinyin_hanzi():
-    return [(hanzi, pinyins) for hanzi, pinyins in PINYIN_MAPPING_TABLE.items() if 1 == len(pinyins)]
+    return pg.mapping_table_registry.get_single_pinyin_hanzi()
 
 # ピンインが2つ以上の漢字をすべて取得する
 def get_has_multiple_pinyin_hanzi():
-    return [(hanzi, pinyins) for hanzi, pinyins in PINYIN_MAPPING_TABLE.items() if 1 < len(pinyins)]
+    return pg.mapping_table_registry.get_multiple_pinyin_hanzi()
+
+# 辞書のすべての漢字の HanziRecord を返す {hanzi: HanziRecord}
+# 一度作ったものは、cmap_table と辞書が変わるまで使い回す
+def get_hanzi_records():
+    global hanzi_records, hanzi_records_source
+    pinyin_table = get_pinyin_mapping_table()
+    if hanzi_records != None and hanzi_records_source[0] is cmap_table and hanzi_records_source[1] is pinyin_table:
+        return hanzi_records["all"]
+    records = {}
+    for hanzi, pinyins in pinyin_table.items():
+        str_unicode = str(ord(hanzi))
+        # ss00 は ピンインのないグリフ なので、ピンインが複数あるときは "ss{:02}".format(len) まで
+        ss_num = 1 if 1 == len(pinyins) else len(pinyins)+1
+        records[hanzi] = HanziRecord(hanzi, str_unicode, cmap_table.get(str_unicode), pinyins,
+                                     tuple(simplification_pronunciation(pinyin) for pinyin in pinyins), ss_num)
+    hanzi_records = {
+        "all"      : MappingProxyType(records),
+        "single"   : tuple(record for record in records.values() if 1 == len(record.pinyins)),
+        "multiple" : tuple(record for record in records.values() if 1 < len(record.pinyins))
+    }
+    hanzi_records_source = (cmap_table, pinyin_table)
+    return hanzi_records["all"]
+
+# ピンインが一つだけの漢字の HanziRecord をすべて取得する
+def get_single_pinyin_hanzi_records():
+    get_hanzi_records()
+    return hanzi_records["single"]
+
+# ピンインが2つ以上の漢字の HanziRecord をすべて取得する
+def get_multiple_pinyin_hanzi_records():
+    get_hanzi_records()
+    return hanzi_records["multiple"]
 
 # 漢字から cid を取得する
 def convert_str_hanzi_2_cid(str_hanzi):
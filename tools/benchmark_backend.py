@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 tools/benchmark_backend.py
+# python3 tools/benchmark_backend.py --style handwritten --repeat 5 --output tmp/benchmark_backend.json
+
+# Note
+# フォントファイルを作るバックエンド（otfcc, fonttools）の速さを比べる
+# 先に python3 src/main.py --style han_serif を実行して、tmp/json/han_serif/ に stage_glyf.json と stage_GSUB.json を作っておくこと。
+# 比べるのは marged_font からフォントファイルを作る部分だけ（json の読み込みは含めない）。
+# 実行ごとに marged_font（GlyfStore）を読み込み直して、どの実行も同じ状態から始める。
+
+import os
+import sys
+import time
+import argparse
+import orjson
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+import path as p
+import config
+import font as ft
+import font_backend
+import glyf_store
+
+DIR_BENCHMARK = os.path.normpath( os.path.join(p.DIR_TEMP, "../benchmark/") )
+
+FONT_TYPES = {
+    "han_serif"   : config.HAN_SERIF_TYPE,
+    "handwritten" : config.HANDWRITTEN_TYPE
+}
+
+def load_marged_font(style):
+    DIR_WORK = os.path.join(p.DIR_TEMP, style)
+    STAGE_GLYF_JSON = os.path.join(DIR_WORK, "stage_glyf.json")
+    STAGE_GSUB_JSON = os.path.join(DIR_WORK, "stage_GSUB.json")
+    STAGE_GLYF_TABLE_JSON = os.path.join(DIR_WORK, "stage_glyf_table.json")
+    if not (os.path.exists(STAGE_GLYF_JSON) and os.path.exists(STAGE_GSUB_JSON)):
+        raise Exception("{} が見つかりません。先に src/main.py --style {} を実行してください".format(DIR_WORK, style))
+    with open(STAGE_GLYF_JSON, "rb") as read_file:
+        marged_font = orjson.loads(read_file.read())
+    marged_font["glyf"] = glyf_store.GlyfStore(STAGE_GLYF_TABLE_JSON)
+    with open(STAGE_GSUB_JSON, "rb") as read_file:
+        marged_font["GSUB"] = orjson.loads(read_file.read())
+    ft.set_copyright(marged_font, FONT_TYPES[style])
+    return marged_font
+
+def run_backend(style, backend_name, stream, repeat):
+    os.makedirs(DIR_BENCHMARK, exist_ok=True)
+    OUTPUT_FONT = os.path.join(DIR_BENCHMARK, "{}{}.ttf".format(backend_name, "-stream" if stream else ""))
+    backend = font_backend.get_backend(backend_name, DIR_BENCHMARK, stream)
+    times = []
+    for _ in range(repeat):
+        # 読み込みは時間に含めない
+        marged_font = load_marged_font(style)
+        try:
+            start = time.perf_counter()
+            backend.compile(marged_font, OUTPUT_FONT)
+            times.append(time.perf_counter() - start)
+        finally:
+            marged_font["glyf"].close()
+    return {
+        "backend" : backend_name,
+        "stream"  : stream,
+        "times"   : times,
+        "min"     : min(times),
+        "mean"    : sum(times) / len(times),
+        "size"    : os.path.getsize(OUTPUT_FONT)
+    }
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Compare font compiler backends")
+    parser.add_argument('-t', '--style', choices=config.STYLES, default='han_serif')
+    parser.add_argument('--repeat', type=int, default=3, help="各バックエンドを実行する回数")
+    parser.add_argument('--output', help="結果を保存する json")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    marged_font = load_marged_font(options.style)
+    print("glyf num : {}".format(len(marged_font["glyf"])))
+    marged_font["glyf"].close()
+
+    results = []
+    for (backend_name, stream) in [("otfcc", False), ("otfcc", True), ("fonttools", False)]:
+        results.append( run_backend(options.style, backend_name, stream, options.repeat) )
+
+    print("{:<16} {:>10} {:>10} {:>12}".format("backend", "min [s]", "mean [s]", "size [byte]"))
+    for result in results:
+        backend_name = result["backend"] + (" --stream" if result["stream"] else "")
+        print("{:<16} {:>10.2f} {:>10.2f} {:>12}".format(backend_name, result["min"], result["mean"], result["size"]))
+
+    if options.output:
+        with open(options.output, "wb") as write_file:
+            write_file.write(orjson.dumps({"style": options.style, "results": results}, option=orjson.OPT_INDENT_2))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 tools/benchmark_chaining.py
+# python3 tools/benchmark_chaining.py --repeat 50 --output tmp/benchmark/chaining.json
+
+# Note
+# rclt の chaining の書き出し方（fonttools_writer.CHAINING_ENCODINGS）ごとに、GSUB の大きさとシェイプの時間を比べる
+#   coverage : subtable ごとの format 3
+#   class    : glyph class を使う format 2
+#   auto     : lookup ごとに一番小さいもの（一部のルールだけを format 2 にしたものも比べる。fontTools のバックエンドの既定）
+# outputs/ の今の辞書から GSUB を作り、cmap と GSUB だけの（グリフが空の）フォントにして比べる。ソースフォントも otfcc も使わない。
+#
+# 測るもの
+#   GSUB      : GSUB テーブルのバイト数
+#   chaining  : そのうち chaining の lookup のバイト数
+#   load      : HarfBuzz でフォントを開いて、最初の文字列をシェイプするまで（GSUB を読む時間）
+#   shape     : phrase_testcase.txt とパターンの単語をすべてシェイプする時間
+# シェイプの時間は uharfbuzz があるときだけ測る。どの書き出し方でもシェイプの結果が同じになることも確かめる。
+
+import io
+import os
+import sys
+import time
+import argparse
+import orjson
+from fontTools.fontBuilder import FontBuilder
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.tables._g_l_y_f import Glyph
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+import path as p
+import fonttools_writer
+import gsub_simulator as gs
+
+try:
+    import uharfbuzz as hb
+except ImportError:
+    hb = None
+
+# GSUB で使うグリフ名をすべて集める
+def get_glyf_names(GSUB, cmap_table):
+    glyf_names = set(cmap_table.values())
+    for lookup in GSUB["lookups"].values():
+        for subtable in lookup["subtables"]:
+            if lookup["type"] == "gsub_single":
+                glyf_names.update(subtable.keys())
+                glyf_names.update(subtable.values())
+            elif lookup["type"] == "gsub_alternate":
+                glyf_names.update(subtable.keys())
+                for alternates in subtable.values():
+                    glyf_names.update(alternates)
+            else:
+                for match_glyf_names in subtable["match"]:
+                    glyf_names.update(match_glyf_names)
+    return glyf_names
+
+# cmap と GSUB だけのフォントを作る
+def build_font(GSUB, cmap_table, chaining_encoding):
+    glyph_order = [".notdef"] + sorted(get_glyf_names(GSUB, cmap_table))
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder(glyph_order)
+    fb.setupCharacterMap({ int(str_unicode) : glyf_name for str_unicode, glyf_name in cmap_table.items() })
+    fb.setupGlyf({ glyf_name : Glyph() for glyf_name in glyph_order })
+    fb.setupHorizontalMetrics({ glyf_name : (1000, 0) for glyf_name in glyph_order })
+    fb.setupHorizontalHeader(ascent=880, descent=-120)
+    fb.setupNameTable({"familyName": "Mengshen Benchmark", "styleName": "Regular"})
+    fb.setupOS2()
+    fb.setupPost()
+    fonttools_writer.setup_GSUB(fb, {"GSUB": GSUB}, chaining_encoding)
+    buffer = io.BytesIO()
+    fb.save(buffer)
+    return buffer.getvalue()
+
+# chaining の lookup の (バイト数, {format: subtable の数})
+def get_chaining_sizes(font_data):
+    font = TTFont(io.BytesIO(font_data))
+    chaining_type = fonttools_writer.LOOKUP_TYPES["gsub_chaining"]
+    size = 0
+    formats = []
+    for ot_lookup in font["GSUB"].table.LookupList.Lookup:
+        # extension の中身を見る
+        subtables = [st.ExtSubTable if ot_lookup.LookupType == 7 else st for st in ot_lookup.SubTable]
+        if len(subtables) == 0 or subtables[0].LookupType != chaining_type:
+            continue
+        size += fonttools_writer.get_compiled_size(chaining_type, subtables, font)
+        formats += [st.Format for st in subtables]
+    return (size, { "format {}".format(chaining_format) : formats.count(chaining_format) for chaining_format in sorted(set(formats)) })
+
+def shape(hb_font, text):
+    buffer = hb.Buffer()
+    buffer.add_str(text)
+    buffer.guess_segment_properties()
+    hb.shape(hb_font, buffer, {"rclt": True})
+    return [info.codepoint for info in buffer.glyph_infos]
+
+def measure_shaping(font_data, texts, repeat):
+    load_times = []
+    shape_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hb_font = hb.Font(hb.Face(hb.Blob(font_data)))
+        shape(hb_font, texts[0])
+        load_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results = [shape(hb_font, text) for text in texts]
+        shape_times.append(time.perf_counter() - start)
+    return (min(load_times), min(shape_times), results)
+
+# シェイプする文字列: phrase_testcase.txt の単語と、パターンの単語
+def get_texts(GSUB, cmap_table):
+    hanzes = { glyf_name : chr(int(str_unicode)) for str_unicode, glyf_name in cmap_table.items() }
+    texts = [phrase for (_, phrase, _) in gs.load_testcases(gs.TESTCASE_TXT)]
+    for lookup in GSUB["lookups"].values():
+        if lookup["type"] != "gsub_chaining":
+            continue
+        for subtable in lookup["subtables"]:
+            texts.append( "".join( hanzes.get(match_glyf_names[0], "") for match_glyf_names in subtable["match"] ) )
+    return texts
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Compare coverage-based and class-based chaining contexts")
+    parser.add_argument('--repeat', type=int, default=20, help="シェイプを繰り返す回数（最も速い時間を使う）")
+    parser.add_argument('--output', help="結果を保存する json")
+    parser.add_argument("--template", default=os.path.join(p.DIR_TEMP, "template_main.json"), help="cmap を取るテンプレート")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    (GSUB, cmap_table) = gs.make_GSUB(options.template,
+                                      os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt"),
+                                      os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json"),
+                                      os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json"))
+    texts = get_texts(GSUB, cmap_table)
+    if hb == None:
+        print("uharfbuzz がないので、シェイプの時間は測りません")
+
+    results = []
+    expected_results = None
+    for chaining_encoding in fonttools_writer.CHAINING_ENCODINGS:
+        font_data = build_font(GSUB, cmap_table, chaining_encoding)
+        (chaining_size, formats) = get_chaining_sizes(font_data)
+        result = {
+            "encoding" : chaining_encoding,
+            "GSUB"     : TTFont(io.BytesIO(font_data)).reader.tables["GSUB"].length,
+            "chaining" : chaining_size,
+            "formats"  : formats,
+        }
+        if hb != None:
+            (result["load"], result["shape"], shaped_results) = measure_shaping(font_data, texts, options.repeat)
+            if expected_results == None:
+                expected_results = shaped_results
+            elif shaped_results != expected_results:
+                raise Exception("{} のシェイプの結果が {} と違います".format(chaining_encoding, results[0]["encoding"]))
+        results.append(result)
+
+    print("texts: {}".format(len(texts)))
+    print("{:<10} {:>12} {:>15} {:>10} {:>11}  {}".format("encoding", "GSUB [byte]", "chaining [byte]", "load [ms]", "shape [ms]", "chaining subtables"))
+    for result in results:
+        print("{:<10} {:>12} {:>15} {:>10} {:>11}  {}".format(result["encoding"], result["GSUB"], result["chaining"],
+            "{:.3f}".format(result["load"] * 1000) if "load" in result else "-",
+            "{:.3f}".format(result["shape"] * 1000) if "shape" in result else "-",
+            ", ".join( "{} x {}".format(chaining_format, count) for chaining_format, count in result["formats"].items() )))
+
+    if options.output:
+        with open(options.output, "wb") as write_file:
+            write_file.write(orjson.dumps({"texts": len(texts), "results": results}, option=orjson.OPT_INDENT_2))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 tools/benchmark_pipeline.py
+# python3 tools/benchmark_pipeline.py --sizes 1000 --repeat 1
+
+# Note
+# ダミーのフォント（tools/synthetic_font.py）でビルドの主な処理の時間を測る
+# otfcc もソースフォントもネットワークも使わないので、Linux の CI でもそのまま動く。
+#
+# 測る処理
+#   PinyinGlyph.add_references_of_pronunciation
+#   Font.add_glyf
+#   GSUBTable.generate_GSUB_table (パターンファイルの読み込みを含む)
+#   rule_analyzer.analyze
+#   シリアライズ (save_as_json の indent あり/なし, iter_json_chunks)
+#
+# 結果は tmp/benchmark/pipeline/{日時}.json に保存し、前回の結果と比べて表示する。
+
+import os
+import sys
+import time
+import glob
+import datetime
+import argparse
+import orjson
+
+DIR_TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(DIR_TOOLS, "../src"))
+import path as p
+import config
+import utility
+import pinyin_glyph as py_glyph
+import font as ft
+import GSUB_table as gt
+import rule_analyzer
+import synthetic_font as sf
+
+DIR_SYNTHETIC = os.path.normpath( os.path.join(p.DIR_TEMP, "../synthetic/") )
+DIR_RESULTS   = os.path.normpath( os.path.join(p.DIR_TEMP, "../benchmark/pipeline/") )
+
+SIZES = [1000, 10000, 40000]
+
+# 同じ処理を repeat 回実行して、最も速かった時間を使う
+# setup の戻り値を func に渡す。setup の時間は含めない
+def measure(repeat, setup, func):
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run_size(glyph_num, repeat, seed):
+    dir_synthetic = os.path.join(DIR_SYNTHETIC, str(glyph_num))
+    sf.make_synthetic_files(dir_synthetic, glyph_num, seed)
+    def synthetic(file_name):
+        return os.path.join(dir_synthetic, file_name)
+
+    # pinyin_getter は p.DIR_OUTPUT にある辞書を読むので、ダミーの辞書に差し替える（パスが変わると読み込み直される）
+    p.DIR_OUTPUT = dir_synthetic
+
+    results = {}
+
+    def setup_pinyin_glyph():
+        return ( py_glyph.PinyinGlyph(synthetic(sf.TAMPLATE_MAIN_JSON), synthetic(sf.ALPHABET_FOR_PINYIN_JSON), config.HAN_SERIF_TYPE), )
+    results["add_references_of_pronunciation"] = measure(repeat, setup_pinyin_glyph,
+        lambda pinyin_glyph: pinyin_glyph.add_references_of_pronunciation())
+
+    def setup_font():
+        font = ft.Font( synthetic(sf.TAMPLATE_MAIN_JSON), synthetic(sf.TAMPLATE_GLYF_JSON), synthetic(sf.ALPHABET_FOR_PINYIN_JSON), \
+                        synthetic(sf.PATTERN_ONE_TXT), synthetic(sf.PATTERN_TWO_JSON), synthetic(sf.EXCEPTION_PATTERN_JSON), config.HAN_SERIF_TYPE )
+        font.add_cmap_uvs()
+        font.add_glyph_order()
+        return (font, )
+    results["add_glyf"] = measure(repeat, setup_font, lambda font: font.add_glyf())
+
+    # 以降の処理は、グリフを追加し終えたフォントを使う
+    (font, ) = setup_font()
+    font.add_glyf()
+    font.set_about_size()
+    utility.set_cmap_table(font.marged_font["cmap"])
+
+    def generate_GSUB_table():
+        GSUB = gt.GSUBTable(None, synthetic(sf.PATTERN_ONE_TXT), synthetic(sf.PATTERN_TWO_JSON), synthetic(sf.EXCEPTION_PATTERN_JSON))
+        font.marged_font["GSUB"] = GSUB.get_GSUB_table()
+    results["generate_GSUB_table"] = measure(repeat, tuple, generate_GSUB_table)
+    results["analyze_rules"] = measure(repeat, tuple, lambda: rule_analyzer.analyze(font.marged_font["GSUB"], utility.cmap_table))
+
+    TAMPLATE_MARGED_JSON = synthetic("template.json")
+    results["save_as_json"] = measure(repeat, tuple, lambda: ft.save_as_json(font.marged_font, TAMPLATE_MARGED_JSON))
+    results["save_as_json_compact"] = measure(repeat, tuple, lambda: ft.save_as_json(font.marged_font, TAMPLATE_MARGED_JSON, option=None))
+    results["iter_json_chunks"] = measure(repeat, tuple, lambda: sum(len(chunk) for chunk in ft.iter_json_chunks(font.marged_font)))
+    os.remove(TAMPLATE_MARGED_JSON)
+
+    return {
+        "glyph_num"  : glyph_num,
+        "glyf_num"   : len(font.marged_font["glyf"]),
+        "hanzi_num"  : len(utility.get_pinyin_mapping_table()),
+        # rclt の chaining の lookup をすべて数える
+        "GSUB_rules" : sum( len(lookup["subtables"]) for lookup in font.marged_font["GSUB"]["lookups"].values() if lookup["type"] == "gsub_chaining" ),
+        "times"      : results
+    }
+
+def load_previous_results():
+    result_files = sorted(glob.glob(os.path.join(DIR_RESULTS, "*.json")))
+    if len(result_files) == 0:
+        return None
+    with open(result_files[-1], "rb") as read_file:
+        return orjson.loads(read_file.read())
+
+def print_results(results, previous):
+    previous_sizes = {}
+    if previous is not None:
+        previous_sizes = { str(size_result["glyph_num"]) : size_result for size_result in previous["sizes"] }
+    for size_result in results["sizes"]:
+        print("glyph num: {} (glyf: {}, hanzi: {}, GSUB rules: {})".format(
+            size_result["glyph_num"], size_result["glyf_num"], size_result["hanzi_num"], size_result["GSUB_rules"]))
+        previous_times = previous_sizes.get(str(size_result["glyph_num"]), {}).get("times", {})
+        for name, seconds in size_result["times"].items():
+            line = "  {:<34} {:>9.3f} s".format(name, seconds)
+            if name in previous_times and previous_times[name] > 0:
+                line += "  ({:+.1f}% from {})".format( (seconds / previous_times[name] - 1) * 100, previous["created"] )
+            print(line)
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark the build pipeline with synthetic fonts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="ダミーのフォントのグリフ数")
+    parser.add_argument("--repeat", type=int, default=3, help="各処理を実行する回数（最も速い時間を使う）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-save", action="store_true", help="結果を保存しない")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    created = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    results = {
+        "created" : created,
+        "python"  : sys.version.split(" ")[0],
+        "repeat"  : options.repeat,
+        "seed"    : options.seed,
+        "sizes"   : [run_size(glyph_num, options.repeat, options.seed) for glyph_num in options.sizes]
+    }
+    print_results(results, load_previous_results())
+
+    if not options.no_save:
+        os.makedirs(DIR_RESULTS, exist_ok=True)
+        RESULT_JSON = os.path.join(DIR_RESULTS, "{}.json".format(created))
+        with open(RESULT_JSON, "wb") as write_file:
+            write_file.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+        print("saved: {}".format(RESULT_JSON))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@
 # https://dokochina.com/duoyinzi.htm
 # 漢字、拼音と多音字の単語を渡して、百度汉字とpypinyin を比較する
 # python3 createduoyinziJson.py 重 chóng 重版,重婚,重孙,重围,重霄 
+# python3 createduoyinziJson.py 重 chóng 重版,重婚,重孙,重围,重霄 --mode replay
 
 
 # 基本的な方針として、ここで一致していたら三箇所で一致しているので、登録する
@@ -11,35 +12,19 @@ from pypinyin import pinyin, lazy_pinyin, Style
 import os
 import sys
 import argparse
-import requests
-from bs4 import BeautifulSoup
-# Webページを取得して解析する
-
-BAIDU_URL  = "https://hanyu.baidu.com/s?wd={}&from=zici"
-
-def get_pinyin(hanzi):
-    html = requests.get(BAIDU_URL.format(hanzi))
-    soup = BeautifulSoup(html.content, "html.parser")
-    elem = soup.find("div", id="pinyin")
-    try:
-        raw_text = elem.find("b")
-        # [ chóng xiāo ] こんな感じの文字列
-        text = raw_text.get_text()
-        text = text.replace("[ ", "")
-        text = text.replace(" ]", "")
-        pinyins = text.split(" ")
-        # print(pinyins)
-        return pinyins
-    except:
-        # print("not found pinyin")
-        return None
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+import pinyin_fetcher
 
 def main(args=None):
     parser = argparse.ArgumentParser(description='this script is converting text to hanzi')
     parser.add_argument('hanzi')
     parser.add_argument('pinyin')
     parser.add_argument('texts')
+    parser.add_argument('--mode', choices=pinyin_fetcher.MODES, default='online',
+                        help="replay はネットワークを使わず、キャッシュ（tmp/cache/web/）と --stand-in のページだけで確認する")
+    parser.add_argument('--stand-in', help="replay で使うページのディレクトリ（{dir}/baidu/{単語}.html）")
+    parser.add_argument('--concurrency', type=int, default=8, help="同時に送るリクエストの数")
     arg = parser.parse_args(args)
 
     # print(arg.pinyin)
@@ -50,13 +35,17 @@ def main(args=None):
     hanzi = arg.hanzi
     input_pinyin  = arg.pinyin
     duoyinzi_list = arg.texts.split(",")
+    # 百度汉语 のページはまとめて取得する
+    fetcher = pinyin_fetcher.PinyinFetcher(mode=arg.mode, dir_stand_in=arg.stand_in, max_concurrency=arg.concurrency)
+    baidu_pinyins = fetcher.fetch_all("baidu", duoyinzi_list)
+    fetcher.close()
     for duoyinzi in duoyinzi_list:
         # 二通りで検証する
         pinyins1 = pinyin(duoyinzi, heteronym=True)
         # [['tán'], ['cí']] こういう感じなので ['tán', 'cí'] こうする
         pinyins1 = [e[0] for e in pinyins1]
         # print("{}, {}".format(duoyinzi, pinyins1))
-        pinyins2 = get_pinyin(duoyinzi)
+        pinyins2 = baidu_pinyins[duoyinzi]
         # print("{}, {}".format(duoyinzi, pinyins2))
 
         # python すげえな。これで配列の比較できる
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+# python3 tools/mine_duoyinzi_phrases.py corpus1.txt corpus2.txt --processes 8
+# python3 tools/mine_duoyinzi_phrases.py corpus.txt --max-n 4 --min-count 5 --top 50
+
+# Note
+# 大きなテキスト（コーパス）から、phrase_of_pattern_one.txt / phrase_of_pattern_two.txt に足す単語の候補を探す
+#   1. pypinyin の単語辞書 (PHRASES_DICT) から、多音字 (marged-mapping-table.txt で読みが二つ以上の漢字) を標準でない読みで読む単語を集める
+#      読みが辞書に無い（フォントにグリフが無い）ものと、今のフォントで既にその読みになる単語は除く
+#   2. コーパスを 16MB ごとの範囲に分けて、別プロセスでそれぞれの単語が何回出てくるかを数える
+#   3. 回数 x 標準でない読みの数 で並べて、"単語: pin/yin" の形で書き出す
+#      標準でない読みが一つなら phrase_of_pattern_one、二つ以上なら phrase_of_pattern_two の候補
+#
+# {output_dir}/
+#   ├ candidate_of_pattern_one.txt
+#   ├ candidate_of_pattern_two.txt
+#   └ candidate_scores.tsv          (単語, 回数, 標準でない読みの数, スコア)
+
+import os
+import sys
+import time
+import argparse
+import collections
+import concurrent.futures
+from pypinyin.constants import PHRASES_DICT
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+import path as p
+import utility
+import pinyin_annotator
+
+DIR_DUO_YIN_ZI = os.path.join(p.DIR_PHONICS, "duo_yin_zi")
+PHRASE_TABLE_FILES = [os.path.join(DIR_DUO_YIN_ZI, "phrase_of_pattern_one.txt"), os.path.join(DIR_DUO_YIN_ZI, "phrase_of_pattern_two.txt")]
+DIR_CANDIDATES = os.path.normpath( os.path.join(p.DIR_TEMP, "../duoyinzi_candidates") )
+
+# 一つのプロセスで数える範囲の大きさ
+RANGE_SIZE = 16 * 1024 * 1024
+MAX_N = 4
+
+def get_phrases_in_tables(PHRASE_TABLE_FILES):
+    phrases = set()
+    for PHRASE_TABLE_FILE in PHRASE_TABLE_FILES:
+        with open(PHRASE_TABLE_FILE, mode='r', encoding='utf-8') as read_file:
+            for line in read_file:
+                phrases.add( line.rstrip('\n').split(': ')[0] )
+    return phrases
+
+# {単語: (読みのリスト, 標準でない読みの数)}
+def get_candidates(max_n):
+    pinyin_table = utility.get_pinyin_mapping_table()
+    phrases_in_tables = get_phrases_in_tables(PHRASE_TABLE_FILES)
+    annotator = pinyin_annotator.PinyinAnnotator()
+    candidates = {}
+    for phrase, phrase_pinyins in PHRASES_DICT.items():
+        if not (2 <= len(phrase) <= max_n) or phrase in phrases_in_tables:
+            continue
+        if not all( hanzi in pinyin_table for hanzi in phrase ):
+            continue
+        pinyins = [pinyin[0] for pinyin in phrase_pinyins]
+        # フォントに無い読みは表示できない
+        if not all( pinyin in pinyin_table[hanzi] for hanzi, pinyin in zip(phrase, pinyins) ):
+            continue
+        variant_num = sum( 1 for hanzi, pinyin in zip(phrase, pinyins) if pinyin != pinyin_table[hanzi][0] )
+        if variant_num == 0:
+            continue
+        # 今のパターンで既にこの読みになる
+        if annotator.annotate(phrase) == pinyins:
+            continue
+        candidates[phrase] = (pinyins, variant_num)
+    return candidates
+
+# ファイルを RANGE_SIZE ごとの (path, start, end) に分ける
+def get_ranges(CORPUS_FILES, range_size):
+    ranges = []
+    for CORPUS_FILE in CORPUS_FILES:
+        size = os.path.getsize(CORPUS_FILE)
+        for start in range(0, size, range_size):
+            ranges.append( (CORPUS_FILE, start, min(start + range_size, size)) )
+    return ranges
+
+# 最初のバイトが [start, end) にある行を読む
+def read_range(CORPUS_FILE, start, end):
+    with open(CORPUS_FILE, "rb") as read_file:
+        if start > 0:
+            # 行の途中から始まるときは、その行は前の範囲で読む
+            read_file.seek(start - 1)
+            read_file.readline()
+        begin = read_file.tell()
+        if begin >= end:
+            return ""
+        data = read_file.read(end - begin)
+        if not data.endswith(b"\n"):
+            data += read_file.readline()
+    return data.decode('utf-8', errors='ignore')
+
+# 別プロセスでは、最初に一度だけ候補を受け取る
+worker_candidates = None
+worker_lengths = None
+worker_first_hanzi = None
+
+def init_worker(candidates):
+    global worker_candidates, worker_lengths, worker_first_hanzi
+    worker_candidates = candidates
+    worker_lengths = sorted( set(len(phrase) for phrase in candidates) )
+    worker_first_hanzi = set( phrase[0] for phrase in candidates )
+
+def count_range(CORPUS_FILE, start, end):
+    counter = collections.Counter()
+    text = read_range(CORPUS_FILE, start, end)
+    for i, hanzi in enumerate(text):
+        if not (hanzi in worker_first_hanzi):
+            continue
+        for n in worker_lengths:
+            phrase = text[i:i+n]
+            if phrase in worker_candidates:
+                counter[phrase] += 1
+    return (end - start, counter)
+
+def count_corpus(CORPUS_FILES, candidates, processes, range_size):
+    ranges = get_ranges(CORPUS_FILES, range_size)
+    total_size = sum( end - start for (_, start, end) in ranges )
+    counter = collections.Counter()
+    done_size = 0
+    start_time = time.perf_counter()
+    # 候補は set で十分（読みはこのプロセスで引く）
+    candidate_phrases = frozenset(candidates)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(candidate_phrases,)) as executor:
+        futures = [executor.submit(count_range, CORPUS_FILE, start, end) for (CORPUS_FILE, start, end) in ranges]
+        for future in concurrent.futures.as_completed(futures):
+            (size, range_counter) = future.result()
+            counter.update(range_counter)
+            done_size += size
+            elapsed = time.perf_counter() - start_time
+            print("\r{:.1f} / {:.1f} MB ({:.1f} MB/s)".format(done_size / 1e6, total_size / 1e6, done_size / 1e6 / elapsed if elapsed > 0 else 0), end="")
+    print()
+    return counter
+
+# [(単語, 読みのリスト, 回数, 標準でない読みの数, スコア)] をスコアの大きい順に返す
+def rank_candidates(candidates, counter, min_count):
+    ranked = []
+    for phrase, count in counter.items():
+        if count < min_count:
+            continue
+        (pinyins, variant_num) = candidates[phrase]
+        ranked.append( (phrase, pinyins, count, variant_num, count * variant_num) )
+    ranked.sort(key=lambda candidate: (-candidate[4], candidate[0]))
+    return ranked
+
+def export_candidates(ranked, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "candidate_of_pattern_one.txt"), mode='w', encoding='utf-8') as pattern_one_file, \
+         open(os.path.join(output_dir, "candidate_of_pattern_two.txt"), mode='w', encoding='utf-8') as pattern_two_file, \
+         open(os.path.join(output_dir, "candidate_scores.tsv"), mode='w', encoding='utf-8') as scores_file:
+        for (phrase, pinyins, count, variant_num, score) in ranked:
+            write_file = pattern_one_file if variant_num == 1 else pattern_two_file
+            write_file.write("{}: {}\n".format(phrase, "/".join(pinyins)))
+            scores_file.write("{}\t{}\t{}\t{}\n".format(phrase, count, variant_num, score))
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Mine candidate duoyinzi phrases from text corpora")
+    parser.add_argument("corpus", nargs="+", help="utf-8 のテキストファイル")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--max-n", type=int, default=MAX_N, help="数える単語の最大の文字数")
+    parser.add_argument("--min-count", type=int, default=1, help="これより少ない回数の単語は出力しない")
+    parser.add_argument("--top", type=int, default=20, help="表示する候補の数")
+    parser.add_argument("--output-dir", default=DIR_CANDIDATES)
+    parser.add_argument("--range-size", type=int, default=RANGE_SIZE, help="一つのプロセスで数えるバイト数")
+    arg = parser.parse_args(args)
+
+    candidates = get_candidates(arg.max_n)
+    print("candidate phrases in the dictionary: {}".format(len(candidates)))
+    start_time = time.perf_counter()
+    counter = count_corpus(arg.corpus, candidates, arg.processes, arg.range_size)
+    elapsed = time.perf_counter() - start_time
+    total_size = sum( os.path.getsize(CORPUS_FILE) for CORPUS_FILE in arg.corpus )
+    print("counted {:.1f} MB in {:.2f} s ({:.1f} MB/s, {} processes)".format(total_size / 1e6, elapsed, total_size / 1e6 / elapsed if elapsed > 0 else 0, arg.processes))
+
+    ranked = rank_candidates(candidates, counter, arg.min_count)
+    export_candidates(ranked, arg.output_dir)
+    for (phrase, pinyins, count, variant_num, score) in ranked[:arg.top]:
+        print("{}: {}\t(count {}, variants {})".format(phrase, "/".join(pinyins), count, variant_num))
+    print("{} candidates -> {}".format(len(ranked), arg.output_dir))
+
+if __name__ == '__main__':
+    sys.exit(main())
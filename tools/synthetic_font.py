@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 tools/synthetic_font.py tmp/synthetic/10000 --glyphs 10000
+
+# Note
+# ベンチマーク用に、本物のフォントと同じ形式のダミーの入力ファイルを作る
+# otfcc もソースフォントも不要なので、どこでも（CI の Linux 上でも）ビルドの処理を試せる。
+#
+# {dir}/
+#   ├ template_main.json           (otfccdump -> make_template_jsons.py の出力と同じ形式)
+#   ├ template_glyf.json
+#   ├ alphabet4pinyin.json         (retrieve_latin_alphabet.py の出力と同じ形式)
+#   ├ marged-mapping-table.txt     (U+4E00: yī,yí,yì  #一)
+#   ├ duoyinzi_pattern_one.txt     (1, 行, xíng, [~走|~人])
+#   ├ duoyinzi_pattern_two.json
+#   └ duoyinzi_exceptional_pattern.json
+
+import os
+import sys
+import random
+import argparse
+import orjson
+
+TAMPLATE_MAIN_JSON       = "template_main.json"
+TAMPLATE_GLYF_JSON       = "template_glyf.json"
+ALPHABET_FOR_PINYIN_JSON = "alphabet4pinyin.json"
+MARGED_MAPPING_TABLE     = "marged-mapping-table.txt"
+PATTERN_ONE_TXT          = "duoyinzi_pattern_one.txt"
+PATTERN_TWO_JSON         = "duoyinzi_pattern_two.json"
+EXCEPTION_PATTERN_JSON   = "duoyinzi_exceptional_pattern.json"
+
+# 「一」(U+4E00) から順にグリフを割り当てる。サロゲートの範囲は飛ばす
+FIRST_CODEPOINT = 0x4E00
+SURROGATES = range(0xD800, 0xE000)
+
+# ピンインの音節を作るための声母と韻母
+INITIALS = ["", "b", "p", "m", "f", "d", "t", "n", "l", "g", "k", "h", "j", "q", "x",
+            "zh", "ch", "sh", "r", "z", "c", "s", "y", "w"]
+FINALS = ["a", "o", "e", "ai", "ei", "ao", "ou", "an", "en", "ang", "eng", "ong",
+          "i", "u", "ü", "ia", "ie", "iu", "in", "ing", "uo", "ui", "un", "uan", "iang"]
+TONE_MARKS = {
+    "a": "āáǎà", "o": "ōóǒò", "e": "ēéěè", "i": "īíǐì", "u": "ūúǔù", "ü": "ǖǘǚǜ"
+}
+# pinyin_glyph.py が使うピンイン用のグリフ（utility.SIMPLED_ALPHABET の値）
+PY_ALPHABETS = ["a", "a1", "a2", "a3", "a4", "b", "c", "d", "e", "e1", "e2", "e3", "e4", "f", "g", "h",
+                "i", "i1", "i2", "i3", "i4", "j", "k", "l", "m", "m1", "m2", "m4", "n", "n2", "n3", "n4",
+                "o", "o1", "o2", "o3", "o4", "p", "q", "r", "s", "t",
+                "u", "u1", "u2", "u3", "u4", "v", "v1", "v2", "v3", "v4", "w", "x", "y", "z"]
+
+UNITS_PER_EM = 1000
+
+# 声調記号を付ける母音を決める（a, e があればそれ、ou なら o、それ以外は最後の母音）
+def add_tone_mark(syllable, tone):
+    if tone == 0:
+        return syllable
+    if "a" in syllable:
+        vowel = "a"
+    elif "e" in syllable:
+        vowel = "e"
+    elif "ou" in syllable:
+        vowel = "o"
+    else:
+        vowel = [c for c in syllable if c in TONE_MARKS][-1]
+    i = syllable.rindex(vowel) if vowel != "o" else syllable.index(vowel)
+    return syllable[:i] + TONE_MARKS[vowel][tone-1] + syllable[i+1:]
+
+def make_syllables():
+    syllables = []
+    for initial in INITIALS:
+        for final in FINALS:
+            for tone in range(5):
+                syllables.append( add_tone_mark(initial + final, tone) )
+    return syllables
+
+def get_codepoints(glyph_num):
+    codepoints = []
+    codepoint = FIRST_CODEPOINT
+    while len(codepoints) < glyph_num:
+        if not (codepoint in SURROGATES):
+            codepoints.append(codepoint)
+        codepoint += 1
+    return codepoints
+
+def make_contours(rng, contour_num, point_num):
+    contours = []
+    for _ in range(contour_num):
+        contour = []
+        for i in range(point_num):
+            contour.append( {"x": rng.randint(0, UNITS_PER_EM), "y": rng.randint(-120, 880), "on": (i % 3) != 2} )
+        contours.append(contour)
+    return contours
+
+def make_font(rng, codepoints):
+    glyf = {".notdef": {"advanceWidth": UNITS_PER_EM, "advanceHeight": UNITS_PER_EM, "verticalOrigin": 880,
+                        "contours": make_contours(rng, 1, 4)}}
+    cmap = {}
+    for i, codepoint in enumerate(codepoints):
+        cid = "cid{:05}".format(i + 1)
+        glyf[cid] = {
+            "advanceWidth": UNITS_PER_EM, "advanceHeight": UNITS_PER_EM, "verticalOrigin": 880,
+            "contours": make_contours(rng, rng.randint(2, 6), rng.randint(8, 24))
+        }
+        cmap[str(codepoint)] = cid
+    glyph_order = sorted(glyf.keys())
+    return {
+        "head": {"version": 1, "fontRevision": 1, "unitsPerEm": UNITS_PER_EM, "created": 0, "modified": 0,
+                 "xMin": 0, "yMin": -120, "xMax": UNITS_PER_EM, "yMax": 880},
+        "hhea": {"version": 1, "ascender": 880, "descender": -120, "lineGap": 0},
+        "vhea": {"version": 1, "ascent": 500, "descent": -500, "lineGap": 0},
+        "OS_2": {"version": 4, "usWeightClass": 400, "achVendID": "MENG", "sTypoAscender": 880,
+                 "sTypoDescender": -120, "sTypoLineGap": 0, "usWinAscent": 880, "usWinDescent": 120},
+        "post": {"version": 3, "italicAngle": 0, "underlinePosition": -100, "underlineThickness": 50},
+        "name": [],
+        "cmap": cmap,
+        "glyph_order": glyph_order,
+        "glyf": glyf,
+        "GSUB": {"languages": {}, "features": {}, "lookups": {}, "lookupOrder": []}
+    }
+
+def make_alphabet_glyf(rng):
+    return { "py_alphablet_{}".format(alphabet) : {
+                 "advanceWidth": 500, "advanceHeight": 700, "verticalOrigin": 600,
+                 "contours": make_contours(rng, 1, rng.randint(8, 16))
+             } for alphabet in PY_ALPHABETS }
+
+# 多音字は 2〜4 通りの読みを持つ
+def make_mapping_table(rng, codepoints, mapping_rate, multiple_rate):
+    syllables = make_syllables()
+    mapped_codepoints = sorted( set(rng.sample(codepoints, int(len(codepoints) * mapping_rate))) | {FIRST_CODEPOINT} )
+    mapping_table = {}
+    for codepoint in mapped_codepoints:
+        pinyin_num = rng.randint(2, 4) if rng.random() < multiple_rate else 1
+        mapping_table[chr(codepoint)] = rng.sample(syllables, pinyin_num)
+    # font.py はピンインのグリフの大きさを「yī」から取得するので、本物の辞書と同じにしておく
+    mapping_table[chr(FIRST_CODEPOINT)] = ["yī", "yí", "yì"]
+    return mapping_table
+
+def make_pattern_one(rng, mapping_table, context_hanzi):
+    lines = []
+    for hanzi, pinyins in mapping_table.items():
+        if len(pinyins) < 2:
+            continue
+        for order, pinyin in enumerate(pinyins, start=1):
+            patterns = []
+            for _ in range(rng.randint(1, 8)):
+                kind = rng.randint(0, 4)
+                if kind == 0:
+                    patterns.append("~" + rng.choice(context_hanzi))
+                elif kind == 1:
+                    patterns.append(rng.choice(context_hanzi) + "~")
+                elif kind == 2:
+                    patterns.append("~" + rng.choice(context_hanzi) + rng.choice(context_hanzi))
+                elif kind == 3:
+                    patterns.append(rng.choice(context_hanzi) + rng.choice(context_hanzi) + "~")
+                else:
+                    patterns.append(rng.choice(context_hanzi) + "~" + rng.choice(context_hanzi))
+            lines.append( "{}, {}, {}, [{}]".format(order, hanzi, pinyin, "|".join(patterns)) )
+    return "\n".join(lines) + "\n"
+
+# 熟語のパターン。lookup_pattern_{prefix}{idx} は異読の idx 番目 (ss{02+idx}) に置き換える
+def make_phrase_patterns(rng, mapping_table, context_hanzi, phrase_num, prefix, with_ignore):
+    multiple_hanzi = [hanzi for hanzi, pinyins in mapping_table.items() if len(pinyins) > 1]
+    lookup_table = {}
+    patterns = {}
+    while len(patterns) < phrase_num and len(multiple_hanzi) > 0:
+        length = rng.randint(2, 4)
+        phrase = [rng.choice(context_hanzi) for _ in range(length)]
+        at = rng.randrange(length)
+        hanzi = rng.choice(multiple_hanzi)
+        phrase[at] = hanzi
+        idx = rng.randrange(len(mapping_table[hanzi]) - 1)
+        lookup_name = "lookup_pattern_{}{}".format(prefix, idx)
+        lookup_table.setdefault(lookup_name, {})[hanzi] = "{}.ss{:02}".format(hanzi, 2 + idx)
+        pattern = [ {c : (lookup_name if i == at else None)} for i, c in enumerate(phrase) ]
+        if with_ignore:
+            ignore = None
+            if rng.random() < 0.3:
+                ignore = " ".join( [rng.choice(context_hanzi)] + [c + "'" if i == at else c for i, c in enumerate(phrase)] )
+            patterns["".join(phrase)] = {"ignore": ignore, "pattern": pattern}
+        else:
+            patterns["".join(phrase)] = pattern
+    return {"lookup_table": lookup_table, "patterns": patterns}
+
+def make_synthetic_files(dir_output, glyph_num, seed=0, mapping_rate=0.25, multiple_rate=0.08):
+    os.makedirs(dir_output, exist_ok=True)
+    rng = random.Random(seed)
+    codepoints = get_codepoints(glyph_num)
+
+    # make_template_jsons.py と同じく、main の方は contours を空にする
+    font = make_font(rng, codepoints)
+    with open(os.path.join(dir_output, TAMPLATE_GLYF_JSON), "wb") as write_file:
+        write_file.write(orjson.dumps(font["glyf"]))
+    font["glyf"] = { glyf_name : dict(glyf_data, contours=[]) for glyf_name, glyf_data in font["glyf"].items() }
+    with open(os.path.join(dir_output, TAMPLATE_MAIN_JSON), "wb") as write_file:
+        write_file.write(orjson.dumps(font))
+    with open(os.path.join(dir_output, ALPHABET_FOR_PINYIN_JSON), "wb") as write_file:
+        write_file.write(orjson.dumps(make_alphabet_glyf(rng)))
+
+    mapping_table = make_mapping_table(rng, codepoints, mapping_rate, multiple_rate)
+    with open(os.path.join(dir_output, MARGED_MAPPING_TABLE), "w", encoding="utf-8") as write_file:
+        for hanzi, pinyins in mapping_table.items():
+            write_file.write( "U+{:04X}: {}  #{}\n".format(ord(hanzi), ",".join(pinyins), hanzi) )
+
+    context_hanzi = [chr(codepoint) for codepoint in codepoints]
+    multiple_num = len([pinyins for pinyins in mapping_table.values() if len(pinyins) > 1])
+    with open(os.path.join(dir_output, PATTERN_ONE_TXT), "w", encoding="utf-8") as write_file:
+        write_file.write( make_pattern_one(rng, mapping_table, context_hanzi) )
+    with open(os.path.join(dir_output, PATTERN_TWO_JSON), "wb") as write_file:
+        pattern_two = make_phrase_patterns(rng, mapping_table, context_hanzi, multiple_num // 2, 1, False)
+        write_file.write(orjson.dumps(pattern_two, option=orjson.OPT_INDENT_2))
+    with open(os.path.join(dir_output, EXCEPTION_PATTERN_JSON), "wb") as write_file:
+        exception_pattern = make_phrase_patterns(rng, mapping_table, context_hanzi, max(1, multiple_num // 20), 2, True)
+        write_file.write(orjson.dumps(exception_pattern, option=orjson.OPT_INDENT_2))
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Make synthetic source files for benchmarks")
+    parser.add_argument("dir_output", help="出力先のディレクトリ")
+    parser.add_argument("--glyphs", type=int, default=10000, help="ソースフォントの漢字のグリフ数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mapping-rate", type=float, default=0.25, help="グリフのうち、ピンインを付ける漢字の割合")
+    parser.add_argument("--multiple-rate", type=float, default=0.08, help="ピンインを付ける漢字のうち、多音字の割合")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    make_synthetic_files(options.dir_output, options.glyphs, options.seed, options.mapping_rate, options.multiple_rate)
+
+if __name__ == "__main__":
+    sys.exit(main())